@@ -1,12 +1,16 @@
 import streamlit as st
-import json
 import os
 from datetime import datetime, timedelta
 from pathlib import Path
 import pandas as pd
-import altair as alt
-import io
-import csv
+from tickets import charts, open_store
+from tickets.analytics import avg_response_hours, build_frames, response_rate, rollup_response_rate, ticket_table
+from tickets.archive import TieredStore, archive_days
+from tickets.errors import ConflictError
+from tickets.jobs import ACTIVE, DONE, FAILED, JobRunner
+from tickets.service import TicketService
+from tickets.settings import FIELDS, SettingsStore, guess_renames, settings_path
+from tickets.timing import PHASES, RECORDER, span
 
 # Page config
 st.set_page_config(
@@ -20,34 +24,239 @@ st.set_page_config(
 if "logged_in" not in st.session_state:
     st.session_state.logged_in = False
 
-if "tickets" not in st.session_state:
-    st.session_state.tickets = []
+# File for persistent storage (*.db / *.sqlite selects the SQLite backend)
+TICKETS_FILE = os.environ.get("TICKETS_STORE", "tickets.json")
 
-if "settings" not in st.session_state:
-    st.session_state.settings = {
-        "priorities": ["🟢 Niedrig", "🟡 Mittel", "🔴 Hoch"],
-        "categories": ["Bug", "Feature Request", "Support", "Dokumentation", "Sonstiges"],
-        "statuses": ["Offen", "In Bearbeitung", "Gelöst"]
+# Job queue and result files of the background jobs
+JOBS_DIR = os.environ.get("TICKETS_JOBS_DIR", os.path.splitext(TICKETS_FILE)[0] + "_jobs")
+
+# Jobs listed in the sidebar per session
+JOB_LIST_SIZE = 5
+JOB_LABELS = {"export": "Export", "import": "Import", "compact": "Verdichten", "rebuild": "Neuaufbau",
+              "archive": "Archivieren"}
+
+# Resolved tickets older than this many days move to the archive (None: never)
+ARCHIVE_DAYS = archive_days()
+
+# Chart specs are cached per data version and settings, older ones get evicted
+CHART_CACHE_ENTRIES = 16
+
+# Page sizes offered in the card view
+PAGE_SIZES = [10, 25, 50, 100]
+
+# Bucket sizes of the trend charts
+GRANULARITIES = {"day": "Tag", "week": "Woche", "month": "Monat"}
+
+# Value lists on the settings page -> heading, input label, label of one value
+SETTINGS_LISTS = {
+    "priorities": ("Prioritäten", "Prioritäten", "Priorität"),
+    "categories": ("Kategorien", "Kategorien", "Kategorie"),
+    "statuses": ("Status", "Status", "Status"),
+}
+
+# Sections of the main app, only the selected one is rendered
+SECTIONS = ["➕ Neues Ticket", "📋 Tickets", "📊 Erweiterte Stats", "⚙️ Einstellungen"]
+
+@st.cache_resource
+def get_store():
+    """Return the ticket store shared by all sessions of this process"""
+    store = open_store(TICKETS_FILE)
+    store.load()
+    return store
+
+@st.cache_resource
+def get_service():
+    """Ticket operations over the shared store and settings, the same core the HTTP API uses"""
+    settings = SettingsStore(settings_path(TICKETS_FILE))
+    settings.load()
+    return TicketService(get_store(), settings)
+
+def load_settings():
+    """Return the persisted settings, picking up saves from other sessions and processes"""
+    service = get_service()
+    service.refresh_settings()
+    return service.settings.values
+
+def load_ticket_count():
+    """Return the number of tickets, picking up changes made by other processes
+
+    Read from the statistics, so a rerun after a write does not read all tickets.
+    """
+    try:
+        with span("load"):
+            store = get_store()
+            store.refresh()
+    except (OSError, ValueError, KeyError) as e:
+        st.error(f"❌ Tickets konnten nicht geladen werden: {e}")
+        st.stop()
+    return store.stats.tickets
+
+@st.cache_resource(max_entries=2)
+def get_frames(version):
+    """Columnar ticket and exchange frames for one data version, shared by all sessions"""
+    return build_frames(get_store().tickets)
+
+@st.cache_data(max_entries=CHART_CACHE_ENTRIES, show_spinner=False)
+def ticket_charts(version, priorities, statuses):
+    """Chart specs of the ticket tab for one data version and settings"""
+    stats = get_store().stats
+    specs = {
+        "response": charts.response_pie(stats.answered, stats.pending, "Fragen-Antwort Status (Exchange-basiert)"),
+        "priority": charts.count_bars(stats.by_priority, "Priorität", "Tickets nach Priorität",
+                                      priorities, charts.palette(charts.PRIORITY_COLORS, len(priorities))),
+        "status": charts.count_bars(stats.by_status, "Status", "Tickets nach Status",
+                                    statuses, charts.palette(charts.STATUS_COLORS, len(statuses))),
+        "category": charts.count_bars(stats.by_category, "Kategorie", "Tickets nach Kategorie", horizontal=True),
     }
+    if stats.response_histogram:
+        specs["histogram"] = charts.response_histogram(stats.response_histogram)
+    return specs
 
-# File for persistent storage
-TICKETS_FILE = "tickets.json"
+@st.cache_data(max_entries=CHART_CACHE_ENTRIES, show_spinner=False)
+def stats_charts(version, priorities, categories):
+    """Chart specs of the advanced statistics tab for one data version and settings"""
+    store = get_store()
+    stats = store.stats
+    specs = {"response": charts.response_pie(stats.answered, stats.pending, "Alle Fragen Status")}
+    
+    daily_questions = store.trend("asked", "day")
+    if not daily_questions.empty:
+        specs["daily_questions"] = charts.daily_line(daily_questions, "Fragen", "Anzahl Fragen", "Fragen pro Tag")
+    
+    if isinstance(store, TieredStore):
+        # Frames would read every archived ticket, so the means (approximate) and rates come from the rollups
+        priority_avg = store.response_times("priority")["mean_hours"]
+        category_rates = rollup_response_rate(store, categories)
+    else:
+        _, exchanges_df = get_frames(version)
+        priority_avg = avg_response_hours(exchanges_df, "priority")
+        category_rates = response_rate(exchanges_df, "category")
+        # Only the configured categories, in their configured order
+        category_rates = category_rates.reindex([c for c in categories if c in category_rates.index])
+    if not priority_avg.empty:
+        specs["priority_response"] = charts.priority_response_bars(priority_avg, priorities)
+    
+    if not category_rates.empty:
+        specs["category_rate"] = charts.category_rate_bars(category_rates)
+    return specs
 
-def load_tickets():
-    """Load tickets from JSON file"""
-    if os.path.exists(TICKETS_FILE):
-        try:
-            with open(TICKETS_FILE, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except:
-            return []
-    return []
-
-def save_tickets(tickets):
-    """Save tickets to JSON file"""
-    with open(TICKETS_FILE, "w", encoding="utf-8") as f:
-        json.dump(tickets, f, ensure_ascii=False, indent=2)
-    st.session_state.tickets = tickets
+@st.cache_data(max_entries=CHART_CACHE_ENTRIES, show_spinner=False)
+def trend_charts(version, granularity):
+    """Chart specs of the trends per day, week or month for one data version, read from the rollups"""
+    store = get_store()
+    label = GRANULARITIES[granularity]
+    specs = {}
+    trends = [
+        ("tickets", "opened", "Tickets", "Anzahl Tickets", f"Tickets pro {label}", None),
+        ("questions", "asked", "Fragen", "Anzahl Fragen", f"Fragen pro {label}", "#FF6B6B"),
+        ("answered", "answered", "Antworten", "Beantwortete Fragen", f"Antworten pro {label}", "#4CAF50"),
+        ("median", "p50_hours", "Median (h)", "Stunden", f"Median-Antwortzeit pro {label}", "#FF9800"),
+    ]
+    for key, metric, field, axis_title, title, color in trends:
+        values = store.trend(metric, granularity)
+        if not values.empty:
+            specs[key] = charts.daily_line(values, field, axis_title, title, color=color)
+    return specs
+
+@st.cache_data(max_entries=CHART_CACHE_ENTRIES, show_spinner=False)
+def response_tables(version, sla_hours):
+    """Response time percentiles and SLA breaches per priority and per category, from the rollup sketches"""
+    store = get_store()
+    sla = dict(sla_hours)
+    tables = {}
+    for by, label in (("priority", "Priorität"), ("category", "Kategorie")):
+        table = store.response_times(by, sla).rename(columns={
+            "count": "Antworten",
+            "mean_hours": "Ø (h)",
+            "p50_hours": "P50 (h)",
+            "p90_hours": "P90 (h)",
+            "p99_hours": "P99 (h)",
+            "breaches": "SLA verletzt",
+        })
+        table.index.name = label
+        tables[by] = table.round(1)
+    return tables
+
+@st.cache_resource
+def get_jobs():
+    """Background job runner of this process, also compacts the JSON store after writes"""
+    runner = JobRunner(get_store(), JOBS_DIR)
+    if hasattr(get_store(), "schedule_compaction"):
+        get_store().schedule_compaction = lambda: runner.submit_once("compact")
+    if ARCHIVE_DAYS is not None:
+        runner.submit_once("archive", days=ARCHIVE_DAYS, status=get_service().settings.values["resolved_status"])
+    return runner
+
+def submit_job(kind, **params):
+    """Start a background job and remember it for the job list of this session"""
+    job_id = get_jobs().submit(kind, **params)
+    st.session_state.jobs = [job_id] + st.session_state.get("jobs", [])[:JOB_LIST_SIZE - 1]
+    return job_id
+
+def export_button(label, export_format, filters, name, extension, mime, compress):
+    """Button that starts an export of the tickets matching filters as a background job"""
+    if st.button(label, width='stretch'):
+        submit_job(
+            "export",
+            format=export_format,
+            filters=filters,
+            name=f"{name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}" + (".gz" if compress else ""),
+            mime="application/gzip" if compress else mime,
+            compress=compress
+        )
+        st.toast("⏳ Export gestartet, der Download erscheint in der Seitenleiste")
+
+def render_jobs():
+    """Status of the jobs of this session, return True while one of them is not finished"""
+    jobs = get_jobs().queue.list(ids=st.session_state.get("jobs", []))
+    if not jobs:
+        return False
+    st.markdown("#### ⚙️ Hintergrundaufträge")
+    active = False
+    for job in jobs:
+        label = job["params"].get("name") or JOB_LABELS.get(job["kind"], job["kind"])
+        if job["state"] in ACTIVE:
+            active = True
+            st.progress(job["progress"], text=f"{label}: {job['message'] or 'wartet…'}")
+            if st.button("✖️ Abbrechen", key=f"cancel_job_{job['id']}", width='stretch'):
+                get_jobs().cancel(job["id"])
+        elif job["state"] == DONE:
+            st.success(f"✅ {label}" + (f": {job['message']}" if job["message"] else ""))
+            if job["result"] and os.path.exists(job["result"]):
+                st.download_button(
+                    label="⬇️ Herunterladen",
+                    data=lambda result=job["result"]: open(result, "rb"),
+                    file_name=job["params"]["name"] if job["kind"] == "export" else os.path.basename(job["result"]),
+                    mime=job["params"].get("mime", "application/json"),
+                    on_click="ignore",
+                    key=f"download_job_{job['id']}",
+                    width='stretch'
+                )
+        elif job["state"] == FAILED:
+            st.error(f"❌ {label}: {job['error']}")
+        else:
+            st.info(f"✖️ {label}: abgebrochen")
+    return active
+
+@st.fragment(run_every=1)
+def live_jobs():
+    """Job list that polls the job states every second while a job runs"""
+    if not render_jobs():
+        # Rerun the app once, so it shows the data the job wrote and stops polling
+        st.rerun()
+
+def jobs_panel():
+    """Background jobs of this session in the sidebar"""
+    # Starting the runner also resumes the jobs left queued by a restart
+    runner = get_jobs()
+    job_ids = st.session_state.get("jobs", [])
+    if not job_ids:
+        return
+    with st.sidebar:
+        if any(job["state"] in ACTIVE for job in runner.queue.list(ids=job_ids)):
+            live_jobs()
+        else:
+            render_jobs()
 
 def login_page():
     """Login page with Railcube branding"""
@@ -63,7 +272,6 @@ def login_page():
         if st.button("🔓 Anmelden", width='stretch'):
             if password == "rail26dpb#":
                 st.session_state.logged_in = True
-                st.session_state.tickets = load_tickets()
                 st.success("✅ Erfolgreich angemeldet!")
                 st.rerun()
             else:
@@ -72,819 +280,631 @@ def login_page():
         st.markdown("---")
         st.markdown("<p style='text-align: center; color: #888; font-size: 12px;'>DPB Support System</p>", unsafe_allow_html=True)
 
-def main_app():
-    """Main application"""
-    # Sidebar
-    st.sidebar.markdown("# 🎫 Support-Tickets")
-    st.sidebar.markdown("---")
+@st.fragment
+def new_ticket_page():
+    """Form for a new ticket, reruns on its own while it is filled in"""
+    settings = load_settings()
+    st.markdown("### Neues Support-Ticket erstellen")
     
-    if st.sidebar.button("🚪 Abmelden", width='stretch'):
-        st.session_state.logged_in = False
-        st.session_state.tickets = []
-        st.rerun()
+    col1, col2 = st.columns(2)
     
-    st.sidebar.markdown("---")
+    with col1:
+        title = st.text_input("Titel", placeholder="Ticket-Titel")
+        priority = st.selectbox("Priorität", settings["priorities"])
     
-    # Main content
-    st.markdown("<h1>🎫 Support-Tickets System</h1>", unsafe_allow_html=True)
+    with col2:
+        category = st.selectbox("Kategorie", settings["categories"])
+        status = st.selectbox("Status", settings["statuses"])
+    
+    description = st.text_area("Beschreibung", placeholder="Geben Sie die Ticket-Beschreibung ein", height=150)
+    
+    tags_input = st.text_input("🏷️ Tags", placeholder="Tags durch Komma trennen (z.B. urgent, client, feature)")
+    
+    st.markdown("#### Ticket-Erstellungsdatum und -zeit")
+    col1, col2 = st.columns(2)
     
-    # Tabs for different sections
-    tab1, tab2, tab3, tab4 = st.tabs(["➕ Neues Ticket", "📋 Tickets", "📊 Erweiterte Stats", "⚙️ Einstellungen"])
+    with col1:
+        created_date = st.date_input("Erstellungsdatum")
     
-    # Tab 1: Add new ticket
-    with tab1:
-        st.markdown("### Neues Support-Ticket erstellen")
+    with col2:
+        created_time = st.time_input("Erstellungszeit")
+    
+    if st.button("💾 Ticket speichern", width='stretch'):
+        if title and description:
+            created_datetime = datetime.combine(created_date, created_time).strftime("%Y-%m-%d %H:%M:%S")
+            tags = [tag.strip() for tag in tags_input.split(",")] if tags_input else []
+            
+            # The service starts the conversation with the description as the first question
+            get_service().create({
+                "title": title,
+                "description": description,
+                "category": category,
+                "priority": priority,
+                "status": status,
+                "created_at": created_datetime,
+                "tags": tags,
+            })
+            st.success("✅ Ticket erfolgreich erstellt!")
+            st.rerun()
+        else:
+            st.error("❌ Bitte füllen Sie alle erforderlichen Felder aus!")
+
+def count_questions(tickets):
+    """(answered, total) questions of a list of tickets"""
+    total = answered = 0
+    with span("aggregate"):
+        for t in tickets:
+            exchanges = t.get("exchanges", [])
+            total += len(exchanges)
+            answered += sum(1 for e in exchanges if e.get("response_at"))
+    return answered, total
+
+def tickets_page(ticket_count):
+    """Ticket list with filters, cards and the editor"""
+    settings = load_settings()
+    st.markdown("### Ticket-Verwaltung")
+    
+    if not ticket_count:
+        st.info("📭 Keine Tickets vorhanden. Erstellen Sie ein neues unter 'Neues Ticket'!")
+    else:
+        # Statistiken
+        st.markdown("#### 📊 Statistiken")
+        stats_col1, stats_col2, stats_col3, stats_col4 = st.columns(4)
         
-        col1, col2 = st.columns(2)
+        # Counters maintained by the store on every change
+        with span("aggregate"):
+            stats = get_store().stats
+        total_tickets = stats.tickets
         
-        with col1:
-            title = st.text_input("Titel", placeholder="Ticket-Titel")
-            priority = st.selectbox("Priorität", st.session_state.settings["priorities"])
+        # Calculate based on exchanges
+        answered_exchanges = stats.answered
+        pending_exchanges = stats.pending
         
-        with col2:
-            category = st.selectbox("Kategorie", st.session_state.settings["categories"])
-            status = st.selectbox("Status", st.session_state.settings["statuses"])
+        with stats_col1:
+            st.metric("Gesamt Tickets", total_tickets)
         
-        description = st.text_area("Beschreibung", placeholder="Geben Sie die Ticket-Beschreibung ein", height=150)
+        with stats_col2:
+            st.metric("Beantwortete Fragen", answered_exchanges)
         
-        tags_input = st.text_input("🏷️ Tags", placeholder="Tags durch Komma trennen (z.B. urgent, client, feature)")
+        with stats_col3:
+            st.metric("Ausstehende Fragen", pending_exchanges)
         
-        st.markdown("#### Ticket-Erstellungsdatum und -zeit")
-        col1, col2 = st.columns(2)
+        # Average response time
+        avg_response_time = stats.avg_response_hours
         
-        with col1:
-            created_date = st.date_input("Erstellungsdatum")
+        with stats_col4:
+            st.metric("Ø Antwortzeit (Stunden)", f"{avg_response_time:.1f}")
         
-        with col2:
-            created_time = st.time_input("Erstellungszeit")
+        st.markdown("---")
         
-        if st.button("💾 Ticket speichern", width='stretch'):
-            if title and description:
-                created_datetime = datetime.combine(created_date, created_time).strftime("%Y-%m-%d %H:%M:%S")
-                tags = [tag.strip() for tag in tags_input.split(",")] if tags_input else []
-                
-                new_ticket = {
-                    "id": len(st.session_state.tickets) + 1,
-                    "title": title,
-                    "description": description,
-                    "category": category,
-                    "priority": priority,
-                    "status": status,
-                    "created_at": created_datetime,
-                    "support_response_at": None,
-                    "tags": tags,
-                    "comments": [],
-                    "exchanges": [
-                        {
-                            "question_at": created_datetime,
-                            "question_text": description,
-                            "response_at": None,
-                            "response_text": ""
-                        }
-                    ]
-                }
-                st.session_state.tickets.append(new_ticket)
-                save_tickets(st.session_state.tickets)
-                st.success("✅ Ticket erfolgreich erstellt!")
-                st.rerun()
-            else:
-                st.error("❌ Bitte füllen Sie alle erforderlichen Felder aus!")
-    
-    # Tab 2: View and manage tickets
-    with tab2:
-        st.markdown("### Ticket-Verwaltung")
+        # Charts
+        st.markdown("#### 📈 Visualisierungen")
         
-        if not st.session_state.tickets:
-            st.info("📭 Keine Tickets vorhanden. Erstellen Sie ein neues im Tab 'Neues Ticket'!")
-        else:
-            # Statistiken
-            st.markdown("#### 📊 Statistiken")
-            stats_col1, stats_col2, stats_col3, stats_col4 = st.columns(4)
-            
-            total_tickets = len(st.session_state.tickets)
-            
-            # Calculate based on exchanges
-            total_exchanges = sum(len(t.get("exchanges", [])) for t in st.session_state.tickets)
-            answered_exchanges = sum(len([e for e in t.get("exchanges", []) if e.get("response_at")]) for t in st.session_state.tickets)
-            pending_exchanges = total_exchanges - answered_exchanges
-            
-            with stats_col1:
-                st.metric("Gesamt Tickets", total_tickets)
-            
-            with stats_col2:
-                st.metric("Beantwortete Fragen", answered_exchanges)
-            
-            with stats_col3:
-                st.metric("Ausstehende Fragen", pending_exchanges)
-            
-            # Calculate average response time
-            response_times = []
-            for ticket in st.session_state.tickets:
-                if ticket.get("exchanges"):
-                    for exchange in ticket.get("exchanges", []):
-                        if exchange.get("response_at") and exchange.get("question_at"):
-                            try:
-                                created = datetime.strptime(exchange["question_at"], "%Y-%m-%d %H:%M:%S")
-                                responded = datetime.strptime(exchange["response_at"], "%Y-%m-%d %H:%M:%S")
-                                delta = responded - created
-                                response_times.append(delta.total_seconds() / 3600)  # in hours
-                            except:
-                                pass
-            
-            avg_response_time = sum(response_times) / len(response_times) if response_times else 0
-            
-            with stats_col4:
-                st.metric("Ø Antwortzeit (Stunden)", f"{avg_response_time:.1f}")
-            
-            st.markdown("---")
-            
-            # Charts
-            st.markdown("#### 📈 Visualisierungen")
-            
-            chart_col1, chart_col2 = st.columns(2)
-            
-            # Chart 1: Response Status (Pie Chart)
-            with chart_col1:
-                response_data = pd.DataFrame({
-                    "Status": ["Beantwortet", "Ausstehend"],
-                    "Anzahl": [answered_exchanges, pending_exchanges]
-                })
-                
-                pie_chart = alt.Chart(response_data).mark_arc(innerRadius=0).encode(
-                    theta="Anzahl:Q",
-                    color=alt.Color("Status:N", scale=alt.Scale(
-                        domain=["Beantwortet", "Ausstehend"],
-                        range=["#4CAF50", "#FF9800"]
-                    )),
-                    tooltip=["Status:N", "Anzahl:Q"]
-                ).properties(
-                    title="Fragen-Antwort Status (Exchange-basiert)",
-                    height=300
-                )
-                st.altair_chart(pie_chart, use_container_width=True)
-            
-            # Chart 2: Tickets by Priority (Bar Chart)
-            with chart_col2:
-                priority_counts = {}
-                for ticket in st.session_state.tickets:
-                    priority = ticket["priority"]
-                    priority_counts[priority] = priority_counts.get(priority, 0) + 1
-                
-                priority_data = pd.DataFrame({
-                    "Priorität": list(priority_counts.keys()),
-                    "Anzahl": list(priority_counts.values())
-                })
-                
-                priority_chart = alt.Chart(priority_data).mark_bar().encode(
-                    x=alt.X("Priorität:N"),
-                    y=alt.Y("Anzahl:Q"),
-                    color=alt.Color("Priorität:N", scale=alt.Scale(
-                        domain=["🟢 Niedrig", "🟡 Mittel", "🔴 Hoch"],
-                        range=["#4CAF50", "#FFC107", "#F44336"]
-                    )),
-                    tooltip=["Priorität", "Anzahl"]
-                ).properties(
-                    title="Tickets nach Priorität",
-                    height=300
-                )
-                st.altair_chart(priority_chart, use_container_width=True)
-            
-            # Chart 3: Tickets by Status (Bar Chart)
-            chart_col3, chart_col4 = st.columns(2)
-            
-            with chart_col3:
-                status_counts = {}
-                for ticket in st.session_state.tickets:
-                    status = ticket["status"]
-                    status_counts[status] = status_counts.get(status, 0) + 1
-                
-                status_data = pd.DataFrame({
-                    "Status": list(status_counts.keys()),
-                    "Anzahl": list(status_counts.values())
-                })
-                
-                status_chart = alt.Chart(status_data).mark_bar().encode(
-                    x=alt.X("Status:N"),
-                    y=alt.Y("Anzahl:Q"),
-                    color=alt.Color("Status:N", scale=alt.Scale(
-                        domain=["Offen", "In Bearbeitung", "Gelöst"],
-                        range=["#FF5722", "#2196F3", "#4CAF50"]
-                    )),
-                    tooltip=["Status", "Anzahl"]
-                ).properties(
-                    title="Tickets nach Status",
-                    height=300
-                )
-                st.altair_chart(status_chart, use_container_width=True)
-            
-            # Chart 4: Tickets by Category (Bar Chart)
-            with chart_col4:
-                category_counts = {}
-                for ticket in st.session_state.tickets:
-                    category = ticket["category"]
-                    category_counts[category] = category_counts.get(category, 0) + 1
-                
-                category_data = pd.DataFrame({
-                    "Kategorie": list(category_counts.keys()),
-                    "Anzahl": list(category_counts.values())
-                })
-                
-                category_chart = alt.Chart(category_data).mark_bar().encode(
-                    x=alt.X("Anzahl:Q"),
-                    y=alt.Y("Kategorie:N"),
-                    color=alt.Color("Kategorie:N"),
-                    tooltip=["Kategorie", "Anzahl"]
-                ).properties(
-                    title="Tickets nach Kategorie",
-                    height=300
-                )
-                st.altair_chart(category_chart, use_container_width=True)
-            
-            # Chart 5: Response Time Distribution
-            if response_times:
-                st.markdown("---")
-                
-                response_time_data = pd.DataFrame({
-                    "Antwortzeit (Stunden)": response_times
-                })
-                
-                histogram = alt.Chart(response_time_data).mark_bar().encode(
-                    alt.X("Antwortzeit (Stunden):Q", bin=alt.Bin(maxbins=10)),
-                    y="count()",
-                    color="count()",
-                    tooltip=["count()"]
-                ).properties(
-                    title="Verteilung der Support-Antwortzeiten",
-                    height=300
-                )
-                
-                st.altair_chart(histogram, use_container_width=True)
-            
+        with span("chart"):
+            specs = ticket_charts(get_store().version, tuple(settings["priorities"]), tuple(settings["statuses"]))
+        chart_col1, chart_col2 = st.columns(2)
+        
+        # Chart 1: Response Status (Pie Chart)
+        with chart_col1:
+            st.vega_lite_chart(spec=specs["response"], use_container_width=True)
+        
+        # Chart 2: Tickets by Priority (Bar Chart)
+        with chart_col2:
+            st.vega_lite_chart(spec=specs["priority"], use_container_width=True)
+        
+        # Chart 3: Tickets by Status (Bar Chart)
+        chart_col3, chart_col4 = st.columns(2)
+        
+        with chart_col3:
+            st.vega_lite_chart(spec=specs["status"], use_container_width=True)
+        
+        # Chart 4: Tickets by Category (Bar Chart)
+        with chart_col4:
+            st.vega_lite_chart(spec=specs["category"], use_container_width=True)
+        
+        # Chart 5: Response Time Distribution (pre-binned to 0.1h by the store)
+        if "histogram" in specs:
             st.markdown("---")
-            
-            # Filter options
-            col1, col2, col3 = st.columns(3)
-            
-            with col1:
-                filter_status = st.selectbox("Nach Status filtern", ["Alle"] + st.session_state.settings["statuses"])
-            with col2:
-                filter_priority = st.selectbox("Nach Priorität filtern", ["Alle"] + st.session_state.settings["priorities"])
-            with col3:
-                filter_category = st.selectbox("Nach Kategorie filtern", ["Alle"] + st.session_state.settings["categories"])
-            
-            # Search and date filters
-            col4, col5, col6 = st.columns(3)
-            
-            with col4:
-                search_text = st.text_input("🔍 Suchen (Titel/Beschreibung)", placeholder="Suchtext eingeben")
-            
-            with col5:
-                date_filter_from = st.date_input("Von Datum", value=datetime.now() - timedelta(days=30))
-            
-            with col6:
-                date_filter_to = st.date_input("Bis Datum", value=datetime.now())
-            
-            # View mode toggle
-            view_mode = st.radio("Ansicht", ["📇 Kartensicht", "📋 Listensicht"], horizontal=True)
-            
-            # Export options
-            col_exp1, col_exp2 = st.columns(2)
-            
-            with col_exp1:
-                if st.button("📥 Als CSV exportieren", width='stretch'):
-                    csv_buffer = io.StringIO()
-                    csv_writer = csv.writer(csv_buffer)
-                    csv_writer.writerow(["ID", "Titel", "Kategorie", "Priorität", "Status", "Erstellt", "Support antwortet", "Tags"])
-                    
-                    for ticket in filtered_tickets:
-                        csv_writer.writerow([
-                            ticket["id"],
-                            ticket["title"],
-                            ticket["category"],
-                            ticket["priority"],
-                            ticket["status"],
-                            ticket["created_at"],
-                            ticket.get("support_response_at", ""),
-                            ", ".join(ticket.get("tags", []))
-                        ])
-                    
-                    st.download_button(
-                        label="⬇️ CSV herunterladen",
-                        data=csv_buffer.getvalue(),
-                        file_name=f"tickets_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                        mime="text/csv"
-                    )
-            
-            with col_exp2:
-                if st.button("📋 Als Pandas DataFrame", width='stretch'):
-                    csv_buffer = io.StringIO()
-                    csv_writer = csv.writer(csv_buffer)
-                    csv_writer.writerow(["ID", "Titel", "Kategorie", "Priorität", "Status", "Erstellt", "Support antwortet", "Antwortzeit"])
+            st.vega_lite_chart(spec=specs["histogram"], use_container_width=True)
+        
+        st.markdown("---")
+        
+        # Filter options
+        col1, col2, col3 = st.columns(3)
+        
+        with col1:
+            filter_status = st.selectbox("Nach Status filtern", ["Alle"] + settings["statuses"])
+        with col2:
+            filter_priority = st.selectbox("Nach Priorität filtern", ["Alle"] + settings["priorities"])
+        with col3:
+            filter_category = st.selectbox("Nach Kategorie filtern", ["Alle"] + settings["categories"])
+        
+        # Search and date filters
+        col4, col5, col6 = st.columns(3)
+        
+        with col4:
+            search_text = st.text_input("🔍 Suchen (Titel, Beschreibung, Konversationen, Tags)", placeholder="Suchbegriffe eingeben")
+        
+        with col5:
+            date_filter_from = st.date_input("Von Datum", value=datetime.now() - timedelta(days=30))
+        
+        with col6:
+            date_filter_to = st.date_input("Bis Datum", value=datetime.now())
+        
+        # Apply filters (planned by the storage backend, the result is a lazy id selection)
+        with span("filter"):
+            filtered_tickets = get_store().query(
+                status=None if filter_status == "Alle" else filter_status,
+                priority=None if filter_priority == "Alle" else filter_priority,
+                category=None if filter_category == "Alle" else filter_category,
+                date_from=date_filter_from or None,
+                date_to=date_filter_to or None,
+                search=search_text or None
+            )
+        
+        # View mode toggle
+        view_mode = st.radio("Ansicht", ["📇 Kartensicht", "📋 Listensicht"], horizontal=True)
+        
+        # Export options (files are built by background jobs, see the sidebar)
+        compress_export = st.checkbox("🗜️ Exporte gzip-komprimieren", key="export_gzip")
+        export_filters = {
+            "status": None if filter_status == "Alle" else filter_status,
+            "priority": None if filter_priority == "Alle" else filter_priority,
+            "category": None if filter_category == "Alle" else filter_category,
+            "date_from": date_filter_from.isoformat() if date_filter_from else None,
+            "date_to": date_filter_to.isoformat() if date_filter_to else None,
+            "search": search_text or None
+        }
+        col_exp1, col_exp2 = st.columns(2)
+        
+        with col_exp1:
+            export_button("📥 Als CSV exportieren", "csv", export_filters,
+                          "tickets", "csv", "text/csv", compress_export)
+        
+        with col_exp2:
+            export_button("📋 Detaillierter Report (CSV)", "report", export_filters,
+                          "tickets_report", "csv", "text/csv", compress_export)
+        
+        # Filled in below: the questions are counted over the tickets that are
+        # rendered anyway, so the selection is not resolved in full for them
+        summary = st.empty()
+        summary_text = f"**Angezeigte Tickets: {len(filtered_tickets)} / {ticket_count}**"
+        st.markdown("---")
+        
+        # Display tickets based on view mode
+        if view_mode == "📇 Kartensicht":
+            # Card view, paginated so the number of elements per rerun stays bounded
+            col_size, col_page = st.columns(2)
+            with col_size:
+                page_size = st.selectbox("Tickets pro Seite", PAGE_SIZES, index=1, key="page_size")
+            page_count = max(1, -(-len(filtered_tickets) // page_size))
+            if st.session_state.get("page", 1) > page_count:
+                # Fewer matches than before (filter or page size changed)
+                st.session_state.page = page_count
+            with col_page:
+                page = st.number_input(f"Seite (von {page_count})", min_value=1, max_value=page_count, step=1, key="page")
+            
+            page_tickets = filtered_tickets[(page - 1) * page_size:page * page_size]
+            answered, total = count_questions(page_tickets)
+            summary.markdown(f"{summary_text} | **Fragen auf dieser Seite: {answered}/{total}**")
+            for ticket in page_tickets:
+                with span("cards"), st.container(border=True):
+                    col1, col2 = st.columns([4, 1])
                     
-                    for ticket in filtered_tickets:
-                        response_time = ""
-                        if ticket.get("support_response_at"):
-                            try:
-                                created = datetime.strptime(ticket["created_at"], "%Y-%m-%d %H:%M:%S")
-                                responded = datetime.strptime(ticket["support_response_at"], "%Y-%m-%d %H:%M:%S")
-                                response_time = f"{(responded - created).total_seconds() / 3600:.2f}h"
-                            except:
-                                pass
+                    with col1:
+                        st.markdown(f"### {ticket['title']}")
+                        st.write(f"**Kategorie:** {ticket['category']} | **Priorität:** {ticket['priority']} | **Status:** {ticket['status']}")
+                        st.write(f"*Erstellt: {ticket['created_at']}*")
                         
-                        csv_writer.writerow([
-                            ticket["id"],
-                            ticket["title"],
-                            ticket["category"],
-                            ticket["priority"],
-                            ticket["status"],
-                            ticket["created_at"],
-                            ticket.get("support_response_at", ""),
-                            response_time
-                        ])
+                        if ticket.get("tags"):
+                            tags_str = " ".join([f"🏷️ {tag}" for tag in ticket["tags"]])
+                            st.write(tags_str)
+                        
+                        # Display exchanges, rendered only while the expander is open
+                        if ticket.get("exchanges"):
+                            history = st.expander(
+                                f"💬 Konversationen ({len(ticket['exchanges'])})",
+                                key=f"history_{ticket['id']}",
+                                on_change="rerun"
+                            )
+                            if history.open:
+                                with history:
+                                    for idx, exchange in enumerate(ticket["exchanges"], 1):
+                                        st.write(f"**Frage {idx}:** {exchange.get('question_text', '')}")
+                                        if exchange.get("response_at"):
+                                            st.write(f"*Beantwortet am {exchange['response_at']}:*")
+                                            st.write(f"> {exchange.get('response_text', '')}")
+                                            if exchange.get("response_seconds") is not None:
+                                                st.write(f"⏱️ Antwortzeit: {exchange['response_seconds'] / 3600:.1f}h")
+                                        else:
+                                            st.write("*Noch keine Antwort*")
+                                        st.divider()
+                        
+                        # Comments section
+                        if ticket.get("comments"):
+                            st.markdown("**📝 Kommentare:**")
+                            for comment in ticket["comments"]:
+                                st.write(f"- {comment}")
                     
-                    st.download_button(
-                        label="⬇️ Detaillierter Report",
-                        data=csv_buffer.getvalue(),
-                        file_name=f"tickets_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                        mime="text/csv"
-                    )
-            
-            # Apply filters
-            filtered_tickets = st.session_state.tickets
-            
-            if filter_status != "Alle":
-                filtered_tickets = [t for t in filtered_tickets if t["status"] == filter_status]
-            if filter_priority != "Alle":
-                filtered_tickets = [t for t in filtered_tickets if t["priority"] == filter_priority]
-            if filter_category != "Alle":
-                filtered_tickets = [t for t in filtered_tickets if t["category"] == filter_category]
-            
-            # Date filter
-            if date_filter_from and date_filter_to:
-                filtered_tickets = [t for t in filtered_tickets 
-                                  if date_filter_from.isoformat() <= t["created_at"][:10] <= date_filter_to.isoformat()]
-            
-            # Search filter
-            if search_text:
-                filtered_tickets = [t for t in filtered_tickets 
-                                  if search_text.lower() in t["title"].lower() or search_text.lower() in t["description"].lower()]
-            
-            # Count filtered exchanges
-            filtered_total_exchanges = sum(len(t.get("exchanges", [])) for t in filtered_tickets)
-            filtered_answered_exchanges = sum(len([e for e in t.get("exchanges", []) if e.get("response_at")]) for t in filtered_tickets)
-            
-            st.markdown(f"**Angezeigte Tickets: {len(filtered_tickets)} / {len(st.session_state.tickets)}** | **Fragen: {filtered_answered_exchanges}/{filtered_total_exchanges}**")
-            st.markdown("---")
-            
-            # Display tickets based on view mode
-            if view_mode == "📇 Kartensicht":
-                # Card view
-                for ticket in filtered_tickets:
-                    with st.container(border=True):
-                        col1, col2 = st.columns([4, 1])
+                    with col2:
+                        st.write("")  # spacing
+                        st.write("")  # spacing
+                        if st.button("⏰ Antwort", key=f"response_{ticket['id']}", width='stretch'):
+                            st.session_state[f"edit_response_{ticket['id']}"] = True
                         
-                        with col1:
-                            st.markdown(f"### {ticket['title']}")
-                            st.write(f"**Kategorie:** {ticket['category']} | **Priorität:** {ticket['priority']} | **Status:** {ticket['status']}")
-                            st.write(f"*Erstellt: {ticket['created_at']}*")
-                            
-                            if ticket.get("tags"):
-                                tags_str = " ".join([f"🏷️ {tag}" for tag in ticket["tags"]])
-                                st.write(tags_str)
-                            
-                            # Display exchanges
-                            if ticket.get("exchanges"):
-                                st.markdown("**💬 Konversationen:**")
-                                for idx, exchange in enumerate(ticket.get("exchanges", []), 1):
-                                    st.write(f"**Frage {idx}:** {exchange.get('question_text', '')}")
-                                    if exchange.get("response_at"):
-                                        st.write(f"*Beantwortet am {exchange['response_at']}:*")
-                                        st.write(f"> {exchange.get('response_text', '')}")
-                                        try:
-                                            q_time = datetime.strptime(exchange["question_at"], "%Y-%m-%d %H:%M:%S")
-                                            r_time = datetime.strptime(exchange["response_at"], "%Y-%m-%d %H:%M:%S")
-                                            hours = (r_time - q_time).total_seconds() / 3600
-                                            st.write(f"⏱️ Antwortzeit: {hours:.1f}h")
-                                        except:
-                                            pass
-                                    else:
-                                        st.write("*Noch keine Antwort*")
-                                    st.divider()
-                            
-                            # Comments section
-                            if ticket.get("comments"):
-                                st.markdown("**📝 Kommentare:**")
-                                for comment in ticket["comments"]:
-                                    st.write(f"- {comment}")
+                        if st.button("🗑️ Löschen", key=f"delete_{ticket['id']}", width='stretch'):
+                            get_service().delete(ticket["id"])
+                            st.success("✅ Ticket erfolgreich gelöscht!")
+                            st.rerun()
+                
+                # Edit response time
+                if st.session_state.get(f"edit_response_{ticket['id']}"):
+                    with st.expander(f"📝 Antwort für Ticket {ticket['id']} bearbeiten", expanded=True):
+                        # Find last unanswered exchange
+                        last_exchange_idx = -1
+                        for idx, exchange in enumerate(ticket.get("exchanges", [])):
+                            if not exchange.get("response_at"):
+                                last_exchange_idx = idx
                         
-                        with col2:
-                            st.write("")  # spacing
-                            st.write("")  # spacing
-                            if st.button("⏰ Antwort", key=f"response_{ticket['id']}", width='stretch'):
-                                st.session_state[f"edit_response_{ticket['id']}"] = True
+                        if last_exchange_idx >= 0:
+                            st.markdown(f"#### Antwort auf Frage {last_exchange_idx + 1}")
+                            st.write(f"**Frage:** {ticket['exchanges'][last_exchange_idx].get('question_text', '')}")
                             
-                            if st.button("🗑️ Löschen", key=f"delete_{ticket['id']}", width='stretch'):
-                                st.session_state.tickets = [t for t in st.session_state.tickets if t["id"] != ticket["id"]]
-                                save_tickets(st.session_state.tickets)
-                                st.success("✅ Ticket erfolgreich gelöscht!")
-                                st.rerun()
-                    
-                    # Edit response time
-                    if st.session_state.get(f"edit_response_{ticket['id']}"):
-                        with st.expander(f"📝 Antwort für Ticket {ticket['id']} bearbeiten", expanded=True):
-                            # Find last unanswered exchange
-                            last_exchange_idx = -1
-                            for idx, exchange in enumerate(ticket.get("exchanges", [])):
-                                if not exchange.get("response_at"):
-                                    last_exchange_idx = idx
+                            response_date = st.date_input(f"Antwortdatum", key=f"resp_date_{ticket['id']}")
+                            response_time = st.time_input(f"Antwortzeit", key=f"resp_time_{ticket['id']}")
+                            response_text = st.text_area("Antwort", placeholder="Geben Sie die Antwort ein", key=f"resp_text_{ticket['id']}", height=150)
                             
-                            if last_exchange_idx >= 0:
-                                st.markdown(f"#### Antwort auf Frage {last_exchange_idx + 1}")
-                                st.write(f"**Frage:** {ticket['exchanges'][last_exchange_idx].get('question_text', '')}")
-                                
-                                response_date = st.date_input(f"Antwortdatum", key=f"resp_date_{ticket['id']}")
-                                response_time = st.time_input(f"Antwortzeit", key=f"resp_time_{ticket['id']}")
-                                response_text = st.text_area("Antwort", placeholder="Geben Sie die Antwort ein", key=f"resp_text_{ticket['id']}", height=150)
-                                
-                                col_save, col_cancel = st.columns(2)
-                                
-                                with col_save:
-                                    if st.button("💾 Antwort speichern", key=f"save_response_{ticket['id']}", width='stretch'):
-                                        response_datetime = datetime.combine(response_date, response_time).strftime("%Y-%m-%d %H:%M:%S")
-                                        for t in st.session_state.tickets:
-                                            if t["id"] == ticket["id"]:
-                                                if "exchanges" not in t:
-                                                    t["exchanges"] = []
-                                                t["exchanges"][last_exchange_idx]["response_at"] = response_datetime
-                                                t["exchanges"][last_exchange_idx]["response_text"] = response_text
-                                                t["support_response_at"] = response_datetime
-                                        save_tickets(st.session_state.tickets)
+                            col_save, col_cancel = st.columns(2)
+                            
+                            with col_save:
+                                if st.button("💾 Antwort speichern", key=f"save_response_{ticket['id']}", width='stretch'):
+                                    response_datetime = datetime.combine(response_date, response_time).strftime("%Y-%m-%d %H:%M:%S")
+                                    try:
+                                        get_service().answer(ticket["id"], response_text, response_datetime, index=last_exchange_idx)
+                                    except ConflictError:
+                                        st.error("❌ Diese Frage wurde inzwischen von jemand anderem beantwortet. Bitte Seite neu laden.")
+                                    else:
                                         st.session_state[f"edit_response_{ticket['id']}"] = False
                                         st.success("✅ Antwort gespeichert!")
                                         st.rerun()
-                                
-                                with col_cancel:
-                                    if st.button("✖️ Abbrechen", key=f"cancel_response_{ticket['id']}", width='stretch'):
-                                        st.session_state[f"edit_response_{ticket['id']}"] = False
-                                        st.rerun()
-                                
-                                st.markdown("---")
-                                st.markdown("#### 📌 Neue Frage zur Konversation hinzufügen")
-                                new_question = st.text_area("Neue Frage", placeholder="Neue Frage stellen", key=f"new_question_{ticket['id']}", height=100)
-                                
-                                if st.button("➕ Neue Frage hinzufügen", key=f"add_question_{ticket['id']}", width='stretch'):
-                                    if new_question.strip():
-                                        for t in st.session_state.tickets:
-                                            if t["id"] == ticket["id"]:
-                                                if "exchanges" not in t:
-                                                    t["exchanges"] = []
-                                                t["exchanges"].append({
-                                                    "question_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                                                    "question_text": new_question,
-                                                    "response_at": None,
-                                                    "response_text": ""
-                                                })
-                                        save_tickets(st.session_state.tickets)
+                            
+                            with col_cancel:
+                                if st.button("✖️ Abbrechen", key=f"cancel_response_{ticket['id']}", width='stretch'):
+                                    st.session_state[f"edit_response_{ticket['id']}"] = False
+                                    st.rerun()
+                            
+                            st.markdown("---")
+                            st.markdown("#### 📌 Neue Frage zur Konversation hinzufügen")
+                            new_question = st.text_area("Neue Frage", placeholder="Neue Frage stellen", key=f"new_question_{ticket['id']}", height=100)
+                            
+                            if st.button("➕ Neue Frage hinzufügen", key=f"add_question_{ticket['id']}", width='stretch'):
+                                if new_question.strip():
+                                    try:
+                                        get_service().add_question(ticket["id"], new_question)
+                                    except ConflictError:
+                                        st.error("❌ Das Ticket wurde inzwischen gelöscht.")
+                                    else:
                                         st.success("✅ Neue Frage hinzugefügt! Warten auf Antwort...")
                                         st.rerun()
-                            else:
-                                st.success("✅ Alle Fragen wurden bereits beantwortet!")
-                                st.markdown("#### 📌 Neue Frage zur Konversation hinzufügen")
-                                new_question = st.text_area("Neue Frage", placeholder="Neue Frage stellen", key=f"new_question_{ticket['id']}", height=100)
-                                
-                                if st.button("➕ Neue Frage hinzufügen", key=f"add_question_{ticket['id']}", width='stretch'):
-                                    if new_question.strip():
-                                        for t in st.session_state.tickets:
-                                            if t["id"] == ticket["id"]:
-                                                if "exchanges" not in t:
-                                                    t["exchanges"] = []
-                                                t["exchanges"].append({
-                                                    "question_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                                                    "question_text": new_question,
-                                                    "response_at": None,
-                                                    "response_text": ""
-                                                })
-                                        save_tickets(st.session_state.tickets)
+                        else:
+                            st.success("✅ Alle Fragen wurden bereits beantwortet!")
+                            st.markdown("#### 📌 Neue Frage zur Konversation hinzufügen")
+                            new_question = st.text_area("Neue Frage", placeholder="Neue Frage stellen", key=f"new_question_{ticket['id']}", height=100)
+                            
+                            if st.button("➕ Neue Frage hinzufügen", key=f"add_question_{ticket['id']}", width='stretch'):
+                                if new_question.strip():
+                                    try:
+                                        get_service().add_question(ticket["id"], new_question)
+                                    except ConflictError:
+                                        st.error("❌ Das Ticket wurde inzwischen gelöscht.")
+                                    else:
                                         st.success("✅ Neue Frage hinzugefügt!")
                                         st.rerun()
+        
+        else:  # List view
+            with span("cards"):
+                # The table shows every match, so they are resolved once for all uses below
+                listed_tickets = list(filtered_tickets)
+                df = ticket_table(listed_tickets)
+                st.dataframe(df, use_container_width=True, hide_index=True)
+            answered, total = count_questions(listed_tickets)
+            summary.markdown(f"{summary_text} | **Fragen: {answered}/{total}**")
             
-            else:  # List view
-                # Create DataFrame for table view
-                table_data = []
-                for ticket in filtered_tickets:
-                    # Count exchanges
-                    total_exchanges = len(ticket.get("exchanges", []))
-                    answered_exchanges = len([e for e in ticket.get("exchanges", []) if e.get("response_at")])
-                    
-                    # Last response
-                    last_response = ""
-                    last_response_hours = ""
+            st.markdown("---")
+            
+            # Edit response time for selected tickets
+            st.markdown("#### Support-Antwort bearbeiten")
+            ticket_to_edit = st.selectbox("Wählen Sie ein Ticket zur Bearbeitung", 
+                                          [f"ID: {t['id']} - {t['title']}" for t in listed_tickets] + [""])
+            
+            if ticket_to_edit:
+                ticket_id = int(ticket_to_edit.split(" - ")[0].split(": ")[1])
+                ticket = get_store().get(ticket_id)
+                
+                if ticket:
+                    col1, col2 = st.columns(2)
                     
-                    if ticket.get("exchanges"):
-                        for exchange in reversed(ticket.get("exchanges", [])):
-                            if exchange.get("response_at"):
-                                last_response = exchange["response_at"]
-                                try:
-                                    q_time = datetime.strptime(exchange["question_at"], "%Y-%m-%d %H:%M:%S")
-                                    r_time = datetime.strptime(exchange["response_at"], "%Y-%m-%d %H:%M:%S")
-                                    last_response_hours = f"{(r_time - q_time).total_seconds() / 3600:.1f}h"
-                                except:
-                                    pass
-                                break
+                    with col1:
+                        response_date = st.date_input("Antwortdatum", key=f"resp_date_list_{ticket_id}")
                     
-                    table_data.append({
-                        "ID": ticket["id"],
-                        "Titel": ticket["title"],
-                        "Kategorie": ticket["category"],
-                        "Priorität": ticket["priority"],
-                        "Status": ticket["status"],
-                        "Fragen": f"{answered_exchanges}/{total_exchanges}",
-                        "Erstellt": ticket["created_at"],
-                        "Letzte Antwort": last_response if last_response else "Keine",
-                        "Antwortzeit": last_response_hours
-                    })
-                
-                df = pd.DataFrame(table_data)
-                st.dataframe(df, use_container_width=True, hide_index=True)
-                
-                st.markdown("---")
-                
-                # Edit response time for selected tickets
-                st.markdown("#### Support-Antwort bearbeiten")
-                ticket_to_edit = st.selectbox("Wählen Sie ein Ticket zur Bearbeitung", 
-                                              [f"ID: {t['id']} - {t['title']}" for t in filtered_tickets] + [""])
-                
-                if ticket_to_edit:
-                    ticket_id = int(ticket_to_edit.split(" - ")[0].split(": ")[1])
-                    ticket = next((t for t in st.session_state.tickets if t["id"] == ticket_id), None)
+                    with col2:
+                        response_time = st.time_input("Antwortzeit", key=f"resp_time_list_{ticket_id}")
                     
-                    if ticket:
-                        col1, col2 = st.columns(2)
-                        
-                        with col1:
-                            response_date = st.date_input("Antwortdatum", key=f"resp_date_list_{ticket_id}")
-                        
-                        with col2:
-                            response_time = st.time_input("Antwortzeit", key=f"resp_time_list_{ticket_id}")
-                        
-                        if st.button("💾 Antwortzeit speichern", width='stretch'):
-                            response_datetime = datetime.combine(response_date, response_time).strftime("%Y-%m-%d %H:%M:%S")
-                            for t in st.session_state.tickets:
-                                if t["id"] == ticket_id:
-                                    t["support_response_at"] = response_datetime
-                            save_tickets(st.session_state.tickets)
+                    if st.button("💾 Antwortzeit speichern", width='stretch'):
+                        response_datetime = datetime.combine(response_date, response_time).strftime("%Y-%m-%d %H:%M:%S")
+                        try:
+                            get_service().set_support_response(ticket_id, response_datetime, expected_version=ticket.get("version"))
+                        except ConflictError:
+                            st.error("❌ Das Ticket wurde inzwischen von jemand anderem geändert. Bitte Seite neu laden.")
+                        else:
                             st.success("✅ Antwortzeit gespeichert!")
                             st.rerun()
+
+def stats_page(ticket_count):
+    """Exchange based statistics and charts"""
+    settings = load_settings()
+    st.markdown("### 📊 Erweiterte Statistiken (Exchange-basiert)")
+    
+    if not ticket_count:
+        st.info("Keine Daten für Statistiken verfügbar.")
+    else:
+        # Gesamtstatistiken
+        st.markdown("#### 📌 Gesamt-Gesprächsmetriken")
+        
+        with span("aggregate"):
+            stats = get_store().stats
+        with span("chart"):
+            specs = stats_charts(
+                get_store().version,
+                tuple(settings["priorities"]),
+                tuple(settings["categories"])
+            )
+        total_all_exchanges = stats.exchanges
+        total_all_answered = stats.answered
+        
+        metric_col1, metric_col2, metric_col3 = st.columns(3)
+        
+        with metric_col1:
+            st.metric("Gesamt Fragen", total_all_exchanges)
+        
+        with metric_col2:
+            st.metric("Beantwortete Fragen", total_all_answered)
         
-        # Tab 3: Advanced Statistics
-        with tab3:
-            st.markdown("### 📊 Erweiterte Statistiken (Exchange-basiert)")
+        with metric_col3:
+            pending_all = total_all_exchanges - total_all_answered
+            st.metric("Ausstehend", pending_all)
+        
+        st.markdown("---")
+        
+        # Response distribution pie chart for all exchanges
+        st.markdown("#### 📊 Gesamte Fragen-Antwort Verteilung")
+        
+        col_pie1, col_pie2 = st.columns(2)
+        
+        with col_pie1:
+            st.vega_lite_chart(spec=specs["response"], use_container_width=True)
+        
+        # Daily trends
+        with col_pie2:
+            st.markdown("#### 📈 Tägliche Fragen")
             
-            if not st.session_state.tickets:
-                st.info("Keine Daten für Statistiken verfügbar.")
+            if "daily_questions" in specs:
+                st.vega_lite_chart(spec=specs["daily_questions"], use_container_width=True)
             else:
-                # Gesamtstatistiken
-                st.markdown("#### 📌 Gesamt-Gesprächsmetriken")
-                
-                total_all_exchanges = sum(len(t.get("exchanges", [])) for t in st.session_state.tickets)
-                total_all_answered = sum(len([e for e in t.get("exchanges", []) if e.get("response_at")]) for t in st.session_state.tickets)
-                
-                metric_col1, metric_col2, metric_col3 = st.columns(3)
-                
-                with metric_col1:
-                    st.metric("Gesamt Fragen", total_all_exchanges)
-                
-                with metric_col2:
-                    st.metric("Beantwortete Fragen", total_all_answered)
-                
-                with metric_col3:
-                    pending_all = total_all_exchanges - total_all_answered
-                    st.metric("Ausstehend", pending_all)
-                
-                st.markdown("---")
-                
-                # Response distribution pie chart for all exchanges
-                st.markdown("#### 📊 Gesamte Fragen-Antwort Verteilung")
-                
-                col_pie1, col_pie2 = st.columns(2)
-                
-                with col_pie1:
-                    response_dist = pd.DataFrame({
-                        "Status": ["Beantwortet", "Ausstehend"],
-                        "Anzahl": [total_all_answered, pending_all]
-                    })
-                    
-                    dist_pie = alt.Chart(response_dist).mark_arc(innerRadius=0).encode(
-                        theta="Anzahl:Q",
-                        color=alt.Color("Status:N", scale=alt.Scale(
-                            domain=["Beantwortet", "Ausstehend"],
-                            range=["#4CAF50", "#FF9800"]
-                        )),
-                        tooltip=["Status:N", "Anzahl:Q"]
-                    ).properties(
-                        title="Alle Fragen Status",
-                        height=300
-                    )
-                    st.altair_chart(dist_pie, use_container_width=True)
-                
-                # Daily trends
-                with col_pie2:
-                    st.markdown("#### 📈 Tägliche Fragen")
-                    
-                    daily_questions = {}
-                    for ticket in st.session_state.tickets:
-                        for exchange in ticket.get("exchanges", []):
-                            date = exchange["question_at"][:10]
-                            daily_questions[date] = daily_questions.get(date, 0) + 1
-                    
-                    if daily_questions:
-                        daily_q_df = pd.DataFrame({
-                            "Datum": pd.to_datetime(list(daily_questions.keys())),
-                            "Fragen": list(daily_questions.values())
-                        }).sort_values("Datum")
-                        
-                        line_chart = alt.Chart(daily_q_df).mark_line(point=True).encode(
-                            x=alt.X("Datum:T", title="Datum"),
-                            y=alt.Y("Fragen:Q", title="Anzahl Fragen"),
-                            tooltip=["Datum:T", "Fragen:Q"]
-                        ).properties(
-                            title="Fragen pro Tag",
-                            height=300
-                        )
-                        st.altair_chart(line_chart, use_container_width=True)
-                    else:
-                        st.info("Keine täglichen Daten verfügbar")
-                
-                st.markdown("---")
-                
-                st.markdown("#### 📆 Tägliche Tickets und Fragen")
-                
-                col_trend1, col_trend2 = st.columns(2)
-                
-                with col_trend1:
-                    daily_data = {}
-                    for ticket in st.session_state.tickets:
-                        date = ticket["created_at"][:10]
-                        daily_data[date] = daily_data.get(date, 0) + 1
-                    
-                    if daily_data:
-                        daily_df = pd.DataFrame({
-                            "Datum": pd.to_datetime(list(daily_data.keys())),
-                            "Tickets": list(daily_data.values())
-                        }).sort_values("Datum")
-                        
-                        line_chart = alt.Chart(daily_df).mark_line(point=True).encode(
-                            x=alt.X("Datum:T", title="Datum"),
-                            y=alt.Y("Tickets:Q", title="Anzahl Tickets"),
-                            tooltip=["Datum:T", "Tickets:Q"]
-                        ).properties(
-                            title="Tickets pro Tag",
-                            height=300
-                        )
-                        st.altair_chart(line_chart, use_container_width=True)
-                    else:
-                        st.info("Keine Ticket-Daten verfügbar")
-                
-                with col_trend2:
-                    st.markdown("")
-                    st.markdown("")
-                    daily_questions2 = {}
-                    for ticket in st.session_state.tickets:
-                        for exchange in ticket.get("exchanges", []):
-                            date = exchange["question_at"][:10]
-                            daily_questions2[date] = daily_questions2.get(date, 0) + 1
-                    
-                    if daily_questions2:
-                        daily_q_df2 = pd.DataFrame({
-                            "Datum": pd.to_datetime(list(daily_questions2.keys())),
-                            "Fragen": list(daily_questions2.values())
-                        }).sort_values("Datum")
-                        
-                        q_line_chart = alt.Chart(daily_q_df2).mark_line(point=True, color="#FF6B6B").encode(
-                            x=alt.X("Datum:T", title="Datum"),
-                            y=alt.Y("Fragen:Q", title="Anzahl Fragen"),
-                            tooltip=["Datum:T", "Fragen:Q"]
-                        ).properties(
-                            title="Fragen pro Tag",
-                            height=300
-                        )
-                        st.altair_chart(q_line_chart, use_container_width=True)
-                    else:
-                        st.info("Keine Fragen-Daten verfügbar")
-                
-                st.markdown("---")
-                
-                st.markdown("#### ⏱️ Durchschnittliche Antwortzeit pro Priorität (Exchange-basiert)")
-                
-                priority_response_times = {}
-                priority_counts = {}
-                
-                for ticket in st.session_state.tickets:
-                    if ticket.get("exchanges"):
-                        for exchange in ticket.get("exchanges", []):
-                            if exchange.get("response_at") and exchange.get("question_at"):
-                                try:
-                                    created = datetime.strptime(exchange["question_at"], "%Y-%m-%d %H:%M:%S")
-                                    responded = datetime.strptime(exchange["response_at"], "%Y-%m-%d %H:%M:%S")
-                                    response_hours = (responded - created).total_seconds() / 3600
-                                    priority = ticket["priority"]
-                                    
-                                    if priority not in priority_response_times:
-                                        priority_response_times[priority] = []
-                                        priority_counts[priority] = 0
-                                    
-                                    priority_response_times[priority].append(response_hours)
-                                    priority_counts[priority] += 1
-                                except:
-                                    pass
-                
-                priority_avg_data = []
-                for priority, times in priority_response_times.items():
-                    avg_time = sum(times) / len(times) if times else 0
-                    priority_avg_data.append({
-                        "Priorität": priority,
-                        "Ø Antwortzeit (h)": avg_time
-                    })
-                
-                if priority_avg_data:
-                    priority_df = pd.DataFrame(priority_avg_data)
-                    priority_bar = alt.Chart(priority_df).mark_bar().encode(
-                        x=alt.X("Priorität:N", title="Priorität"),
-                        y=alt.Y("Ø Antwortzeit (h):Q", title="Stunden"),
-                        color=alt.Color("Priorität:N", scale=alt.Scale(
-                            domain=st.session_state.settings["priorities"],
-                            range=["#4CAF50", "#FFC107", "#F44336"]
-                        ))
-                    ).properties(
-                        height=300
-                    )
-                    st.altair_chart(priority_bar, use_container_width=True)
-                else:
-                    st.info("Keine Response-Time-Daten verfügbar")
-                
-                # Response rate by category
-                st.markdown("#### 📂 Response Rate nach Kategorie (Exchange-basiert)")
-                
-                category_stats = {}
-                for category in st.session_state.settings["categories"]:
-                    category_tickets = [t for t in st.session_state.tickets if t["category"] == category]
-                    if category_tickets:
-                        total_exchanges = sum(len(t.get("exchanges", [])) for t in category_tickets)
-                        answered_exchanges = sum(len([e for e in t.get("exchanges", []) if e.get("response_at")]) for t in category_tickets)
-                        if total_exchanges > 0:
-                            category_stats[category] = (answered_exchanges / total_exchanges) * 100
-                
-                if category_stats:
-                    category_df = pd.DataFrame({
-                        "Kategorie": list(category_stats.keys()),
-                        "Response Rate (%)": list(category_stats.values())
-                    })
-                    
-                    category_bar = alt.Chart(category_df).mark_bar().encode(
-                        x=alt.X("Response Rate (%):Q", title="Response Rate (%)"),
-                        y=alt.Y("Kategorie:N", title="Kategorie"),
-                        color=alt.Color("Response Rate (%):Q", scale=alt.Scale(scheme="greens"))
-                    ).properties(
-                        height=300
-                    )
-                    st.altair_chart(category_bar, use_container_width=True)
-                else:
-                    st.info("Keine Kategorie-Daten verfügbar")
-        
-        # Tab 4: Settings
-        with tab4:
-            st.markdown("### ⚙️ Systemeinstellungen")
-            
-            st.markdown("#### Prioritäten verwalten")
-            priorities_str = ", ".join(st.session_state.settings["priorities"])
-            new_priorities = st.text_area("Prioritäten (durch Komma trennen)", value=priorities_str, height=100)
-            
-            st.markdown("#### Kategorien verwalten")
-            categories_str = ", ".join(st.session_state.settings["categories"])
-            new_categories = st.text_area("Kategorien (durch Komma trennen)", value=categories_str, height=100)
-            
-            st.markdown("#### Status verwalten")
-            statuses_str = ", ".join(st.session_state.settings["statuses"])
-            new_statuses = st.text_area("Status (durch Komma trennen)", value=statuses_str, height=100)
-            
-            if st.button("💾 Einstellungen speichern", width='stretch'):
-                st.session_state.settings["priorities"] = [p.strip() for p in new_priorities.split(",")]
-                st.session_state.settings["categories"] = [c.strip() for c in new_categories.split(",")]
-                st.session_state.settings["statuses"] = [s.strip() for s in new_statuses.split(",")]
-                
-                st.success("✅ Einstellungen gespeichert!")
-            
-            st.markdown("---")
-            st.markdown("#### 📊 Datenexport & Backup")
-            
-            if st.button("💾 Alle Tickets als JSON exportieren", width='stretch'):
-                json_data = json.dumps(st.session_state.tickets, ensure_ascii=False, indent=2)
-                st.download_button(
-                    label="⬇️ JSON herunterladen",
-                    data=json_data,
-                    file_name=f"tickets_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
-                    mime="application/json"
-                )
+                st.info("Keine täglichen Daten verfügbar")
+        
+        st.markdown("---")
+        
+        st.markdown("#### 📆 Tickets und Fragen im Zeitverlauf")
+        
+        granularity = st.segmented_control("Zeitraster", list(GRANULARITIES), format_func=GRANULARITIES.get,
+                                           default="day", key="trend_granularity", required=True)
+        with span("chart"):
+            trend_specs = trend_charts(get_store().version, granularity)
+        
+        col_trend1, col_trend2 = st.columns(2)
+        
+        with col_trend1:
+            if "tickets" in trend_specs:
+                st.vega_lite_chart(spec=trend_specs["tickets"], use_container_width=True)
+            else:
+                st.info("Keine Ticket-Daten verfügbar")
+            if "answered" in trend_specs:
+                st.vega_lite_chart(spec=trend_specs["answered"], use_container_width=True)
+        
+        with col_trend2:
+            if "questions" in trend_specs:
+                st.vega_lite_chart(spec=trend_specs["questions"], use_container_width=True)
+            else:
+                st.info("Keine Fragen-Daten verfügbar")
+            if "median" in trend_specs:
+                st.vega_lite_chart(spec=trend_specs["median"], use_container_width=True)
+        
+        st.markdown("---")
+        
+        st.markdown("#### 🎯 Antwortzeit-Perzentile und SLA")
+        
+        sla_hours = settings.get("sla_hours", {})
+        with span("aggregate"):
+            tables = response_tables(get_store().version, tuple(sla_hours.items()))
+        if tables["priority"].empty:
+            st.info("Keine Response-Time-Daten verfügbar")
+        else:
+            st.caption("SLA-Ziele: " + ", ".join(f"{p} {h}h" for p, h in sla_hours.items()))
+            col_sla1, col_sla2 = st.columns(2)
+            with col_sla1:
+                st.dataframe(tables["priority"], width='stretch')
+            with col_sla2:
+                st.dataframe(tables["category"], width='stretch')
+        
+        st.markdown("#### ⏱️ Durchschnittliche Antwortzeit pro Priorität (Exchange-basiert)")
+        
+        if "priority_response" in specs:
+            st.vega_lite_chart(spec=specs["priority_response"], use_container_width=True)
+        else:
+            st.info("Keine Response-Time-Daten verfügbar")
+        
+        # Response rate by category
+        st.markdown("#### 📂 Response Rate nach Kategorie (Exchange-basiert)")
+        
+        if "category_rate" in specs:
+            st.vega_lite_chart(spec=specs["category_rate"], use_container_width=True)
+        else:
+            st.info("Keine Kategorie-Daten verfügbar")
+
+def reset_settings_form():
+    """Drop the edits on the settings page, it shows the saved settings on the next rerun"""
+    for key in [k for k in st.session_state if str(k).startswith("settings_")]:
+        del st.session_state[key]
+
+def settings_page():
+    """Settings, backup export and import"""
+    st.markdown("### ⚙️ Systemeinstellungen")
+    
+    service = get_service()
+    settings = load_settings()
+    # Edits are checked against the settings version they started from; the
+    # widget states only exist while the page stays open
+    if not any(f"settings_{name}" in st.session_state for name in FIELDS):
+        st.session_state.settings_version = service.settings.version
+    
+    new_settings = {}
+    for name, (heading, label, _) in SETTINGS_LISTS.items():
+        st.markdown(f"#### {heading} verwalten")
+        text = st.text_area(f"{label} (durch Komma trennen)", value=", ".join(settings[name]),
+                            height=100, key=f"settings_{name}")
+        new_settings[name] = [v.strip() for v in text.split(",") if v.strip()]
+    
+    # Values that tickets still use but that are no longer configured can be moved to a new value
+    renames = {}
+    stats = get_store().stats
+    for name, (_, _, field_label) in SETTINGS_LISTS.items():
+        counts = getattr(stats, f"by_{FIELDS[name]}")
+        removed = [v for v in counts if v and v not in new_settings[name]]
+        if not removed:
+            continue
+        guesses = guess_renames(settings[name], new_settings[name])
+        options = [None] + new_settings[name]
+        for value in removed:
+            target = st.selectbox(
+                f"{field_label} „{value}“ ({counts[value]} Tickets) umstellen auf",
+                options,
+                index=options.index(guesses[value]) if value in guesses else 0,
+                format_func=lambda v: "– nicht umstellen –" if v is None else v,
+                key=f"settings_rename_{name}_{value}"
+            )
+            if target is not None:
+                renames.setdefault(name, {})[value] = target
+    
+    # The status whose tickets get archived follows a rename
+    resolved = renames.get("statuses", {}).get(settings["resolved_status"], settings["resolved_status"])
+    statuses = new_settings["statuses"]
+    new_settings["resolved_status"] = st.selectbox(
+        "Status erledigter Tickets (werden archiviert)", statuses,
+        index=statuses.index(resolved) if resolved in statuses else len(statuses) - 1,
+        key="settings_resolved_status"
+    ) if statuses else None
+    
+    if st.button("💾 Einstellungen speichern", width='stretch'):
+        try:
+            service.update_settings(new_settings, renames, st.session_state.settings_version)
+        except ConflictError:
+            reset_settings_form()
+            st.error("❌ Die Einstellungen wurden inzwischen von jemand anderem geändert. Bitte erneut bearbeiten.")
+        except ValueError as e:
+            st.error(f"❌ Ungültige Einstellungen: {e}")
+        else:
+            reset_settings_form()
+            moved = sum(getattr(stats, f"by_{FIELDS[name]}")[value]
+                        for name, mapping in renames.items() for value in mapping)
+            st.toast("✅ Einstellungen gespeichert!" + (f" {moved} Tickets umgestellt." if moved else ""))
+            st.rerun()
+    
+    st.markdown("---")
+    st.markdown("#### 📊 Datenexport & Backup")
+    
+    compress_backup = st.checkbox("🗜️ Backup gzip-komprimieren", key="backup_gzip")
+    export_button("💾 Alle Tickets als JSON exportieren", "json", {},
+                  "tickets_backup", "json", "application/json", compress_backup)
+    
+    st.markdown("#### 📥 Tickets importieren")
+    upload = st.file_uploader("JSONL- oder CSV-Datei", type=["jsonl", "json", "csv"], key="import_file")
+    
+    if upload is not None and st.button("📥 Import starten", width='stretch'):
+        # The job reads the upload from a file, it deletes the file when it is done
+        upload_path = os.path.join(JOBS_DIR, f"upload_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}")
+        with open(upload_path, "wb") as f:
+            f.write(upload.getbuffer())
+        submit_job("import", path=upload_path, name=upload.name)
+        st.toast("⏳ Import gestartet, der Fortschritt erscheint in der Seitenleiste")
+    
+    st.markdown("#### 🧰 Wartung")
+    col_maint1, col_maint2 = st.columns(2)
+    
+    with col_maint1:
+        if st.button("🧹 Speicher verdichten", width='stretch'):
+            submit_job("compact")
+    
+    with col_maint2:
+        if st.button("🔄 Statistiken neu aufbauen", width='stretch'):
+            submit_job("rebuild")
+    
+    if ARCHIVE_DAYS is not None:
+        status = settings["resolved_status"]
+        if st.button(f"🗄️ Tickets „{status}“ archivieren (älter als {ARCHIVE_DAYS} Tage)", width='stretch'):
+            submit_job("archive", days=ARCHIVE_DAYS, status=status)
+
+def timing_panel():
+    """Sidebar breakdown of the last reruns of this process, only shown with TICKETS_TIMING=1"""
+    with st.sidebar.expander("⏱️ Laufzeiten (Admin)"):
+        history = RECORDER.history()
+        if not history:
+            st.caption("Noch keine Messungen")
+            return
+        rows = []
+        for rerun in history:
+            row = {"Zeit": rerun["at"][11:19], "Bereich": rerun["section"], "Gesamt": rerun["total_ms"]}
+            row.update({phase: rerun["phases_ms"].get(phase, 0.0) for phase in PHASES})
+            # Widget rendering and everything not covered by a span
+            row["Rest"] = rerun["total_ms"] - sum(rerun["phases_ms"].values())
+            rows.append(row)
+        st.dataframe(pd.DataFrame(rows).round(1), hide_index=True, width='stretch')
+        st.caption("Millisekunden je Rerun, neueste zuerst")
+
+def main_app():
+    """Main application"""
+    # Sidebar
+    st.sidebar.markdown("# 🎫 Support-Tickets")
+    st.sidebar.markdown("---")
+    
+    if st.sidebar.button("🚪 Abmelden", width='stretch'):
+        st.session_state.logged_in = False
+        st.rerun()
+    
+    st.sidebar.markdown("---")
+    
+    # Main content
+    st.markdown("<h1>🎫 Support-Tickets System</h1>", unsafe_allow_html=True)
+    
+    # Navigation instead of st.tabs, which runs the code of every tab on each rerun
+    section = st.segmented_control("Bereich", SECTIONS, default=SECTIONS[0], key="section",
+                                   required=True, label_visibility="collapsed")
+    
+    with RECORDER.rerun(section):
+        if section == "➕ Neues Ticket":
+            new_ticket_page()
+        elif section == "📋 Tickets":
+            tickets_page(load_ticket_count())
+        elif section == "📊 Erweiterte Stats":
+            stats_page(load_ticket_count())
+        else:
+            load_ticket_count()
+            settings_page()
+    
+    jobs_panel()
+    
+    if RECORDER.enabled:
+        timing_panel()
 
 # Main logic
 
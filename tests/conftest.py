@@ -0,0 +1,51 @@
+import pytest
+
+from tickets import open_store
+from tickets.service import TicketService
+from tickets.settings import SettingsStore, settings_path
+
+BACKENDS = {"json": "tickets.json", "bin": "tickets.bin", "db": "tickets.db"}
+
+
+def make_ticket(**fields):
+    """A valid new ticket with one open question"""
+    return {
+        "title": "Drucker druckt nicht",
+        "description": "Seit dem Update kommt nichts mehr an",
+        "category": "Bug",
+        "priority": "🔴 Hoch",
+        "status": "Offen",
+        "created_at": "2024-03-01 09:00:00",
+        "exchanges": [{
+            "question_at": "2024-03-01 09:00:00",
+            "question_text": "Seit dem Update kommt nichts mehr an",
+            "response_at": None,
+            "response_text": "",
+        }],
+        **fields,
+    }
+
+
+@pytest.fixture(params=list(BACKENDS))
+def store_path(request, tmp_path):
+    return str(tmp_path / BACKENDS[request.param])
+
+
+@pytest.fixture
+def store(store_path):
+    store = open_store(store_path)
+    store.load()
+    return store
+
+
+@pytest.fixture
+def service(store, store_path):
+    settings = SettingsStore(settings_path(store_path))
+    settings.load()
+    return TicketService(store, settings)
+
+
+@pytest.fixture(autouse=True)
+def no_archive(monkeypatch):
+    # open_store() wraps the store in a TieredStore if this is set
+    monkeypatch.delenv("TICKETS_ARCHIVE_DAYS", raising=False)
@@ -0,0 +1,119 @@
+import asyncio
+import json
+
+import pytest
+
+from tickets.api import create_app
+
+from conftest import make_ticket
+
+
+def call(service, method, path, body=None):
+    """(status, decoded body) of one request to the ASGI app"""
+    app = create_app(service)
+    path, _, query = path.partition("?")
+    scope = {"type": "http", "method": method, "path": path, "query_string": query.encode()}
+    request = [{"type": "http.request", "body": b"" if body is None else json.dumps(body).encode()}]
+    sent = []
+
+    async def receive():
+        return request.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    content = sent[1]["body"]
+    headers = dict(sent[0]["headers"])
+    if headers[b"content-type"] == b"application/json":
+        return sent[0]["status"], json.loads(content)
+    return sent[0]["status"], content.decode()
+
+
+@pytest.fixture
+def ticket_id(service):
+    status, body = call(service, "POST", "/tickets", make_ticket())
+    assert status == 201
+    return body["id"]
+
+
+def test_create_get_answer(service, ticket_id):
+    assert call(service, "POST", f"/tickets/{ticket_id}/answers", {"text": "Treiber neu installieren"}) == \
+        (200, {"ok": True, "index": 0})
+    status, ticket = call(service, "GET", f"/tickets/{ticket_id}")
+    assert status == 200
+    assert ticket["exchanges"][0]["response_text"] == "Treiber neu installieren"
+    assert call(service, "POST", f"/tickets/{ticket_id}/questions", {"text": "Jetzt druckt er doppelt"})[0] == 201
+    status, body = call(service, "GET", "/tickets?status=Offen")
+    assert status == 200 and body["total"] == 1
+
+
+@pytest.mark.parametrize("path", ["/tickets/99", "/tickets/99/questions", "/tickets/99/answers"])
+def test_unknown_ticket_is_404(service, path):
+    method = "GET" if path == "/tickets/99" else "POST"
+    status, body = call(service, method, path, None if method == "GET" else {"text": "Hallo?"})
+    assert status == 404, body
+
+
+@pytest.mark.parametrize("route, body", [
+    ("answers", {"text": "ok", "index": "a"}),
+    ("answers", {"text": "ok", "index": -1}),
+    ("answers", {"text": "ok", "index": True}),
+    ("answers", {"text": "ok", "index": 5}),
+    ("answers", {"text": 5}),
+    ("answers", {"text": "ok", "answered_at": 12}),
+    ("answers", {"text": "ok", "expected_version": "1"}),
+    ("questions", {"text": 5}),
+    ("questions", {"text": "  "}),
+    ("questions", {}),
+    ("questions", {"text": "ok", "asked_at": "gestern"}),
+])
+def test_invalid_input_is_400(service, ticket_id, route, body):
+    status, response = call(service, "POST", f"/tickets/{ticket_id}/{route}", body)
+    assert status == 400, response
+    assert "error" in response
+
+
+def test_invalid_ticket_is_400(service):
+    assert call(service, "POST", "/tickets", {"title": "ohne alles", "priority": 3})[0] == 400
+    assert call(service, "POST", "/tickets", [make_ticket(), {"status": []}])[0] == 400
+    assert call(service, "POST", "/tickets", [1, 2]) == (400, {"error": "ticket 0: ticket must be an object"})
+    assert call(service, "POST", "/batch", [{"op": "create", "ticket": "x"}])[1]["results"][0]["ok"] is False
+    assert call(service, "GET", "/stats")[1]["tickets"] == 0
+
+
+def test_stale_version_is_409(service, ticket_id):
+    assert call(service, "POST", f"/tickets/{ticket_id}/questions", {"text": "a", "expected_version": 1})[0] == 201
+    status, _ = call(service, "POST", f"/tickets/{ticket_id}/questions", {"text": "b", "expected_version": 1})
+    assert status == 409
+
+
+def test_answered_question_is_409(service, ticket_id):
+    assert call(service, "POST", f"/tickets/{ticket_id}/answers", {"text": "a", "index": 0})[0] == 200
+    assert call(service, "POST", f"/tickets/{ticket_id}/answers", {"text": "b", "index": 0})[0] == 409
+
+
+def test_batch_reports_errors_per_operation(service, ticket_id):
+    status, body = call(service, "POST", "/batch", [
+        {"op": "create", "ticket": make_ticket(title="Zweites")},
+        {"op": "answer", "id": ticket_id, "text": 5},
+        {"op": "add_question", "id": 99, "text": "x"},
+        {"op": "delete", "id": ticket_id},
+    ])
+    assert status == 200
+    assert [r["ok"] for r in body["results"]] == [True, False, False, True]
+    assert body["results"][1]["error"] == "ValueError"
+    assert body["results"][2]["error"] == "NotFoundError"
+
+
+def test_internal_key_error_is_not_404(service, ticket_id, monkeypatch):
+    def broken(ticket_id):
+        return {}["exchanges"]
+    monkeypatch.setattr(service, "get", broken)
+    with pytest.raises(KeyError):
+        call(service, "GET", f"/tickets/{ticket_id}")
+
+
+def test_unknown_route_and_method(service):
+    assert call(service, "GET", "/nothing")[0] == 404
+    assert call(service, "PUT", "/tickets")[0] == 405
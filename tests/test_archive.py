@@ -0,0 +1,129 @@
+import os
+
+import pandas as pd
+import pytest
+
+from tickets import open_store
+from tickets.archive import TieredStore, archive_dir
+from tickets.errors import ConflictError
+from tickets.service import TicketService
+from tickets.settings import SettingsStore, settings_path
+from tickets.stats import TicketStats
+from tickets.synthetic import generate_tickets
+
+QUERIES = [
+    {"status": "Gelöst"},
+    {"status": "Offen"},
+    {"priority": "🔴 Hoch", "date_from": "2024-01-01", "date_to": "2024-03-31"},
+    {"category": "Bug"},
+    {"search": "fehler"},
+    {"status": "Gelöst", "category": "Support", "date_to": "2024-02-01"},
+]
+
+
+def stats_dict(stats):
+    data = stats.to_dict()
+    data["response_histogram"] = sorted(data["response_histogram"])
+    return data
+
+
+@pytest.fixture
+def tiered(store_path, monkeypatch):
+    monkeypatch.setenv("TICKETS_ARCHIVE_DAYS", "30")
+    store = open_store(store_path)
+    store.load()
+    store.replace_all(list(generate_tickets(300, seed=1)))
+    return store
+
+
+def test_archive_keeps_the_view(tiered, store_path):
+    assert isinstance(tiered, TieredStore)
+    stats = stats_dict(tiered.stats)
+    ids = list(tiered.tickets.ids)
+    queries = [tiered.query_ids(**q) for q in QUERIES]
+    opened = tiered.trend("opened", "month")
+    response_times = tiered.response_times("priority")
+
+    moved = tiered.archive_resolved(30, "Gelöst")
+    assert moved > 0
+    assert len(tiered.archive) == moved
+    assert len(tiered.hot.query_ids()) == len(ids) - moved
+    assert stats_dict(tiered.stats) == stats
+    assert list(tiered.tickets.ids) == ids
+    for query, expected in zip(QUERIES, queries):
+        assert sorted(tiered.query_ids(**query)) == sorted(expected), query
+    pd.testing.assert_series_equal(tiered.trend("opened", "month").sort_index(), opened.sort_index(),
+                                   check_dtype=False)
+    pd.testing.assert_frame_equal(tiered.response_times("priority").sort_index(),
+                                  response_times.sort_index(), check_dtype=False)
+    assert len({t["id"] for t in tiered.tickets}) == len(ids)
+    assert os.listdir(archive_dir(store_path))
+
+
+def test_change_thaws_ticket(tiered):
+    tiered.archive_resolved(30, "Gelöst")
+    ticket_id = tiered.archive.ids()[0]
+    version = tiered.get(ticket_id).get("version", 1)
+
+    tiered.add_exchange(ticket_id, {"question_at": "2025-01-01 10:00:00", "question_text": "Wieder da?",
+                                    "response_at": None, "response_text": ""}, version)
+    assert ticket_id not in tiered.archive
+    assert tiered.hot.get(ticket_id)["version"] == version + 1
+    assert stats_dict(tiered.stats) == stats_dict(TicketStats.from_tickets(tiered.tickets))
+
+
+def test_delete_archived(tiered):
+    tiered.archive_resolved(30, "Gelöst")
+    ticket_id = tiered.archive.ids()[0]
+    with pytest.raises(ConflictError):
+        tiered.delete(ticket_id, expected_version=999)
+    tiered.delete(ticket_id)
+    assert tiered.get(ticket_id) is None
+    assert stats_dict(tiered.stats) == stats_dict(TicketStats.from_tickets(tiered.tickets))
+
+
+def test_rename_archived(tiered):
+    tiered.archive_resolved(30, "Gelöst")
+    tiered.rename_values("category", {"Bug": "Fehler"})
+    assert "Bug" not in tiered.stats.by_category
+    assert tiered.query_ids(category="Bug") == []
+    assert stats_dict(tiered.stats) == stats_dict(TicketStats.from_tickets(tiered.tickets))
+
+
+def test_reload_settles_interrupted_archival(tiered, store_path):
+    tiered.archive_resolved(30, "Gelöst")
+    other = open_store(store_path)
+    other.load()
+    assert stats_dict(other.stats) == stats_dict(tiered.stats)
+
+    # A crash after the archive was written, before the working set was updated
+    ticket = other.hot.get(other.hot.query_ids()[0])
+    other.archive.add([ticket])
+    reloaded = open_store(store_path)
+    reloaded.load()
+    assert ticket["id"] not in reloaded.archive
+    assert stats_dict(reloaded.stats) == stats_dict(tiered.stats)
+
+
+def test_other_process_sees_archival(tiered, store_path):
+    other = open_store(store_path)
+    other.load()
+    moved = other.archive_resolved(30, "Gelöst")
+    assert tiered.refresh()
+    assert len(tiered.archive) == moved
+    assert stats_dict(tiered.stats) == stats_dict(other.stats)
+
+
+def test_archive_after_renamed_status(tiered, store_path):
+    settings = SettingsStore(settings_path(store_path))
+    settings.load()
+    service = TicketService(tiered, settings)
+    resolved = len(tiered.query_ids(status="Gelöst"))
+    service.update_settings({"statuses": ["Offen", "In Bearbeitung", "Erledigt"]},
+                            {"statuses": {"Gelöst": "Erledigt"}})
+    assert settings.values["resolved_status"] == "Erledigt"
+
+    assert tiered.archive_resolved(30, settings.values["resolved_status"]) == resolved
+    assert tiered.query_ids(status="Gelöst") == []
+    with pytest.raises(ValueError, match="resolved_status"):
+        service.update_settings({"statuses": ["Offen", "Geschlossen"]})
@@ -0,0 +1,39 @@
+import copy
+import json
+
+from tickets.export import export_json
+
+
+def baseline_ticket(title, created_at, response_at=None):
+    """A ticket with the keys in the order the app always created them"""
+    return {
+        "title": title,
+        "description": f"{title} geht nicht",
+        "category": "Support",
+        "priority": "🟡 Mittel",
+        "status": "Offen",
+        "created_at": created_at,
+        "support_response_at": response_at,
+        "tags": [title.lower()],
+        "comments": [],
+        "exchanges": [{
+            "question_at": created_at,
+            "question_text": f"{title} geht nicht",
+            "response_at": response_at,
+            "response_text": "Neu starten" if response_at else "",
+        }],
+    }
+
+
+def test_json_backup_keeps_the_baseline_format(store):
+    records = [baseline_ticket("Drucker", "2024-03-01 09:00:00"),
+               baseline_ticket("VPN", "2024-03-02 09:00:00", "2024-03-02 10:30:00")]
+    originals = copy.deepcopy(records)
+    ids = store.create_many(records)
+    store.update(ids[0], status="In Bearbeitung")
+
+    expected = [{"id": ticket_id, **record} for ticket_id, record in zip(ids, originals)]
+    expected[0]["status"] = "In Bearbeitung"
+    # Byte for byte the backup the app wrote before the stores existed
+    assert "".join(export_json(store.tickets)) == json.dumps(expected, ensure_ascii=False, indent=2)
+    assert "".join(export_json([])) == json.dumps([], indent=2)
@@ -0,0 +1,61 @@
+import io
+import json
+
+from tickets import open_store
+from tickets.importer import import_tickets, read_csv, read_jsonl
+from tickets.synthetic import generate_tickets
+
+from conftest import make_ticket
+
+
+def jsonl(records):
+    return io.StringIO("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records))
+
+
+def test_import_skips_duplicates(store):
+    records = [make_ticket(title=f"Ticket {i}", created_at=f"2024-03-0{i} 09:00:00") for i in range(1, 6)]
+    store.create(make_ticket(title="Ticket 1", created_at="2024-03-01 09:00:00"))
+    errors = io.StringIO()
+
+    report = import_tickets(store, read_jsonl(jsonl(records + [records[2], {"title": "ohne"}])),
+                            batch_size=2, errors=errors)
+    assert (report.read, report.imported, report.duplicates, report.errors) == (7, 4, 2, 1)
+    assert json.loads(errors.getvalue())["line"] == 7
+    assert len(store.tickets) == 5
+
+    report = import_tickets(store, read_jsonl(jsonl(records)))
+    assert (report.imported, report.duplicates) == (0, 5)
+
+
+def test_import_csv(store):
+    lines = io.StringIO(
+        "Titel,Beschreibung,Kategorie,Priorität,Status,Erstellt,Tags\n"
+        "VPN,Keine Verbindung,Support,🟡 Mittel,Offen,2024-03-01T08:00,\"vpn, netz\"\n"
+        "Drucker,,Bug,🔴 Hoch,Offen,gestern,\n"
+    )
+    report = import_tickets(store, read_csv(lines))
+    assert (report.imported, report.errors) == (1, 1)
+    ticket = store.tickets[0]
+    assert ticket["created_at"] == "2024-03-01 08:00:00"
+    assert ticket["tags"] == ["vpn", "netz"]
+
+
+def test_import_dedupes_against_archive(store_path, monkeypatch):
+    monkeypatch.setenv("TICKETS_ARCHIVE_DAYS", "30")
+    store = open_store(store_path)
+    store.load()
+    records = list(generate_tickets(200, seed=4))
+    assert import_tickets(store, iter((i, r, None) for i, r in enumerate(records))).imported == 200
+    assert store.archive_resolved(30, "Gelöst") > 0
+
+    looked_up = []
+    created_at_ids = store.archive.created_at_ids
+
+    def spy(values):
+        looked_up.append(set(values))
+        return created_at_ids(values)
+    monkeypatch.setattr(store.archive, "created_at_ids", spy)
+    report = import_tickets(store, iter((i, r, None) for i, r in enumerate(records[:20])))
+    assert (report.imported, report.duplicates) == (0, 20)
+    # Only the timestamps of the input were looked up
+    assert looked_up == [{r["created_at"] for r in records[:20]}]
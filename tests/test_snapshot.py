@@ -0,0 +1,77 @@
+from tickets.model import as_dict
+from tickets.snapshot import MAGIC, MappedTicket, convert, main
+from tickets.store import JournalStore
+from tickets.synthetic import generate_tickets
+
+from conftest import make_ticket
+
+
+def loaded(path):
+    store = JournalStore(str(path))
+    store.load()
+    return store
+
+
+def decoded(ticket):
+    """Whether the text fields of a mapped ticket were read from the file"""
+    try:
+        object.__getattribute__(ticket, "extra")
+    except AttributeError:
+        return False
+    return True
+
+
+def test_convert_round_trip(tmp_path):
+    source = tmp_path / "tickets.json"
+    store = loaded(source)
+    store.replace_all(list(generate_tickets(300, seed=2)))
+    store.create(make_ticket(title="Nur im Journal"))
+    expected = [as_dict(t) for t in store.tickets]
+
+    assert convert(str(source), str(tmp_path / "tickets.bin"), check=True) == 301
+    assert (tmp_path / "tickets.bin").read_bytes().startswith(MAGIC)
+    binary = loaded(tmp_path / "tickets.bin")
+    assert [as_dict(t) for t in binary.tickets] == expected
+    assert binary.stats.to_dict() == store.stats.to_dict()
+
+    (tmp_path / "back").mkdir()
+    assert main([str(tmp_path / "tickets.bin"), str(tmp_path / "back" / "tickets.json"), "--check"]) == 0
+    assert [as_dict(t) for t in loaded(tmp_path / "back" / "tickets.json").tickets] == expected
+
+
+def test_mapped_tickets_stay_lazy(tmp_path):
+    path = tmp_path / "tickets.bin"
+    loaded(path).replace_all(list(generate_tickets(200, seed=2)))
+    store = loaded(path)
+    assert all(isinstance(t, MappedTicket) for t in store.tickets)
+
+    store.query(status="Offen", priority="🔴 Hoch")
+    store.stats.to_dict()
+    store.trend("answered", "month")
+    assert not any(decoded(t) for t in store.tickets)
+
+    ticket = store.get(store.query_ids(status="Offen")[0])
+    assert ticket["title"]
+    assert decoded(ticket)
+    assert sum(decoded(t) for t in store.tickets) == 1
+
+
+def test_binary_writes_and_compaction(tmp_path):
+    path = tmp_path / "tickets.bin"
+    loaded(path).replace_all(list(generate_tickets(100, seed=2)))
+    store = JournalStore(str(path), compact_every=3)
+    store.load()
+    first = store.tickets[0]
+    ticket_id = store.create(make_ticket(title="Neu"))
+    store.answer_exchange(ticket_id, 0, "2024-03-01 10:00:00", "Erledigt")
+    store.update(first["id"], status="Gelöst")
+    store.delete(store.tickets[1]["id"])
+    store.compact()
+
+    # Tickets read before the snapshot was replaced are still readable
+    assert first["title"]
+    reloaded = loaded(path)
+    assert [as_dict(t) for t in reloaded.tickets] == [as_dict(t) for t in store.tickets]
+    assert reloaded.get(ticket_id)["exchanges"][0]["response_text"] == "Erledigt"
+    assert reloaded.get(first["id"])["status"] == "Gelöst"
+    assert reloaded.stats.to_dict() == store.stats.to_dict()
@@ -0,0 +1,197 @@
+import os
+
+import pandas as pd
+import pytest
+
+from tickets import open_store
+from tickets.errors import ConflictError
+from tickets.model import as_dict
+from tickets.service import new_ticket
+from tickets.store import JournalStore
+from tickets.synthetic import generate_tickets
+
+from conftest import BACKENDS, make_ticket
+
+QUERIES = [
+    {"status": "Offen"},
+    {"status": "Gelöst", "priority": "🟡 Mittel"},
+    {"category": "Bug", "date_from": "2024-01-01", "date_to": "2024-03-31"},
+    {"search": "drucker"},
+    {"search": "vpn verbindet"},
+    {"search": "störung", "status": "Gelöst"},
+    {"search": "groesse"},
+]
+
+
+def backend_paths(tmp_path):
+    # A directory per backend, tickets.json and tickets.bin would share their journal
+    paths = {}
+    for backend, name in BACKENDS.items():
+        (tmp_path / backend).mkdir()
+        paths[backend] = str(tmp_path / backend / name)
+    return paths
+
+
+def reopened(path):
+    store = open_store(path)
+    store.load()
+    return store
+
+
+def ticket_dicts(store):
+    # The SQLite store gives every ticket a version, the journaled store only changed ones
+    return [{**as_dict(t), "version": t.get("version", 1)} for t in store.tickets]
+
+
+@pytest.mark.parametrize("backend", ["json", "bin"])
+def test_journal_replay_after_torn_tail(tmp_path, backend):
+    path = str(tmp_path / BACKENDS[backend])
+    store = open_store(path)
+    store.load()
+    first = store.create(make_ticket(title="Erstes"))
+    store.create(make_ticket(title="Zweites"))
+    # A crash in the middle of an append leaves half a record behind
+    with open(store.journal_path, "ab") as f:
+        f.write(b'{"seq":3,"op":"create","ticket":{"title":"Hal')
+
+    store = reopened(path)
+    assert [t["title"] for t in store.tickets] == ["Erstes", "Zweites"]
+    store.add_exchange(first, {"question_at": "2024-03-02 10:00:00", "question_text": "Und jetzt?",
+                               "response_at": None, "response_text": ""})
+    third = store.create(make_ticket(title="Drittes"))
+
+    store = reopened(path)
+    assert [t["title"] for t in store.tickets] == ["Erstes", "Zweites", "Drittes"]
+    assert len(store.get(first)["exchanges"]) == 2
+    assert third == 3
+    store.compact()
+    assert [t["title"] for t in reopened(path).tickets] == ["Erstes", "Zweites", "Drittes"]
+
+
+def test_conflicting_updates(store_path):
+    first, second = reopened(store_path), reopened(store_path)
+    ticket_id = first.create(make_ticket())
+    second.refresh()
+    version = second.get(ticket_id).get("version", 1)
+
+    first.update(ticket_id, expected_version=version, status="In Bearbeitung")
+    with pytest.raises(ConflictError):
+        second.update(ticket_id, expected_version=version, status="Gelöst")
+    second.refresh()
+    assert second.get(ticket_id)["status"] == "In Bearbeitung"
+    assert second.get(ticket_id)["version"] == version + 1
+
+
+def test_answer_race(store_path):
+    first, second = reopened(store_path), reopened(store_path)
+    ticket_id = first.create(make_ticket())
+    second.refresh()
+
+    first.answer_exchange(ticket_id, 0, "2024-03-01 10:00:00", "Treiber neu installiert")
+    # Answering a question someone else answered meanwhile never overwrites the answer
+    with pytest.raises(ConflictError):
+        second.answer_exchange(ticket_id, 0, "2024-03-01 10:05:00", "Neu starten")
+    assert reopened(store_path).get(ticket_id)["exchanges"][0]["response_text"] == "Treiber neu installiert"
+
+
+def test_delete_conflict(store_path):
+    store = reopened(store_path)
+    ticket_id = store.create(make_ticket())
+    store.update(ticket_id, status="Gelöst")
+    with pytest.raises(ConflictError):
+        store.delete(ticket_id, expected_version=1)
+    store.delete(ticket_id, expected_version=2)
+    assert reopened(store_path).get(ticket_id) is None
+
+
+def test_backend_parity(tmp_path):
+    tickets = list(generate_tickets(400, seed=3))
+    stores = {}
+    for backend, path in backend_paths(tmp_path).items():
+        open_store(path).replace_all(tickets)
+        stores[backend] = reopened(path)
+    expected = stores.pop("json")
+
+    for backend, store in stores.items():
+        assert ticket_dicts(store) == ticket_dicts(expected), backend
+        assert store.stats.to_dict() == expected.stats.to_dict(), backend
+        for query in QUERIES:
+            assert store.query_ids(**query) == expected.query_ids(**query), (backend, query)
+        for metric in ("opened", "asked", "answered", "p50_hours"):
+            pd.testing.assert_series_equal(store.trend(metric, "month"), expected.trend(metric, "month"))
+        pd.testing.assert_frame_equal(store.response_times("priority").sort_index(),
+                                      expected.response_times("priority").sort_index())
+
+
+def test_backend_parity_after_changes(tmp_path):
+    paths = backend_paths(tmp_path)
+    for path in paths.values():
+        store = reopened(path)
+        # Validated like the app and the API do, so both backends get the same fields
+        ids = store.create_many([new_ticket(make_ticket(title=f"Ticket {i}", category=c))
+                                 for i, c in enumerate(["Bug", "Support", "Bug"])])
+        store.answer_exchange(ids[0], 0, "2024-03-01 11:30:00", "Erledigt")
+        store.update(ids[1], status="Gelöst")
+        store.delete(ids[2])
+        store.rename_values("category", {"Bug": "Fehler"})
+    expected = reopened(paths["json"])
+
+    for backend, path in paths.items():
+        store = reopened(path)
+        assert ticket_dicts(store) == ticket_dicts(expected), backend
+        assert store.stats.to_dict() == expected.stats.to_dict(), backend
+        assert store.query_ids(category="Fehler") == [1]
+
+
+def test_backend_parity_of_get(tmp_path):
+    # Raw tickets, so the optional keys are missing or empty as given
+    records = [
+        make_ticket(title="Ohne Listen"),
+        make_ticket(title="Leere Listen", tags=[], comments=[], support_response_at=None),
+        {key: value for key, value in make_ticket(title="Ohne Fragen").items() if key != "exchanges"},
+        make_ticket(title="Mit Listen", tags=["drucker"], comments=["Angerufen"], exchanges=[]),
+    ]
+    tickets = {}
+    for backend, path in backend_paths(tmp_path).items():
+        store = reopened(path)
+        ids = store.create_many([dict(r) for r in records])
+        store.add_exchange(ids[2], {"question_at": "2024-03-02 09:00:00", "question_text": "Und jetzt?",
+                                    "response_at": None, "response_text": ""})
+        store.answer_exchange(ids[0], 0, "2024-03-01 11:30:00", "Erledigt")
+        store.update(ids[3], status="Gelöst")
+        reloaded = reopened(path)
+        tickets[backend] = [as_dict(reloaded.get(ticket_id)) for ticket_id in ids]
+    expected = tickets.pop("json")
+
+    assert "tags" not in expected[0] and expected[1]["tags"] == []
+    for backend, got in tickets.items():
+        assert got == expected, backend
+
+
+@pytest.mark.parametrize("backend", ["json", "bin"])
+def test_replace_all_on_unloaded_store(tmp_path, backend):
+    path = str(tmp_path / BACKENDS[backend])
+    store = reopened(path)
+    store.replace_all([{**make_ticket(title="Alt"), "id": 1}])
+    store.create(make_ticket(title="Nur im Journal"))
+
+    # Neither loaded nor up to date with the snapshot and the journal on disk
+    JournalStore(path).replace_all([{**make_ticket(title="Neu"), "id": 7}])
+    assert [t["title"] for t in reopened(path).tickets] == ["Neu"]
+    JournalStore(path).replace_all([{**make_ticket(title="Noch neuer"), "id": 7}])
+    assert [t["title"] for t in reopened(path).tickets] == ["Noch neuer"]
+
+    assert store.refresh()
+    assert [t["title"] for t in store.tickets] == ["Noch neuer"]
+    assert store.create(make_ticket(title="Danach")) == 8
+    assert [t["title"] for t in reopened(path).tickets] == ["Noch neuer", "Danach"]
+
+
+def test_snapshot_written_atomically(tmp_path):
+    path = str(tmp_path / "tickets.json")
+    store = JournalStore(path, compact_every=2)
+    store.load()
+    for i in range(5):
+        store.create(make_ticket(title=f"Ticket {i}"))
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+    assert [t["title"] for t in reopened(path).tickets] == [f"Ticket {i}" for i in range(5)]
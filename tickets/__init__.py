@@ -0,0 +1,23 @@
+"""Ticket storage and query helpers used by the Streamlit app"""
+import os
+
+
+def open_store(path):
+    """Open the ticket store for a path, picking the backend by file extension
+
+    ``*.db``, ``*.sqlite`` and ``*.sqlite3`` use the SQLite store, anything
+    else the journaled store (``*.bin`` with a binary snapshot, see
+    snapshot.py). If the store has an archive directory or
+    ``TICKETS_ARCHIVE_DAYS`` is set, the store is wrapped in a TieredStore
+    (see archive.py).
+    """
+    if os.path.splitext(path)[1].lower() in (".db", ".sqlite", ".sqlite3"):
+        from .sqlite_store import SQLiteStore
+        store = SQLiteStore(path)
+    else:
+        from .store import JournalStore
+        store = JournalStore(path)
+    from .archive import Archive, TieredStore, archive_days, archive_dir
+    if os.path.isdir(archive_dir(path)) or archive_days() is not None:
+        return TieredStore(store, Archive(archive_dir(path)))
+    return store
@@ -0,0 +1,111 @@
+"""Columnar views of the tickets for the statistics tab.
+
+The tickets are flattened once into DataFrames (one row per ticket and one
+row per exchange) with categorical priority/status/category columns. The
+aggregations below are plain vectorized groupbys on those frames, so the
+caller only has to rebuild the frames when the data version changes.
+Trends over time come from the rollups instead, see rollups.py, and so do
+the aggregations of a store with an archive (``rollup_response_rate()``).
+
+``ticket_table()`` builds the table of the list view.
+"""
+import numpy as np
+import pandas as pd
+
+
+def build_frames(tickets):
+    """Return (tickets_df, exchanges_df) for a sequence of annotated tickets"""
+    ticket_rows = {"id": [], "priority": [], "status": [], "category": [], "created_ts": []}
+    exchange_rows = {
+        "ticket_id": [], "priority": [], "status": [], "category": [],
+        "question_ts": [], "response_seconds": [], "answered": [],
+    }
+    for t in tickets:
+        ticket_rows["id"].append(t["id"])
+        ticket_rows["priority"].append(t["priority"])
+        ticket_rows["status"].append(t["status"])
+        ticket_rows["category"].append(t["category"])
+        ticket_rows["created_ts"].append(t.get("created_ts"))
+        for e in t.get("exchanges", []):
+            exchange_rows["ticket_id"].append(t["id"])
+            exchange_rows["priority"].append(t["priority"])
+            exchange_rows["status"].append(t["status"])
+            exchange_rows["category"].append(t["category"])
+            exchange_rows["question_ts"].append(e.get("question_ts"))
+            exchange_rows["response_seconds"].append(e.get("response_seconds"))
+            exchange_rows["answered"].append(bool(e.get("response_at")))
+
+    tickets_df = pd.DataFrame({
+        "id": np.asarray(ticket_rows["id"], dtype="int64"),
+        "priority": pd.Categorical(ticket_rows["priority"]),
+        "status": pd.Categorical(ticket_rows["status"]),
+        "category": pd.Categorical(ticket_rows["category"]),
+        "created_ts": pd.array(ticket_rows["created_ts"], dtype="Int64"),
+    })
+    exchanges_df = pd.DataFrame({
+        "ticket_id": np.asarray(exchange_rows["ticket_id"], dtype="int64"),
+        "priority": pd.Categorical(exchange_rows["priority"]),
+        "status": pd.Categorical(exchange_rows["status"]),
+        "category": pd.Categorical(exchange_rows["category"]),
+        "question_ts": pd.array(exchange_rows["question_ts"], dtype="Int64"),
+        "response_seconds": pd.array(exchange_rows["response_seconds"], dtype="Int64"),
+        "answered": np.asarray(exchange_rows["answered"], dtype=bool),
+    })
+    return tickets_df, exchanges_df
+
+
+def avg_response_hours(exchanges_df, by):
+    """Mean response time in hours per value of a categorical column"""
+    answered = exchanges_df[exchanges_df["response_seconds"].notna()]
+    hours = answered["response_seconds"].astype("float64") / 3600
+    return hours.groupby(answered[by], observed=True).mean()
+
+
+def response_rate(exchanges_df, by):
+    """Share of answered exchanges in percent per value of a categorical column"""
+    return exchanges_df["answered"].groupby(exchanges_df[by], observed=True).mean() * 100
+
+
+def rollup_response_rate(store, categories):
+    """Share of answered questions in percent per category, from the rollups of a store
+
+    For stores whose tickets are too expensive to read in full (see
+    archive.py). Questions without a parsable timestamp are not counted.
+    """
+    rates = {}
+    for category in categories:
+        asked = store.trend("asked", "month", category=category).sum()
+        if asked:
+            rates[category] = store.trend("answered", "month", category=category).sum() / asked * 100
+    return pd.Series(rates, dtype="float64")
+
+
+def ticket_table(tickets):
+    """DataFrame of the list view, one row per ticket"""
+    table_data = []
+    for ticket in tickets:
+        exchanges = ticket.get("exchanges", [])
+        answered_exchanges = sum(1 for e in exchanges if e.get("response_at"))
+
+        # Last response
+        last_response = ""
+        last_response_hours = ""
+        for exchange in reversed(exchanges):
+            if exchange.get("response_at"):
+                last_response = exchange["response_at"]
+                if exchange.get("response_seconds") is not None:
+                    last_response_hours = f"{exchange['response_seconds'] / 3600:.1f}h"
+                break
+
+        table_data.append({
+            "ID": ticket["id"],
+            "Titel": ticket["title"],
+            "Kategorie": ticket["category"],
+            "Priorität": ticket["priority"],
+            "Status": ticket["status"],
+            "Fragen": f"{answered_exchanges}/{len(exchanges)}",
+            "Erstellt": ticket["created_at"],
+            "Letzte Antwort": last_response if last_response else "Keine",
+            "Antwortzeit": last_response_hours
+        })
+    return pd.DataFrame(table_data)
@@ -0,0 +1,229 @@
+"""HTTP/JSON API over the ticket service, as a plain ASGI application.
+
+Other systems can create, answer and query tickets without going through
+the Streamlit app. ``create_app(service)`` returns the ASGI callable; it
+has no dependencies of its own and runs under any ASGI server. The command
+line entry point uses uvicorn (``pip install uvicorn``), which keeps HTTP
+connections alive between requests, so a client that reuses its connection
+and sends tickets in batches avoids a handshake and a store write per
+ticket.
+
+Endpoints (request and response bodies are JSON)::
+
+    GET    /tickets                  ?status=&priority=&category=&date_from=&date_to=&search=&offset=&limit=
+    POST   /tickets                  one ticket object, or an array of them (one write)
+    GET    /tickets/{id}
+    DELETE /tickets/{id}
+    POST   /tickets/{id}/questions   {"text": ..., "asked_at": ...}
+    POST   /tickets/{id}/answers     {"text": ..., "answered_at": ..., "index": ...}
+    POST   /batch                    [{"op": "create", "ticket": {...}}, {"op": "answer", "id": 1, ...}, ...]
+    GET    /stats
+    GET    /settings
+    PUT    /settings                 {"priorities": [...], ..., "renames": {"priorities": {old: new}}, "version": ...}
+    GET    /metrics                  timings in the Prometheus text format (see timing.py)
+
+Invalid input is answered with 400, unknown tickets with 404 and changes
+that conflict with a concurrent change (see ConflictError) with 409. The
+``version`` sent with new settings is the one they were based on. Store
+calls block, so they run in a worker thread and the event loop keeps
+serving other connections.
+
+Usage::
+
+    python -m tickets.api [--store tickets.db] [--host 127.0.0.1] [--port 8600]
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+from urllib.parse import parse_qs
+
+from .errors import ConflictError, NotFoundError
+from .model import to_json
+from .service import DEFAULT_LIMIT, QUERY_FILTERS, TicketService
+from .timing import RECORDER
+
+# Largest accepted request body
+MAX_BODY = 32 << 20
+
+# Largest page of GET /tickets
+MAX_LIMIT = 1000
+
+_TICKET_PATH = re.compile(r"^/tickets/(\d+)(/questions|/answers)?$")
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _json_body(value):
+    return json.dumps(value, ensure_ascii=False, default=to_json).encode("utf-8")
+
+
+async def _read_body(receive):
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            raise HTTPError(400, "client disconnected")
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > MAX_BODY:
+            raise HTTPError(413, f"request body larger than {MAX_BODY} bytes")
+        chunks.append(chunk)
+        if not message.get("more_body"):
+            break
+    if not size:
+        raise HTTPError(400, "request body is missing")
+    try:
+        return json.loads(b"".join(chunks))
+    except ValueError as e:
+        raise HTTPError(400, f"invalid JSON: {e}") from None
+
+
+def _int(params, name, default):
+    try:
+        return int(params[name][0]) if name in params else default
+    except ValueError:
+        raise HTTPError(400, f"{name} must be an integer") from None
+
+
+def _object(body):
+    if not isinstance(body, dict):
+        raise HTTPError(400, "request body must be a JSON object")
+    return body
+
+
+class TicketAPI:
+    """ASGI application that routes requests to a TicketService"""
+
+    def __init__(self, service):
+        self.service = service
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+        if scope["type"] != "http":
+            return
+
+        try:
+            status, body = await self._route(scope, receive)
+        except HTTPError as e:
+            status, body = e.status, {"error": str(e)}
+        except NotFoundError as e:
+            status, body = 404, {"error": f"ticket {e.args[0]} not found"}
+        except ValueError as e:
+            status, body = 400, {"error": str(e)}
+        except ConflictError as e:
+            status, body = 409, {"error": str(e)}
+
+        if isinstance(body, str):
+            content, content_type = body.encode("utf-8"), b"text/plain; version=0.0.4; charset=utf-8"
+        else:
+            content, content_type = _json_body(body), b"application/json"
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", content_type), (b"content-length", str(len(content)).encode())],
+        })
+        await send({"type": "http.response.body", "body": content})
+
+    async def _route(self, scope, receive):
+        """(status, JSON value or text) for a request"""
+        method = scope["method"]
+        path = scope["path"].rstrip("/") or "/"
+        service = self.service
+
+        if path == "/tickets":
+            if method == "GET":
+                params = parse_qs(scope.get("query_string", b"").decode("utf-8"))
+                filters = {name: params[name][0] for name in QUERY_FILTERS if params.get(name, [""])[0]}
+                offset = max(0, _int(params, "offset", 0))
+                limit = min(MAX_LIMIT, max(0, _int(params, "limit", DEFAULT_LIMIT)))
+                total, tickets = await asyncio.to_thread(service.query, offset, limit, **filters)
+                return 200, {"total": total, "offset": offset, "tickets": tickets}
+            if method == "POST":
+                body = await _read_body(receive)
+                if isinstance(body, list):
+                    return 201, {"ids": await asyncio.to_thread(service.create_many, body)}
+                return 201, {"id": await asyncio.to_thread(service.create, _object(body))}
+            raise HTTPError(405, f"{method} not allowed")
+
+        match = _TICKET_PATH.match(path)
+        if match:
+            ticket_id, action = int(match.group(1)), match.group(2)
+            if action is None and method == "GET":
+                return 200, await asyncio.to_thread(service.get, ticket_id)
+            if action is None and method == "DELETE":
+                await asyncio.to_thread(service.delete, ticket_id)
+                return 200, {"ok": True}
+            if action == "/questions" and method == "POST":
+                body = _object(await _read_body(receive))
+                await asyncio.to_thread(service.add_question, ticket_id, body.get("text"), body.get("asked_at"),
+                                        body.get("expected_version"))
+                return 201, {"ok": True}
+            if action == "/answers" and method == "POST":
+                body = _object(await _read_body(receive))
+                index = await asyncio.to_thread(service.answer, ticket_id, body.get("text"), body.get("answered_at"),
+                                                body.get("index"), body.get("expected_version"))
+                return 200, {"ok": True, "index": index}
+            raise HTTPError(405, f"{method} not allowed")
+
+        if path == "/batch" and method == "POST":
+            body = await _read_body(receive)
+            if not isinstance(body, list):
+                raise HTTPError(400, "request body must be a JSON array of operations")
+            return 200, {"results": await asyncio.to_thread(service.batch, body)}
+        if path == "/stats" and method == "GET":
+            return 200, await asyncio.to_thread(service.stats)
+        if path == "/settings":
+            if method == "GET":
+                return 200, await asyncio.to_thread(service.get_settings)
+            if method == "PUT":
+                body = dict(_object(await _read_body(receive)))
+                renames, expected_version = body.pop("renames", None), body.pop("version", None)
+                version = await asyncio.to_thread(service.update_settings, body, renames, expected_version)
+                return 200, {"ok": True, "version": version}
+            raise HTTPError(405, f"{method} not allowed")
+        if path == "/metrics" and method == "GET":
+            return 200, RECORDER.prometheus_text()
+        raise HTTPError(404, f"no endpoint {method} {path}")
+
+
+def create_app(service):
+    """The ASGI application for a TicketService"""
+    return TicketAPI(service)
+
+
+def main(argv=None):
+    """Serve the ticket API over HTTP"""
+    parser = argparse.ArgumentParser(prog="python -m tickets.api", description=main.__doc__)
+    parser.add_argument("--store", default=os.environ.get("TICKETS_STORE", "tickets.json"),
+                        help="ticket store (default: $TICKETS_STORE or tickets.json)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8600)
+    args = parser.parse_args(argv)
+
+    try:
+        import uvicorn
+    except ImportError:
+        print("The API server needs uvicorn: pip install uvicorn", file=sys.stderr)
+        return 1
+    uvicorn.run(create_app(TicketService.open(args.store)), host=args.host, port=args.port,
+                log_level="warning", timeout_keep_alive=30)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
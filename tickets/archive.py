@@ -0,0 +1,704 @@
+"""Cold storage tier for resolved tickets.
+
+Resolved tickets make up most of a long-running store, but the app rarely
+looks at old ones. ``TieredStore`` keeps them out of the working set: it
+wraps a store (JSON or SQLite, the hot tier) and an ``Archive`` (the cold
+tier) and answers every call from both, so callers see one store.
+
+The archive is a directory next to the store (``tickets_archive/`` for
+``tickets.json`` or ``tickets.db``) with one gzip-compressed JSON lines
+segment per month of ``created_at`` (``2024-03.jsonl.gz``). Archiving
+appends a new gzip member to the segments it touches; the files are only
+rewritten when archived tickets are deleted, renamed (see settings.py) or
+taken back into the working set because they changed.
+
+``manifest.json`` holds a summary per segment: its ticket ids, the range
+of ``created_ts``, and the statistics (see stats.py) and rollups (see
+rollups.py) of its tickets. Statistics, trends and response times of the
+archive come from these summaries without opening a segment. A query only
+opens the segments its filters cannot decide from the summary; a segment
+whose tickets all match (or none does) is answered from the summary too.
+Opened segments are kept in a small LRU cache per process.
+
+``archive_resolved()`` moves the tickets of a status (the
+``resolved_status`` of the settings, see settings.py) whose last activity
+(the latest response, or the creation) is older than a number of days.
+Tickets are first appended to the archive and then removed from the
+working set with their version as a compare-and-swap; a ticket that changed
+in between is taken out of the archive again. A ticket that ends up in both
+tiers (a crash in between) is taken out of the archive on the next load.
+Until the working set is updated, other processes may count the tickets of
+a running archival twice.
+
+The app archives when ``TICKETS_ARCHIVE_DAYS`` is set, see
+``archive_days()``. ``open_store()`` returns a ``TieredStore`` whenever the
+archive directory exists, so archived tickets never disappear from view.
+"""
+import gzip
+import heapq
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from itertools import chain
+
+from .errors import ConflictError
+from .locking import FileLock
+from .model import Ticket, to_json
+from .query import FilterIndex, Selection, iso_day
+from .rollups import PERCENTILES, Rollups, percentile_trend, response_table
+from .search import SearchIndex
+from .stats import TicketStats
+from .timestamps import TIME_FORMAT, parse_ts
+
+ARCHIVE_FORMAT = 1
+
+# Opened segments kept in memory per process
+CACHED_SEGMENTS = 8
+
+# Tickets removed from the working set per write while archiving
+ARCHIVE_BATCH = 500
+
+_ENUM_FILTERS = ("status", "priority", "category")
+
+
+def archive_dir(store_path):
+    """Archive directory of the ticket store at a path"""
+    return os.path.splitext(store_path)[0] + "_archive"
+
+
+def archive_days():
+    """Age in days after which resolved tickets are archived, from ``TICKETS_ARCHIVE_DAYS`` (None: off)"""
+    value = os.environ.get("TICKETS_ARCHIVE_DAYS", "")
+    return int(value) if value.strip() else None
+
+
+def last_activity(ticket):
+    """Epoch seconds of the latest response or else the creation, None for a ticket with open questions"""
+    times = [ticket.get("created_ts"), ticket.get("support_response_ts")]
+    for exchange in ticket.get("exchanges", []):
+        if not exchange.get("response_at"):
+            return None
+        times.append(exchange.get("response_ts"))
+    return max((ts for ts in times if ts is not None), default=None)
+
+
+def segment_name(ticket):
+    """Name of the segment of a ticket: the month it was created in"""
+    if parse_ts(ticket.get("created_at")) is None:
+        return "undated"
+    return ticket["created_at"][:7]
+
+
+def _file_id(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+def _encode(tickets):
+    return b"".join(
+        json.dumps(t, ensure_ascii=False, separators=(",", ":"), default=to_json).encode("utf-8") + b"\n"
+        for t in tickets
+    )
+
+
+class Segment:
+    """Manifest entry of a segment: its tickets' ids, date range, statistics and rollups"""
+
+    __slots__ = ("name", "rev", "size", "ids", "dated", "min_ts", "max_ts", "stats", "rollups")
+
+    def __init__(self, name):
+        self.name = name
+        # Bumped on every write, keys the cache of opened segments
+        self.rev = 0
+        # Bytes of the file that belong to the segment, anything after is a torn append
+        self.size = 0
+        self.ids = []
+        self.dated = 0
+        self.min_ts = None
+        self.max_ts = None
+        self.stats = TicketStats()
+        self.rollups = Rollups()
+
+    def add(self, tickets):
+        """Count tickets appended to the segment"""
+        for ticket in tickets:
+            self.ids.append(ticket["id"])
+            self.stats.add(ticket)
+            self.rollups.add(ticket)
+            ts = ticket.get("created_ts")
+            if ts is not None:
+                self.dated += 1
+                self.min_ts = ts if self.min_ts is None else min(self.min_ts, ts)
+                self.max_ts = ts if self.max_ts is None else max(self.max_ts, ts)
+        self.ids.sort()
+
+    def match(self, low, high, enums):
+        """Whether all (True), none (None) or some (False) of the tickets can match a filter
+
+        ``low`` and ``high`` bound ``created_ts`` (None: open), ``enums``
+        maps filter names to the wanted values.
+        """
+        full = True
+        for name, value in enums.items():
+            count = getattr(self.stats, f"by_{name}").get(value, 0)
+            if not count:
+                return None
+            full = full and count == len(self.ids)
+        if low is not None or high is not None:
+            if self.min_ts is None:
+                return None
+            if (high is not None and self.min_ts >= high) or (low is not None and self.max_ts < low):
+                return None
+            full = (full and self.dated == len(self.ids) and (low is None or self.min_ts >= low)
+                    and (high is None or self.max_ts < high))
+        return full
+
+    def to_dict(self):
+        return {
+            "rev": self.rev,
+            "size": self.size,
+            "ids": self.ids,
+            "dated": self.dated,
+            "min_ts": self.min_ts,
+            "max_ts": self.max_ts,
+            "stats": self.stats.to_dict(),
+            "rollups": self.rollups.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, name, data):
+        segment = cls(name)
+        for key in ("rev", "size", "ids", "dated", "min_ts", "max_ts"):
+            setattr(segment, key, data[key])
+        segment.stats = TicketStats.from_dict(data["stats"]) or TicketStats()
+        segment.rollups = Rollups.from_dict(data["rollups"]) or Rollups()
+        return segment
+
+
+class _OpenSegment:
+    """The tickets of a segment read into memory, with filter indexes"""
+
+    def __init__(self, tickets):
+        self.tickets = {t.id: t for t in tickets}
+        self.filters = FilterIndex.from_tickets(self.tickets.values())
+        self._search = None
+
+    @property
+    def search(self):
+        # Only built for segments that are actually searched
+        if self._search is None:
+            self._search = SearchIndex.from_tickets(self.tickets.values())
+        return self._search
+
+
+class Archive:
+    """Archived tickets in compressed monthly segments, summarized in a manifest"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.manifest_path = os.path.join(directory, "manifest.json")
+        # _lock guards the in-memory state, _file_lock serializes writers across processes
+        self._lock = threading.RLock()
+        self._file_lock = FileLock(os.path.join(directory, "archive.lock"))
+        self._manifest_id = None
+        self._version = 0
+        self._segments = {}
+        self._where = {}
+        self._stats = TicketStats()
+        self._rollups = Rollups()
+        self._cache = OrderedDict()
+
+    def __contains__(self, ticket_id):
+        return ticket_id in self._where
+
+    def __len__(self):
+        return len(self._where)
+
+    @property
+    def version(self):
+        """Counter that changes with every write to the archive"""
+        return self._version
+
+    @property
+    def stats(self):
+        """Statistics of all archived tickets, merged from the segment summaries"""
+        return self._stats
+
+    @property
+    def rollups(self):
+        """Rollups of all archived tickets, merged from the segment summaries"""
+        return self._rollups
+
+    def ids(self):
+        """Ids of all archived tickets in id order"""
+        return sorted(self._where)
+
+    def load(self):
+        """Read the manifest"""
+        with self._lock:
+            self._manifest_id = _file_id(self.manifest_path)
+            data = {"version": 0, "segments": {}}
+            if self._manifest_id is not None:
+                with open(self.manifest_path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("format") != ARCHIVE_FORMAT:
+                    raise ValueError(f"{self.manifest_path}: unknown archive format {data.get('format')!r}")
+            self._version = data["version"]
+            self._segments = {name: Segment.from_dict(name, s) for name, s in data["segments"].items()}
+            self._summarize()
+
+    def refresh(self):
+        """Pick up writes of other processes, return True if the archive changed"""
+        with self._lock:
+            if _file_id(self.manifest_path) == self._manifest_id:
+                return False
+            self.load()
+            return True
+
+    def get(self, ticket_id):
+        """The archived ticket with the given id or None"""
+        found = self.get_many([ticket_id])
+        return found[0] if found else None
+
+    def get_many(self, ids):
+        """The archived tickets with the given ids in that order, skipping ids not in the archive"""
+        with self._lock:
+            opened = {}
+            found = []
+            for i in ids:
+                name = self._where.get(i)
+                if name is None:
+                    continue
+                if name not in opened:
+                    opened[name] = self._open(name)
+                ticket = opened[name].tickets.get(i)
+                if ticket is not None:
+                    found.append(ticket)
+            return found
+
+    def created_at_ids(self, values):
+        """Ids of the archived tickets created at one of the given ``created_at`` timestamps
+
+        Opens only the segments of the months of the timestamps.
+        """
+        months = {}
+        for value in values:
+            ts = parse_ts(value)
+            if ts is not None:
+                months.setdefault(value[:7], set()).add(ts)
+        ids = []
+        with self._lock:
+            for name, timestamps in months.items():
+                segment = self._segments.get(name)
+                if segment is None or segment.min_ts is None:
+                    continue
+                timestamps = [ts for ts in timestamps if segment.min_ts <= ts <= segment.max_ts]
+                if timestamps:
+                    ids.extend(self._open(name).filters.created_ids(timestamps))
+        return sorted(ids)
+
+    def select(self, search=None, status=None, priority=None, category=None, date_from=None, date_to=None):
+        """Ids of the archived tickets matching all given filters, see FilterIndex.select()
+
+        Segments are only opened if their summary cannot decide the filter.
+        With a search text, the ids of each segment are ordered by
+        relevance, newest segment first.
+        """
+        enums = {name: value for name, value in zip(_ENUM_FILTERS, (status, priority, category)) if value is not None}
+        low = parse_ts(iso_day(date_from))
+        high = parse_ts(iso_day(date_to, offset=1))
+        filters = {"date_from": date_from, "date_to": date_to, **enums}
+        with self._lock:
+            parts = []
+            for name in sorted(self._segments, reverse=True):
+                segment = self._segments[name]
+                full = segment.match(low, high, enums)
+                if full is None:
+                    continue
+                if full and not search:
+                    parts.append(segment.ids)
+                    continue
+                opened = self._open(name)
+                parts.append(opened.filters.select(opened.search if search else None, search=search, **filters))
+        if search:
+            return list(chain.from_iterable(parts))
+        return list(heapq.merge(*parts))
+
+    # Writes
+
+    def add(self, tickets):
+        """Append tickets to the segments of their months"""
+        groups = {}
+        for ticket in tickets:
+            groups.setdefault(segment_name(ticket), []).append(ticket)
+        if not groups:
+            return
+        with self._writing():
+            for name, group in groups.items():
+                segment = self._segments.get(name) or Segment(name)
+                path = self._path(name)
+                with open(path, "ab") as raw:
+                    if raw.tell() > segment.size:
+                        # Torn append of an earlier run that never made it into the manifest
+                        raw.truncate(segment.size)
+                        raw.seek(segment.size)
+                    with gzip.GzipFile(fileobj=raw, mode="wb", mtime=0) as out:
+                        out.write(_encode(group))
+                    raw.flush()
+                    os.fsync(raw.fileno())
+                    segment.size = raw.tell()
+                segment.add(group)
+                segment.rev += 1
+                self._segments[name] = segment
+
+    def remove(self, ids):
+        """Take tickets out of the archive, rewriting their segments"""
+        ids = set(ids)
+        with self._writing():
+            for name in {self._where[i] for i in ids if i in self._where}:
+                self._rewrite(name, [t for t in self._open(name).tickets.values() if t.id not in ids])
+
+    def rename(self, field, values):
+        """Replace values of an enum field ({old: new}) in the archived tickets that have one"""
+        with self._writing():
+            for name, segment in list(self._segments.items()):
+                counts = getattr(segment.stats, f"by_{field}")
+                if not any(counts.get(old) for old in values):
+                    continue
+                tickets = []
+                for ticket in self._open(name).tickets.values():
+                    if ticket[field] in values:
+                        ticket = {**ticket, field: values[ticket[field]], "version": ticket.get("version", 1) + 1}
+                    tickets.append(ticket)
+                self._rewrite(name, tickets)
+
+    def rebuild(self):
+        """Recount the summaries of all segments from their tickets"""
+        with self._writing():
+            for name in list(self._segments):
+                self._rewrite(name, list(self._open(name).tickets.values()))
+
+    def clear(self):
+        """Delete all segments"""
+        with self._writing():
+            for name in list(self._segments):
+                self._rewrite(name, [])
+
+    # Internals
+
+    def _path(self, name):
+        return os.path.join(self.directory, f"{name}.jsonl.gz")
+
+    def _writing(self):
+        """Locks for a write, which ends with writing the manifest"""
+        os.makedirs(self.directory, exist_ok=True)
+        return _Write(self)
+
+    def _open(self, name):
+        """The tickets of a segment, read through the LRU cache"""
+        segment = self._segments[name]
+        key = (name, segment.rev)
+        opened = self._cache.get(key)
+        if opened is not None:
+            self._cache.move_to_end(key)
+            return opened
+        with open(self._path(name), "rb") as f:
+            data = gzip.decompress(f.read(segment.size)) if segment.size else b""
+        opened = _OpenSegment(Ticket.from_dict(json.loads(line)) for line in data.splitlines())
+        self._cache[key] = opened
+        while len(self._cache) > CACHED_SEGMENTS:
+            self._cache.popitem(last=False)
+        return opened
+
+    def _rewrite(self, name, tickets):
+        """Replace a segment by a new file with the given tickets, or delete it if there are none"""
+        old = self._segments.pop(name)
+        path = self._path(name)
+        if not tickets:
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        segment = Segment(name)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as raw:
+            with gzip.GzipFile(fileobj=raw, mode="wb", mtime=0) as out:
+                out.write(_encode(tickets))
+            raw.flush()
+            os.fsync(raw.fileno())
+            segment.size = raw.tell()
+        os.replace(tmp_path, path)
+        segment.add(tickets)
+        segment.rev = old.rev + 1
+        self._segments[name] = segment
+
+    def _write_manifest(self):
+        data = {
+            "format": ARCHIVE_FORMAT,
+            "version": self._version + 1,
+            "segments": {name: s.to_dict() for name, s in sorted(self._segments.items())},
+        }
+        tmp_path = f"{self.manifest_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps(data, ensure_ascii=False, separators=(",", ":")))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.manifest_path)
+        self._manifest_id = _file_id(self.manifest_path)
+        self._version = data["version"]
+        self._summarize()
+
+    def _summarize(self):
+        self._where = {i: name for name, segment in self._segments.items() for i in segment.ids}
+        self._stats = TicketStats()
+        self._rollups = Rollups()
+        for segment in self._segments.values():
+            self._stats.merge(segment.stats)
+            self._rollups.merge(segment.rollups)
+
+
+class _Write:
+    """Holds the archive locks, catches up with the manifest and writes it when done"""
+
+    def __init__(self, archive):
+        self.archive = archive
+
+    def __enter__(self):
+        self.archive._lock.acquire()
+        try:
+            self.archive._file_lock.__enter__()
+        except BaseException:
+            self.archive._lock.release()
+            raise
+        try:
+            self.archive.refresh()
+        except BaseException:
+            self.__exit__(None, None, None)
+            raise
+        return self.archive
+
+    def __exit__(self, exc_type, *exc):
+        try:
+            if exc_type is None:
+                self.archive._write_manifest()
+            else:
+                # Drop the half-done changes, the manifest on disk is still intact
+                self.archive.load()
+        finally:
+            self.archive._file_lock.__exit__(None, None, None)
+            self.archive._lock.release()
+        return False
+
+
+class TieredStore:
+    """A ticket store whose resolved tickets are moved to an archive after a while
+
+    Has the interface of the stores it wraps. ``tickets`` and ``query()``
+    return lazy Selections over both tiers, so counting them does not open
+    the archive. Changing an archived ticket takes it back into the working
+    set first.
+    """
+
+    def __init__(self, hot, archive):
+        self.hot = hot
+        self.archive = archive
+        self._lock = threading.RLock()
+        self._view_version = None
+        self._view = ()
+        self._stats_version = None
+        self._stats_view = None
+
+    @property
+    def schedule_compaction(self):
+        return getattr(self.hot, "schedule_compaction", None)
+
+    @schedule_compaction.setter
+    def schedule_compaction(self, value):
+        if hasattr(self.hot, "schedule_compaction"):
+            self.hot.schedule_compaction = value
+
+    @property
+    def version(self):
+        """Value that changes whenever the ticket data of either tier changes"""
+        return self.hot.version, self.archive.version
+
+    @property
+    def tickets(self):
+        """Read-only view of all tickets in id order, archived ones are read when accessed"""
+        version = self.version
+        if version != self._view_version:
+            ids = list(heapq.merge(self.hot.query_ids(), self.archive.ids()))
+            self._view = Selection(ids, self.get_many)
+            self._view_version = version
+        return self._view
+
+    @property
+    def stats(self):
+        """Statistics of the working set plus the archive summaries"""
+        version = self.version
+        if version != self._stats_version:
+            self._stats_view = self.hot.stats.copy().merge(self.archive.stats)
+            self._stats_version = version
+        return self._stats_view
+
+    def trend(self, metric, granularity="day", category=None, priority=None):
+        """A rollup metric per day, week or month as a Series, see Rollups.trend()"""
+        if metric in PERCENTILES:
+            cells = chain(self.hot.response_sketches(granularity), self.archive.rollups.time_cells(granularity))
+            return percentile_trend(cells, metric, category, priority)
+        return self.hot.trend(metric, granularity, category, priority).add(
+            self.archive.rollups.trend(metric, granularity, category, priority), fill_value=0
+        )
+
+    def response_times(self, by, sla_hours=None):
+        """Response time percentiles and SLA breaches per category or priority, see response_table()"""
+        cells = chain(self.hot.response_sketches("month"), self.archive.rollups.time_cells("month"))
+        return response_table(((c, p, sketch) for _, c, p, sketch in cells), by, sla_hours)
+
+    def response_sketches(self, granularity="month"):
+        """(bucket, category, priority, sketch) of the response time rollups of both tiers"""
+        return self.hot.response_sketches(granularity) + list(self.archive.rollups.time_cells(granularity))
+
+    def get(self, ticket_id):
+        """Return the ticket with the given id or None"""
+        if ticket_id in self.archive:
+            return self.archive.get(ticket_id)
+        return self.hot.get(ticket_id)
+
+    def get_many(self, ids):
+        """Return the tickets with the given ids in that order, skipping unknown ids"""
+        archived = {t["id"]: t for t in self.archive.get_many([i for i in ids if i in self.archive])}
+        hot = {t["id"]: t for t in self.hot.get_many([i for i in ids if i not in archived])}
+        return [t for t in (archived.get(i) or hot.get(i) for i in ids) if t is not None]
+
+    def query(self, **filters):
+        """Return the tickets of both tiers matching the given filters as a lazy Selection
+
+        With a search text, the matches in the working set come first.
+        """
+        return Selection(self.query_ids(**filters), self.get_many)
+
+    def created_at_ids(self, values):
+        """Ids of the tickets of both tiers created at one of the given ``created_at`` timestamps"""
+        values = set(values)
+        return list(heapq.merge(self.hot.created_at_ids(values), self.archive.created_at_ids(values)))
+
+    def query_ids(self, **filters):
+        """Return only the ids of the matching tickets"""
+        hot = self.hot.query_ids(**filters)
+        archived = self.archive.select(**filters)
+        if filters.get("search"):
+            return hot + archived
+        return list(heapq.merge(hot, archived))
+
+    def load(self):
+        """Load both tiers and settle tickets left in both by an interrupted move"""
+        self.hot.load()
+        self.archive.load()
+        with self._lock:
+            both = [i for i in self.hot.query_ids() if i in self.archive]
+            if both:
+                # The working set wins: an interrupted archival is simply retried later
+                self.archive.remove(both)
+        return self.tickets
+
+    def refresh(self):
+        """Pick up changes other processes made to either tier, return True if there were any"""
+        hot = self.hot.refresh()
+        return self.archive.refresh() or hot
+
+    # Mutations
+
+    def create(self, ticket):
+        return self.hot.create(ticket)
+
+    def create_many(self, tickets):
+        return self.hot.create_many(tickets)
+
+    def update(self, ticket_id, expected_version=None, **fields):
+        self._thaw(ticket_id)
+        self.hot.update(ticket_id, expected_version, **fields)
+
+    def add_exchange(self, ticket_id, exchange, expected_version=None):
+        self._thaw(ticket_id)
+        self.hot.add_exchange(ticket_id, exchange, expected_version)
+
+    def answer_exchange(self, ticket_id, index, response_at, response_text, expected_version=None):
+        self._thaw(ticket_id)
+        self.hot.answer_exchange(ticket_id, index, response_at, response_text, expected_version)
+
+    def delete(self, ticket_id, expected_version=None):
+        """Remove a ticket from whichever tier holds it (a no-op if it is already gone)"""
+        with self._lock:
+            ticket = self.archive.get(ticket_id)
+            if ticket is None:
+                self.hot.delete(ticket_id, expected_version)
+                return
+            if expected_version is not None and ticket.get("version", 1) != expected_version:
+                raise ConflictError(
+                    f"Ticket {ticket_id} is at version {ticket.get('version', 1)}, expected {expected_version}"
+                )
+            self.archive.remove([ticket_id])
+
+    def rename_values(self, field, values):
+        """Replace values of an enum field ({old: new}) in both tiers"""
+        self.hot.rename_values(field, values)
+        if values:
+            self.archive.rename(field, values)
+
+    def replace_all(self, tickets):
+        """Replace the whole ticket list, the archive is emptied"""
+        tickets = list(tickets)
+        with self._lock:
+            self.archive.clear()
+            self.hot.replace_all(tickets)
+
+    def compact(self):
+        self.hot.compact()
+
+    def rebuild(self):
+        """Rebuild the working set's statistics and indexes and recount the segment summaries"""
+        self.hot.rebuild()
+        self.archive.rebuild()
+
+    def archive_resolved(self, days, status, progress=None):
+        """Move the tickets of a status whose last activity is more than ``days`` ago, return their number
+
+        ``progress`` is called with the fraction done after every batch.
+        """
+        now = parse_ts(datetime.now().strftime(TIME_FORMAT))
+        cutoff = now - days * 86400
+        with self._lock:
+            candidates = []
+            for ticket in self.hot.query(status=status):
+                ts = last_activity(ticket)
+                if ts is not None and ts < cutoff:
+                    candidates.append(ticket)
+            if not candidates:
+                return 0
+            self.archive.add(candidates)
+            moved = 0
+            changed = []
+            for start in range(0, len(candidates), ARCHIVE_BATCH):
+                batch = candidates[start:start + ARCHIVE_BATCH]
+                removed = set(self.hot.delete_many({t["id"]: t.get("version", 1) for t in batch}))
+                moved += len(removed)
+                # Changed since they were read, they stay in the working set
+                changed.extend(t["id"] for t in batch if t["id"] not in removed)
+                if progress is not None:
+                    progress(min(start + ARCHIVE_BATCH, len(candidates)) / len(candidates))
+            if changed:
+                self.archive.remove(changed)
+            return moved
+
+    def _thaw(self, ticket_id):
+        """Move an archived ticket back into the working set before it is changed"""
+        with self._lock:
+            ticket = self.archive.get(ticket_id)
+            if ticket is not None:
+                self.hot.restore([ticket])
+                self.archive.remove([ticket_id])
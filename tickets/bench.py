@@ -0,0 +1,292 @@
+"""Benchmarks of the hot paths of the app, run outside of Streamlit.
+
+For every size and backend the benchmark generates synthetic tickets (see
+synthetic.py) into a temporary store and times
+
+- ``save``: ``replace_all()`` of all tickets into a new, empty store, the
+  bulk write of a migration (see ``python -m tickets.sqlite_store``)
+- ``load``: a cold ``load()`` of a freshly opened store
+- ``filter``: status/priority/category/date filters, resolving the first page
+- ``search``: full-text searches, alone and combined with filters
+- ``stats``, ``rollups``: the statistics and rollups rebuilt with a full scan
+- ``frames``: the columnar frames and aggregations of the statistics tab
+- ``rollstats``: the same aggregations from the rollups, as the statistics
+  tab computes them for an archived store (see archive.py)
+- ``trends``: every rollup trend and the response time tables
+- ``table``: the DataFrame of the list view over all tickets
+
+Each case reports its throughput (``unit`` per second), latency
+percentiles of the single samples in milliseconds and the peak memory
+allocated while it ran (traced in a separate run, as tracing slows the
+timed runs down). The report is written as JSON; with ``--baseline`` the
+median latencies are compared with an earlier report, so two versions can
+be checked for regressions on the same seed.
+
+Usage::
+
+    python -m tickets.bench --sizes 1000 10000 100000 [--backends json bin db] [--output bench.json]
+    python -m tickets.bench --sizes 10000 --baseline bench.json
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from . import open_store
+from .analytics import avg_response_hours, build_frames, response_rate, rollup_response_rate, ticket_table
+from .rollups import GRANULARITIES, METRICS, Rollups
+from .settings import DEFAULTS
+from .stats import TicketStats
+from .synthetic import DEFAULT_END, generate_tickets
+
+REPORT_FORMAT = 1
+
+BACKENDS = {"json": "tickets.json", "bin": "tickets.bin", "db": "tickets.db"}
+
+# Rows of the first page of the card view
+PAGE_SIZE = 25
+
+_FILTERS = [
+    {"status": "Offen"},
+    {"status": "In Bearbeitung", "priority": "🔴 Hoch"},
+    {"status": "Gelöst", "priority": "🟡 Mittel", "category": "Bug"},
+    {"category": "Dokumentation"},
+    {"date_from": (DEFAULT_END - timedelta(days=30)).date(), "date_to": DEFAULT_END.date()},
+    {"status": "Offen", "date_from": (DEFAULT_END - timedelta(days=7)).date()},
+]
+_SEARCHES = [
+    {"search": "drucker"},
+    {"search": "vpn verbindet"},
+    {"search": "störung leitstelle"},
+    {"search": "fahrgast"},
+    {"search": "zeiterfassung", "status": "Offen"},
+    {"search": "outlook", "priority": "🔴 Hoch", "date_from": (DEFAULT_END - timedelta(days=90)).date()},
+]
+_SLA_HOURS = {"🟢 Niedrig": 72, "🟡 Mittel": 24, "🔴 Hoch": 4}
+
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def _save(bench):
+    # A new store every time, so every sample writes the same amount and the
+    # store of the other cases is never half written
+    directory = tempfile.mkdtemp(prefix="save-", dir=bench.directory)
+    store = open_store(os.path.join(directory, os.path.basename(bench.path)))
+    store.load()
+    return [_timed(store.replace_all, bench.tickets)], len(bench.tickets)
+
+
+def _load(bench):
+    return [_timed(open_store(bench.path).load)], len(bench.tickets)
+
+
+def _queries(queries):
+    def run(bench):
+        return [_timed(lambda: bench.store.query(**q)[:PAGE_SIZE]) for q in queries], 1
+    return run
+
+
+def _rebuild(cls):
+    def run(bench):
+        return [_timed(cls.from_tickets, bench.store.tickets)], len(bench.tickets)
+    return run
+
+
+def _frames(bench):
+    def run():
+        _, exchanges_df = build_frames(bench.store.tickets)
+        avg_response_hours(exchanges_df, "priority")
+        response_rate(exchanges_df, "category")
+    return [_timed(run)], len(bench.tickets)
+
+
+def _rollup_stats(bench):
+    def run():
+        bench.store.response_times("priority")
+        rollup_response_rate(bench.store, DEFAULTS["categories"])
+    return [_timed(run)], 1
+
+
+def _trends(bench):
+    samples = [_timed(bench.store.trend, metric, g) for g in GRANULARITIES for metric in METRICS]
+    samples += [_timed(bench.store.response_times, by, _SLA_HOURS) for by in ("priority", "category")]
+    return samples, 1
+
+
+def _table(bench):
+    return [_timed(lambda: ticket_table(bench.store.query()))], len(bench.tickets)
+
+
+# name -> (unit, run); run(bench) returns (sample seconds, units per sample)
+CASES = {
+    "save": ("tickets", _save),
+    "load": ("tickets", _load),
+    "filter": ("queries", _queries(_FILTERS)),
+    "search": ("queries", _queries(_SEARCHES)),
+    "stats": ("tickets", _rebuild(TicketStats)),
+    "rollups": ("tickets", _rebuild(Rollups)),
+    "frames": ("tickets", _frames),
+    "rollstats": ("queries", _rollup_stats),
+    "trends": ("queries", _trends),
+    "table": ("tickets", _table),
+}
+
+
+class _Bench:
+    """Tickets and store of one size and backend"""
+
+    def __init__(self, directory, backend, tickets):
+        self.directory = directory
+        self.path = os.path.join(directory, BACKENDS[backend])
+        self.tickets = tickets
+        self.store = None
+
+
+def percentile(values, q):
+    """Nearest-rank q-percentile (0 <= q <= 100) of a non-empty list"""
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, round(q / 100 * len(ordered) + 0.5) - 1))]
+
+
+def _result(backend, size, name, unit, samples, units, peak):
+    ms = [s * 1000 for s in samples]
+    return {
+        "backend": backend,
+        "size": size,
+        "case": name,
+        "unit": unit,
+        "samples": len(samples),
+        "throughput": units * len(samples) / sum(samples) if sum(samples) else None,
+        "latency_ms": {
+            "p50": percentile(ms, 50),
+            "p90": percentile(ms, 90),
+            "p99": percentile(ms, 99),
+            "max": max(ms),
+        },
+        "peak_mib": peak,
+    }
+
+
+def run_case(bench, name, repeat, trace_memory):
+    """(samples, units per sample, peak MiB or None) of one case"""
+    _, run = CASES[name]
+    samples = []
+    for _ in range(repeat):
+        gc.collect()
+        times, units = run(bench)
+        samples.extend(times)
+    peak = None
+    if trace_memory:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            run(bench)
+            peak = tracemalloc.get_traced_memory()[1] / (1 << 20)
+        finally:
+            tracemalloc.stop()
+    return samples, units, peak
+
+
+def run(sizes, backends=tuple(BACKENDS), cases=tuple(CASES), repeat=3, seed=0, trace_memory=True, progress=None):
+    """Run the benchmark and return the report"""
+    results = []
+    for size in sizes:
+        tickets = list(generate_tickets(size, seed))
+        for backend in backends:
+            with tempfile.TemporaryDirectory(prefix="tickets-bench-") as directory:
+                bench = _Bench(directory, backend, tickets)
+                # The other cases need a filled store, also when "save" is not run
+                open_store(bench.path).replace_all(tickets)
+                bench.store = open_store(bench.path)
+                bench.store.load()
+                for name in cases:
+                    if progress:
+                        progress(f"{backend} {size} {name}")
+                    samples, units, peak = run_case(bench, name, repeat, trace_memory)
+                    results.append(_result(backend, size, name, CASES[name][0], samples, units, peak))
+    return {
+        "format": REPORT_FORMAT,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "seed": seed,
+        "repeat": repeat,
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "pandas": pd.__version__,
+            "sqlite": sqlite3.sqlite_version,
+        },
+        "results": results,
+    }
+
+
+def compare(report, baseline):
+    """Add the change of the median latency against a baseline report to every result"""
+    before = {(r["backend"], r["size"], r["case"]): r for r in baseline.get("results", [])}
+    for result in report["results"]:
+        old = before.get((result["backend"], result["size"], result["case"]))
+        if old and old["latency_ms"]["p50"]:
+            result["p50_change"] = result["latency_ms"]["p50"] / old["latency_ms"]["p50"] - 1
+    return report
+
+
+def format_table(report):
+    """The results as a plain text table"""
+    lines = [f"{'backend':8}{'size':>9}  {'case':9}{'throughput':>16}{'p50 ms':>11}{'p99 ms':>11}{'peak MiB':>10}{'Δ p50':>9}"]
+    for r in report["results"]:
+        throughput = f"{r['throughput']:,.0f} {r['unit']}/s" if r["throughput"] else "-"
+        peak = f"{r['peak_mib']:.1f}" if r["peak_mib"] is not None else "-"
+        change = f"{r['p50_change']:+.0%}" if "p50_change" in r else ""
+        lines.append(f"{r['backend']:8}{r['size']:>9}  {r['case']:9}{throughput:>16}"
+                     f"{r['latency_ms']['p50']:>11.2f}{r['latency_ms']['p99']:>11.2f}{peak:>10}{change:>9}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    """Time the hot paths of the ticket stores on synthetic tickets"""
+    parser = argparse.ArgumentParser(prog="python -m tickets.bench", description=main.__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000],
+                        help="numbers of tickets (default: 1000 10000)")
+    parser.add_argument("--backends", nargs="+", choices=list(BACKENDS), default=list(BACKENDS))
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), default=list(CASES))
+    parser.add_argument("--repeat", type=int, default=3, help="runs per case (default: 3)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-memory", action="store_true", help="skip the traced run for peak memory")
+    parser.add_argument("--output", help="file for the JSON report (default: stdout)")
+    parser.add_argument("--baseline", help="earlier JSON report to compare the median latencies with")
+    args = parser.parse_args(argv)
+
+    progress = None
+    if sys.stderr.isatty():
+        progress = lambda step: print(f"\r{step:40}", end="", file=sys.stderr, flush=True)
+    report = run(args.sizes, args.backends, args.cases, args.repeat, args.seed, not args.no_memory, progress)
+    if progress:
+        print("\r" + " " * 40 + "\r", end="", file=sys.stderr)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            compare(report, json.load(f))
+    print(format_table(report), file=sys.stderr)
+
+    data = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(data + "\n")
+    else:
+        print(data)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+"""Chart specs for the statistics in the app.
+
+Every builder is a pure function of plain data and returns the Vega-Lite
+spec of an Altair chart as a dict. Building and serializing the charts is
+what a rerun pays for, so the app memoizes these per data version and
+settings and hands the specs to ``st.vega_lite_chart``.
+"""
+import altair as alt
+import pandas as pd
+
+PRIORITY_COLORS = ["#4CAF50", "#FFC107", "#F44336"]
+STATUS_COLORS = ["#FF5722", "#2196F3", "#4CAF50"]
+RESPONSE_COLORS = ["#4CAF50", "#FF9800"]
+
+
+def palette(colors, n):
+    """n colors, repeating the given ones if there are more values than colors"""
+    return [colors[i % len(colors)] for i in range(n)]
+
+
+def response_pie(answered, pending, title):
+    """Pie chart of answered vs. pending questions"""
+    data = pd.DataFrame({
+        "Status": ["Beantwortet", "Ausstehend"],
+        "Anzahl": [answered, pending]
+    })
+    return alt.Chart(data).mark_arc(innerRadius=0).encode(
+        theta="Anzahl:Q",
+        color=alt.Color("Status:N", scale=alt.Scale(
+            domain=["Beantwortet", "Ausstehend"],
+            range=RESPONSE_COLORS
+        )),
+        tooltip=["Status:N", "Anzahl:Q"]
+    ).properties(
+        title=title,
+        height=300
+    ).to_dict()
+
+
+def count_bars(counts, field, title, domain=None, colors=None, horizontal=False):
+    """Bar chart of ticket counts per value of a field, optionally with fixed colors"""
+    data = pd.DataFrame({
+        field: list(counts.keys()),
+        "Anzahl": list(counts.values())
+    })
+    color = alt.Color(f"{field}:N")
+    if domain is not None:
+        color = alt.Color(f"{field}:N", scale=alt.Scale(domain=list(domain), range=list(colors)))
+    if horizontal:
+        x, y = alt.X("Anzahl:Q"), alt.Y(f"{field}:N")
+    else:
+        x, y = alt.X(f"{field}:N"), alt.Y("Anzahl:Q")
+    return alt.Chart(data).mark_bar().encode(
+        x=x,
+        y=y,
+        color=color,
+        tooltip=[field, "Anzahl"]
+    ).properties(
+        title=title,
+        height=300
+    ).to_dict()
+
+
+def response_histogram(histogram):
+    """Histogram of response times from counts pre-binned to 0.1h"""
+    data = pd.DataFrame({
+        "Antwortzeit (Stunden)": list(histogram.keys()),
+        "Anzahl": list(histogram.values())
+    })
+    return alt.Chart(data).mark_bar().encode(
+        alt.X("Antwortzeit (Stunden):Q", bin=alt.Bin(maxbins=10)),
+        y=alt.Y("sum(Anzahl):Q", title="Anzahl"),
+        color=alt.Color("sum(Anzahl):Q", title="Anzahl"),
+        tooltip=[alt.Tooltip("sum(Anzahl):Q", title="Anzahl")]
+    ).properties(
+        title="Verteilung der Support-Antwortzeiten",
+        height=300
+    ).to_dict()
+
+
+def daily_line(counts, field, axis_title, title, color=None):
+    """Line chart of a Series of counts indexed by day"""
+    data = pd.DataFrame({
+        "Datum": counts.index,
+        field: counts.to_numpy()
+    })
+    mark = alt.Chart(data).mark_line(point=True, color=color) if color else alt.Chart(data).mark_line(point=True)
+    return mark.encode(
+        x=alt.X("Datum:T", title="Datum"),
+        y=alt.Y(f"{field}:Q", title=axis_title),
+        tooltip=["Datum:T", f"{field}:Q"]
+    ).properties(
+        title=title,
+        height=300
+    ).to_dict()
+
+
+def priority_response_bars(averages, priorities):
+    """Bar chart of the mean response time in hours per priority"""
+    data = pd.DataFrame({
+        "Priorität": averages.index.astype(str),
+        "Ø Antwortzeit (h)": averages.to_numpy()
+    })
+    return alt.Chart(data).mark_bar().encode(
+        x=alt.X("Priorität:N", title="Priorität"),
+        y=alt.Y("Ø Antwortzeit (h):Q", title="Stunden"),
+        color=alt.Color("Priorität:N", scale=alt.Scale(
+            domain=list(priorities),
+            range=palette(PRIORITY_COLORS, len(priorities))
+        ))
+    ).properties(
+        height=300
+    ).to_dict()
+
+
+def category_rate_bars(rates):
+    """Bar chart of the response rate in percent per category"""
+    data = pd.DataFrame({
+        "Kategorie": rates.index.astype(str),
+        "Response Rate (%)": rates.to_numpy()
+    })
+    return alt.Chart(data).mark_bar().encode(
+        x=alt.X("Response Rate (%):Q", title="Response Rate (%)"),
+        y=alt.Y("Kategorie:N", title="Kategorie"),
+        color=alt.Color("Response Rate (%):Q", scale=alt.Scale(scheme="greens"))
+    ).properties(
+        height=300
+    ).to_dict()
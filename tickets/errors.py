@@ -0,0 +1,9 @@
+"""Exceptions raised by the ticket stores"""
+
+
+class ConflictError(Exception):
+    """A change was based on a ticket state that is no longer current"""
+
+
+class NotFoundError(KeyError):
+    """There is no ticket with the given id"""
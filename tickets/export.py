@@ -0,0 +1,116 @@
+"""Streaming ticket exports.
+
+The exporters are generators that yield the output as text chunks of
+about ``CHUNK_SIZE`` characters while walking the tickets once, so no
+export is ever built as one big string. The export job (see jobs.py)
+writes the stream to its result file, optionally gzip compressed.
+"""
+import csv
+import io
+import json
+
+from .model import as_dict
+from .timestamps import EXCHANGE_FIELDS, TICKET_FIELDS
+
+CHUNK_SIZE = 64 * 1024
+
+TICKET_HEADER = ["ID", "Titel", "Kategorie", "Priorität", "Status", "Erstellt", "Support antwortet", "Tags"]
+REPORT_HEADER = [
+    "ID", "Titel", "Kategorie", "Priorität", "Status", "Erstellt", "Support antwortet", "Antwortzeit",
+    "Frage Nr.", "Gefragt am", "Frage", "Beantwortet am", "Antwort", "Antwortzeit Frage",
+]
+
+
+# Keys the stores add to a ticket that are not part of the backup format
+INTERNAL_FIELDS = TICKET_FIELDS + ("version",)
+
+
+def _hours(seconds):
+    return f"{seconds / 3600:.2f}h" if seconds is not None else ""
+
+
+def _csv(header, row_groups):
+    """Format groups of rows as CSV, yielding whenever a chunk is full"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for rows in row_groups:
+        writer.writerows(rows)
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def export_csv(tickets):
+    """One CSV row per ticket"""
+    return _csv(TICKET_HEADER, ([[
+        ticket["id"],
+        ticket["title"],
+        ticket["category"],
+        ticket["priority"],
+        ticket["status"],
+        ticket["created_at"],
+        ticket.get("support_response_at") or "",
+        ", ".join(ticket.get("tags", [])),
+    ]] for ticket in tickets))
+
+
+def _report_rows(ticket):
+    response_seconds = None
+    if ticket.get("support_response_ts") is not None and ticket.get("created_ts") is not None:
+        response_seconds = ticket["support_response_ts"] - ticket["created_ts"]
+    head = [
+        ticket["id"],
+        ticket["title"],
+        ticket["category"],
+        ticket["priority"],
+        ticket["status"],
+        ticket["created_at"],
+        ticket.get("support_response_at") or "",
+        _hours(response_seconds),
+    ]
+    exchanges = ticket.get("exchanges", [])
+    if not exchanges:
+        return [head + [""] * 6]
+    return [head + [
+        number,
+        exchange.get("question_at") or "",
+        exchange.get("question_text") or "",
+        exchange.get("response_at") or "",
+        exchange.get("response_text") or "",
+        _hours(exchange.get("response_seconds")),
+    ] for number, exchange in enumerate(exchanges, 1)]
+
+
+def export_report(tickets):
+    """Detailed CSV report with one row per exchange (one per ticket without exchanges)"""
+    return _csv(REPORT_HEADER, (_report_rows(ticket) for ticket in tickets))
+
+
+def backup_record(ticket):
+    """A ticket as a plain dict of the backup format, without the parsed and internal fields"""
+    data = {key: value for key, value in as_dict(ticket).items() if key not in INTERNAL_FIELDS}
+    if "exchanges" in data:
+        data["exchanges"] = [{key: value for key, value in exchange.items() if key not in EXCHANGE_FIELDS}
+                             for exchange in data["exchanges"]]
+    return data
+
+
+def export_json(tickets):
+    """JSON array of the tickets as ``backup_record()``, formatted like ``json.dumps(tickets, indent=2)``"""
+    parts = []
+    size = 0
+    separator = "[\n  "
+    for ticket in tickets:
+        # JSON strings never contain raw newlines, so this only indents the structure
+        parts.append(separator + json.dumps(backup_record(ticket), ensure_ascii=False, indent=2).replace("\n", "\n  "))
+        separator = ",\n  "
+        size += len(parts[-1])
+        if size >= CHUNK_SIZE:
+            yield "".join(parts)
+            parts = []
+            size = 0
+    parts.append("[]" if separator == "[\n  " else "\n]")
+    yield "".join(parts)
@@ -0,0 +1,298 @@
+"""Bulk import of tickets from JSONL or CSV files.
+
+The input is read as a stream. Every record is validated against the
+ticket schema, tickets that are already in the store (or earlier in the
+input) are skipped as duplicates, and the valid tickets are committed in
+batches with one ``create_many()`` write each. The store assigns the ids.
+Duplicates have the same ``created_at``, so before each write only the
+stored tickets created at the times of the batch are read (see
+``created_at_ids()`` of the stores), never the whole store.
+
+Records that fail validation are written to an error file as JSON lines
+with their line number, the error message and the record itself.
+
+JSONL records use the ticket fields of the app (``title``, ``description``,
+``category``, ``priority``, ``status``, ``created_at``, ...). CSV files may
+use the same names or the German column headers of the CSV export; list
+columns (``tags``, ``comments``, ``exchanges``) hold a JSON array, tags may
+also be comma separated.
+
+Usage::
+
+    python -m tickets.importer tickets_q3.jsonl [--store tickets.db] [--errors errors.jsonl]
+"""
+import argparse
+import csv
+import gzip
+import json
+import os
+import sys
+from datetime import datetime
+
+from . import open_store
+from .timestamps import TIME_FORMAT
+
+BATCH_SIZE = 5000
+
+# German CSV export headers -> ticket fields
+CSV_COLUMNS = {
+    "ID": "id",
+    "Titel": "title",
+    "Beschreibung": "description",
+    "Kategorie": "category",
+    "Priorität": "priority",
+    "Status": "status",
+    "Erstellt": "created_at",
+    "Support antwortet": "support_response_at",
+    "Tags": "tags",
+    "Kommentare": "comments",
+    "Konversationen": "exchanges",
+}
+
+
+class ImportReport:
+    """Counters of one import run"""
+
+    def __init__(self):
+        self.read = 0
+        self.imported = 0
+        self.duplicates = 0
+        self.errors = 0
+
+    def __str__(self):
+        return (f"{self.read} gelesen, {self.imported} importiert, "
+                f"{self.duplicates} Duplikate, {self.errors} Fehler")
+
+
+# Readers, yielding (line number, record, error message)
+
+def read_jsonl(lines):
+    """Records of a JSON Lines stream"""
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield number, line.rstrip("\n"), f"invalid JSON: {e}"
+            continue
+        if isinstance(record, dict):
+            yield number, record, None
+        else:
+            yield number, record, "record is not a JSON object"
+
+
+def read_csv(lines):
+    """Records of a CSV stream with a header row"""
+    reader = csv.DictReader(lines)
+    for row in reader:
+        record = {}
+        for column, value in row.items():
+            if column is None:
+                # More values than header columns
+                yield reader.line_num, row, "too many columns"
+                break
+            if value is None or value == "":
+                continue
+            field = CSV_COLUMNS.get(column.strip(), column.strip())
+            if field in ("tags", "comments", "exchanges") and value.lstrip().startswith("["):
+                try:
+                    value = json.loads(value)
+                except ValueError as e:
+                    yield reader.line_num, row, f"{field} is not a JSON array: {e}"
+                    break
+            elif field == "tags":
+                value = [tag.strip() for tag in value.split(",") if tag.strip()]
+            elif field == "comments":
+                value = [value]
+            record[field] = value
+        else:
+            yield reader.line_num, record, None
+
+
+# Validation
+
+def _text(record, field, required=False):
+    value = record.get(field)
+    if value is None or value == "":
+        if required:
+            raise ValueError(f"{field} is missing")
+        return ""
+    if not isinstance(value, str):
+        raise ValueError(f"{field} must be a string")
+    return value
+
+
+def _timestamp(record, field, required=False):
+    """The timestamp normalized to the store format, None if it is not set"""
+    value = record.get(field)
+    if value is None or value == "":
+        if required:
+            raise ValueError(f"{field} is missing")
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{field} is not a timestamp: {value!r}") from None
+    # Values already in the store format are kept as they are
+    return value if len(value) == 19 and value[10] == " " else parsed.strftime(TIME_FORMAT)
+
+
+def _strings(record, field):
+    value = record.get(field) or []
+    if not isinstance(value, list) or not all(isinstance(v, str) for v in value):
+        raise ValueError(f"{field} must be a list of strings")
+    return value
+
+
+def validate_exchange(record):
+    """Return a clean exchange for a record, raise ValueError if it is invalid"""
+    if not isinstance(record, dict):
+        raise ValueError("exchange is not an object")
+    exchange = {
+        "question_at": _timestamp(record, "question_at", required=True),
+        "question_text": _text(record, "question_text"),
+        "response_at": _timestamp(record, "response_at"),
+        "response_text": _text(record, "response_text"),
+    }
+    if exchange["response_at"] is not None and exchange["response_at"] < exchange["question_at"]:
+        raise ValueError("response_at is before question_at")
+    return exchange
+
+
+def validate_ticket(record):
+    """Return a clean ticket without id for a record, raise ValueError if it is invalid"""
+    exchanges = record.get("exchanges") or []
+    if not isinstance(exchanges, list):
+        raise ValueError("exchanges must be a list")
+    ticket = {
+        "title": _text(record, "title", required=True),
+        "description": _text(record, "description"),
+        "category": _text(record, "category", required=True),
+        "priority": _text(record, "priority", required=True),
+        "status": _text(record, "status", required=True),
+        "created_at": _timestamp(record, "created_at", required=True),
+        "support_response_at": _timestamp(record, "support_response_at"),
+        "tags": _strings(record, "tags"),
+        "comments": _strings(record, "comments"),
+    }
+    try:
+        ticket["exchanges"] = [validate_exchange(e) for e in exchanges]
+    except ValueError as e:
+        raise ValueError(f"exchanges: {e}") from None
+    return ticket
+
+
+def dedupe_key(ticket):
+    """Tickets with the same key are considered the same ticket"""
+    return ticket["created_at"], ticket["title"].strip(), ticket["description"].strip()
+
+
+def stored_keys(store, tickets):
+    """Dedupe keys of the stored tickets created at the same time as one of the given tickets"""
+    ids = store.created_at_ids({ticket["created_at"] for ticket in tickets})
+    return {dedupe_key(t) for t in store.get_many(ids)}
+
+
+# Pipeline
+
+def import_tickets(store, records, batch_size=BATCH_SIZE, errors=None, progress=None):
+    """Validate, dedupe and commit records from a reader, return an ImportReport
+
+    ``errors`` is an optional text file for the rejected records,
+    ``progress`` is called with the report after every committed batch.
+    """
+    report = ImportReport()
+    # Keys of the input so far, the stored tickets are checked per batch
+    seen = set()
+    batch = []
+
+    def commit():
+        stored = stored_keys(store, batch)
+        tickets = [ticket for ticket in batch if dedupe_key(ticket) not in stored]
+        report.duplicates += len(batch) - len(tickets)
+        if tickets:
+            store.create_many(tickets)
+        report.imported += len(tickets)
+        batch.clear()
+        if progress is not None:
+            progress(report)
+
+    for line, record, error in records:
+        report.read += 1
+        if error is None:
+            try:
+                ticket = validate_ticket(record)
+            except ValueError as e:
+                error = str(e)
+        if error is not None:
+            report.errors += 1
+            if errors is not None:
+                errors.write(json.dumps({"line": line, "error": error, "record": record}, ensure_ascii=False) + "\n")
+            continue
+        key = dedupe_key(ticket)
+        if key in seen:
+            report.duplicates += 1
+            continue
+        seen.add(key)
+        batch.append(ticket)
+        if len(batch) >= batch_size:
+            commit()
+    if batch:
+        commit()
+    elif progress is not None:
+        progress(report)
+    return report
+
+
+def reader_for(name):
+    """The reader matching a file name (``.csv`` or JSON Lines, optionally ``.gz``)"""
+    if name.endswith(".gz"):
+        name = name[:-3]
+    return read_csv if name.lower().endswith(".csv") else read_jsonl
+
+
+def _open(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    return open(path, "r", encoding="utf-8", newline="")
+
+
+def main(argv=None):
+    """Import tickets from a JSONL or CSV file into a ticket store"""
+    parser = argparse.ArgumentParser(prog="python -m tickets.importer", description=main.__doc__)
+    parser.add_argument("input", help="JSONL or CSV file, optionally gzip compressed (.gz)")
+    parser.add_argument("--store", default=os.environ.get("TICKETS_STORE", "tickets.json"),
+                        help="ticket store (default: $TICKETS_STORE or tickets.json)")
+    parser.add_argument("--errors", help="file for rejected records (default: INPUT.errors.jsonl)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    store = open_store(args.store)
+    store.load()
+    # One compaction at the end instead of one whenever the journal outgrows the snapshot
+    deferred = hasattr(store, "schedule_compaction")
+    if deferred:
+        store.schedule_compaction = lambda: None
+    errors_path = args.errors or args.input + ".errors.jsonl"
+    with _open(args.input) as f, open(errors_path, "w", encoding="utf-8") as errors:
+        report = import_tickets(
+            store,
+            reader_for(args.input)(f),
+            batch_size=args.batch_size,
+            errors=errors,
+            progress=lambda r: print(f"\r{r}", end="", file=sys.stderr, flush=True),
+        )
+    if deferred:
+        store.compact()
+    print(file=sys.stderr)
+    if report.errors:
+        print(f"Fehlerhafte Zeilen stehen in {errors_path}")
+    else:
+        os.remove(errors_path)
+    print(report)
+    return 1 if report.errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,353 @@
+"""Background jobs for bulk work the app must not wait for.
+
+Exports, imports, compaction, rebuilding the statistics and archiving
+resolved tickets (see archive.py) run as jobs in a thread pool instead of
+inside the rerun that asked for them. The rerun only submits the job and
+returns; the app polls the job state from a fragment and offers the result
+file for download once the job is done.
+
+Jobs are kept in a small SQLite database (``JobQueue``), so queued jobs
+survive a restart and every process of the app sees the same jobs. A job
+runs in the process that submitted it, or after a restart in the first
+process that finds it queued. Jobs that were running when their process
+died are queued again.
+
+A job handler gets the store, the job parameters and a ``JobContext``. It
+reports its progress with ``ctx.progress()``, which also raises
+``Cancelled`` once the job was cancelled, and writes its output to
+``ctx.result_path()``. Handlers run in threads, not processes, because they
+work on the store instance the process shares with its sessions.
+"""
+import gzip
+import io
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import suppress
+from datetime import datetime
+
+from .export import export_csv, export_json, export_report
+from .importer import import_tickets, reader_for
+
+WORKERS = 2
+
+# Finished jobs and their result files are deleted after this many seconds
+KEEP_SECONDS = 24 * 3600
+
+# Minimum seconds between two progress writes of a job
+PROGRESS_INTERVAL = 0.25
+
+# Tickets between two progress reports of an export
+PROGRESS_EVERY = 1000
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+ACTIVE = (QUEUED, RUNNING)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    params TEXT NOT NULL,
+    state TEXT NOT NULL,
+    progress REAL NOT NULL DEFAULT 0,
+    message TEXT NOT NULL DEFAULT '',
+    result TEXT,
+    error TEXT,
+    cancel INTEGER NOT NULL DEFAULT 0,
+    owner INTEGER,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state);
+"""
+
+COLUMNS = ("id", "kind", "params", "state", "progress", "message", "result", "error", "cancel",
+           "owner", "created", "started", "finished")
+
+
+class Cancelled(Exception):
+    """The job was cancelled while it ran"""
+
+
+def _alive(pid):
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        # Exists, but belongs to someone else
+        return True
+    return True
+
+
+class JobQueue:
+    """Persisted job records"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.executescript(SCHEMA)
+
+    def add(self, kind, params):
+        """Queue a job and return its id"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO jobs (kind, params, state, created) VALUES (?, ?, ?, ?)",
+                (kind, json.dumps(params, ensure_ascii=False), QUEUED, time.time()),
+            )
+            return cursor.lastrowid
+
+    def get(self, job_id):
+        """The job as a dict, None if there is none with that id"""
+        jobs = self._select("WHERE id = ?", (job_id,))
+        return jobs[0] if jobs else None
+
+    def list(self, ids=None, states=None):
+        """Jobs, newest first, optionally only those with the given ids or states"""
+        where, params = [], []
+        if ids is not None:
+            where.append(f"id IN ({','.join('?' * len(ids))})")
+            params += list(ids)
+        if states is not None:
+            where.append(f"state IN ({','.join('?' * len(states))})")
+            params += list(states)
+        return self._select(("WHERE " + " AND ".join(where)) if where else "", params)
+
+    def claim(self, job_id):
+        """Mark a queued job as running in this process, return False if it is not queued"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET state = ?, owner = ?, started = ? WHERE id = ? AND state = ? AND cancel = 0",
+                (RUNNING, os.getpid(), time.time(), job_id, QUEUED),
+            )
+            return cursor.rowcount == 1
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE jobs SET {', '.join(f'{name} = ?' for name in fields)} WHERE id = ?",
+                (*fields.values(), job_id),
+            )
+
+    def cancel(self, job_id):
+        """Ask a job to stop; a job that has not started yet is cancelled right away"""
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET cancel = 1 WHERE id = ? AND state IN (?, ?)", (job_id, *ACTIVE))
+            self._conn.execute(
+                "UPDATE jobs SET state = ?, finished = ? WHERE id = ? AND state = ?",
+                (CANCELLED, time.time(), job_id, QUEUED),
+            )
+
+    def cancel_requested(self, job_id):
+        with self._lock:
+            row = self._conn.execute("SELECT cancel FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def requeue_orphans(self):
+        """Queue the running jobs whose process is gone again, return their ids"""
+        orphans = [job["id"] for job in self.list(states=(RUNNING,)) if not _alive(job["owner"])]
+        for job_id in orphans:
+            self.update(job_id, state=QUEUED, owner=None, started=None, progress=0.0, message="")
+        return orphans
+
+    def prune(self, keep_seconds=KEEP_SECONDS):
+        """Delete finished jobs older than keep_seconds together with their result files"""
+        cutoff = time.time() - keep_seconds
+        old = self._select("WHERE state NOT IN (?, ?) AND finished < ?", (*ACTIVE, cutoff))
+        for job in old:
+            if job["result"]:
+                # Another process may prune the same job
+                with suppress(FileNotFoundError):
+                    os.remove(job["result"])
+        with self._lock:
+            self._conn.executemany("DELETE FROM jobs WHERE id = ?", [(job["id"],) for job in old])
+
+    def _select(self, where, params):
+        with self._lock:
+            rows = self._conn.execute(f"SELECT {', '.join(COLUMNS)} FROM jobs {where} ORDER BY id DESC",
+                                      params).fetchall()
+        jobs = []
+        for row in rows:
+            job = dict(zip(COLUMNS, row))
+            job["params"] = json.loads(job["params"])
+            jobs.append(job)
+        return jobs
+
+
+class JobContext:
+    """What a running job handler can use besides the store"""
+
+    def __init__(self, queue, job, directory):
+        self.queue = queue
+        self.job = job
+        self.directory = directory
+        self._reported = 0.0
+
+    def progress(self, fraction, message=""):
+        """Report progress (0 to 1), raise Cancelled if the job was cancelled"""
+        now = time.monotonic()
+        if now - self._reported < PROGRESS_INTERVAL:
+            return
+        self._reported = now
+        if self.queue.cancel_requested(self.job["id"]):
+            raise Cancelled()
+        self.queue.update(self.job["id"], progress=min(max(fraction, 0.0), 1.0), message=message)
+
+    def result_path(self, name):
+        """Path for the output file of the job"""
+        return os.path.join(self.directory, f"job{self.job['id']}_{os.path.basename(name)}")
+
+
+class JobRunner:
+    """Runs the jobs of a queue in a thread pool"""
+
+    def __init__(self, store, directory, handlers=None, workers=WORKERS):
+        os.makedirs(directory, exist_ok=True)
+        self.store = store
+        self.directory = directory
+        self.handlers = dict(HANDLERS if handlers is None else handlers)
+        self.queue = JobQueue(os.path.join(directory, "jobs.db"))
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tickets-job")
+        self.queue.prune()
+        self.queue.requeue_orphans()
+        for job in reversed(self.queue.list(states=(QUEUED,))):
+            self._pool.submit(self._run, job["id"])
+
+    def submit(self, kind, **params):
+        """Queue a job and start it as soon as a worker is free, return its id"""
+        if kind not in self.handlers:
+            raise ValueError(f"unknown job kind: {kind!r}")
+        job_id = self.queue.add(kind, params)
+        self._pool.submit(self._run, job_id)
+        return job_id
+
+    def submit_once(self, kind, **params):
+        """Like submit(), unless a job of that kind is already queued or running"""
+        for job in self.queue.list(states=ACTIVE):
+            if job["kind"] == kind:
+                return job["id"]
+        return self.submit(kind, **params)
+
+    def cancel(self, job_id):
+        self.queue.cancel(job_id)
+
+    def get(self, job_id):
+        return self.queue.get(job_id)
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, job_id):
+        if not self.queue.claim(job_id):
+            return
+        job = self.queue.get(job_id)
+        ctx = JobContext(self.queue, job, self.directory)
+        try:
+            result = self.handlers[job["kind"]](self.store, job["params"], ctx)
+        except Cancelled:
+            self.queue.update(job_id, state=CANCELLED, finished=time.time())
+        except Exception as e:
+            self.queue.update(job_id, state=FAILED, error=f"{type(e).__name__}: {e}", finished=time.time())
+        else:
+            path, message = result if isinstance(result, tuple) else (result, "")
+            self.queue.update(job_id, state=DONE, progress=1.0, result=path, message=message,
+                              finished=time.time())
+        # Old jobs are cleaned up as new ones finish, so a long-running process does not pile them up
+        self.queue.prune()
+
+
+# Handlers: (store, params, ctx) -> result path, or (result path, message)
+
+EXPORTERS = {"csv": export_csv, "report": export_report, "json": export_json}
+
+
+def run_export(store, params, ctx):
+    """Export the tickets matching ``filters`` with the exporter ``format`` to ``name``"""
+    exporter = EXPORTERS[params["format"]]
+    selection = store.query(**params.get("filters", {}))
+    total = len(selection)
+
+    def tracked():
+        for i, ticket in enumerate(selection):
+            if i % PROGRESS_EVERY == 0:
+                ctx.progress(i / max(total, 1), f"{i} / {total} Tickets")
+            yield ticket
+
+    path = ctx.result_path(params["name"])
+    tmp_path = path + ".tmp"
+    try:
+        if params.get("compress"):
+            out = gzip.open(tmp_path, "wt", encoding="utf-8", newline="")
+        else:
+            out = open(tmp_path, "w", encoding="utf-8", newline="")
+        with out:
+            for chunk in exporter(tracked()):
+                out.write(chunk)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return path, f"{total} Tickets"
+
+
+def run_import(store, params, ctx):
+    """Import the uploaded file ``path`` (named ``name``), rejected rows go to the result file"""
+    errors_path = ctx.result_path("import_fehler.jsonl")
+    size = os.path.getsize(params["path"]) or 1
+    try:
+        with open(params["path"], "rb") as raw, open(errors_path, "w", encoding="utf-8") as errors:
+            text = io.TextIOWrapper(raw, encoding="utf-8", newline="")
+            report = import_tickets(
+                store,
+                reader_for(params["name"])(text),
+                errors=errors,
+                progress=lambda r: ctx.progress(raw.tell() / size, str(r)),
+            )
+    finally:
+        with suppress(FileNotFoundError):
+            os.remove(params["path"])
+    if not report.errors:
+        os.remove(errors_path)
+        return None, str(report)
+    return errors_path, str(report)
+
+
+def run_compact(store, params, ctx):
+    """Fold the journal into a new snapshot (checkpoint the WAL for SQLite)"""
+    ctx.progress(0.0, "Verdichten")
+    store.compact()
+    return None, datetime.now().strftime("Verdichtet um %H:%M:%S")
+
+
+def run_rebuild(store, params, ctx):
+    """Recount the statistics and rollups and rebuild the indexes"""
+    ctx.progress(0.0, "Neuaufbau")
+    store.rebuild()
+    return None, f"{len(store.tickets)} Tickets neu gezählt"
+
+
+def run_archive(store, params, ctx):
+    """Move the tickets of ``status`` older than ``days`` days to the archive"""
+    if not hasattr(store, "archive_resolved"):
+        raise ValueError("the store has no archive")
+    ctx.progress(0.0, "Archivieren")
+    moved = store.archive_resolved(params["days"], params["status"],
+                                   progress=lambda f: ctx.progress(f, "Archivieren"))
+    return None, f"{moved} Tickets archiviert"
+
+
+HANDLERS = {
+    "export": run_export,
+    "import": run_import,
+    "compact": run_compact,
+    "rebuild": run_rebuild,
+    "archive": run_archive,
+}
@@ -0,0 +1,218 @@
+"""Compact in-memory model of tickets and exchanges.
+
+The stores hold their tickets as ``Ticket`` objects instead of plain dicts.
+Both classes use ``__slots__``, so there is no per-object dict, and the
+enum-like fields ``priority``, ``status`` and ``category`` are kept as
+small integer codes that are interned per process in ``PRIORITIES``,
+``STATUSES`` and ``CATEGORIES``. The app seeds these tables from its
+settings, so the configured values get the first codes in settings order.
+
+Tickets and exchanges are read-only mappings with the keys of the JSON
+schema (``ticket["status"]``, ``ticket.get("tags", [])``, ``{**ticket}``
+all work as before). A key that was missing in the source dict stays
+missing and unknown keys are kept in ``extra``, so ``from_dict()`` and
+``to_dict()`` convert losslessly in both directions. ``json.dumps`` needs
+``default=to_json`` for model objects.
+"""
+import threading
+from collections.abc import Mapping
+
+_MISSING = object()
+
+
+class Codes:
+    """Interning table between the values of an enum field and small integer codes
+
+    Codes are only ever added, so a code stays valid for the lifetime of
+    the process.
+    """
+
+    def __init__(self):
+        self._values = []
+        self._codes = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._values)
+
+    def code(self, value):
+        """Code of a value, assigning the next free code to a new value"""
+        code = self._codes.get(value)
+        if code is None:
+            with self._lock:
+                code = self._codes.get(value)
+                if code is None:
+                    code = len(self._values)
+                    self._values.append(value)
+                    self._codes[value] = code
+        return code
+
+    def lookup(self, value):
+        """Code of a value, None if no ticket ever had it"""
+        return self._codes.get(value)
+
+    def value(self, code):
+        return self._values[code]
+
+    def extend(self, values):
+        for value in values:
+            self.code(value)
+
+
+PRIORITIES = Codes()
+STATUSES = Codes()
+CATEGORIES = Codes()
+
+# Ticket keys stored as codes -> (slot, code table)
+ENUM_FIELDS = {
+    "priority": ("priority_code", PRIORITIES),
+    "status": ("status_code", STATUSES),
+    "category": ("category_code", CATEGORIES),
+}
+
+
+def seed_codes(settings):
+    """Intern the values configured in the app settings, in settings order"""
+    PRIORITIES.extend(settings.get("priorities", []))
+    STATUSES.extend(settings.get("statuses", []))
+    CATEGORIES.extend(settings.get("categories", []))
+
+
+class _Record(Mapping):
+    """Read-only mapping over the slots named in KEYS plus the extra dict"""
+
+    __slots__ = ("extra",)
+    KEYS = ()
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def get(self, key, default=None):
+        if key in self._key_set:
+            # Unset slots raise AttributeError, which getattr() turns into the default
+            return getattr(self, key, default)
+        extra = getattr(self, "extra", None)
+        return extra.get(key, default) if extra else default
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __iter__(self):
+        for key in self.KEYS:
+            if getattr(self, key, _MISSING) is not _MISSING:
+                yield key
+        extra = getattr(self, "extra", None)
+        if extra:
+            yield from extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+    def _set(self, data):
+        extra = None
+        for key, value in data.items():
+            if key in self._key_set:
+                setattr(self, key, value)
+            else:
+                if extra is None:
+                    extra = {}
+                extra[key] = value
+        self.extra = extra
+
+    def to_dict(self):
+        """The record as a plain dict of the JSON schema"""
+        data = {}
+        for key in self.KEYS:
+            value = getattr(self, key, _MISSING)
+            if value is not _MISSING:
+                data[key] = value
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+
+class Exchange(_Record):
+    """One question of a ticket and the support response to it"""
+
+    __slots__ = ("question_at", "question_text", "response_at", "response_text",
+                 "question_ts", "response_ts", "response_seconds")
+    KEYS = __slots__
+    _key_set = frozenset(KEYS)
+
+    @classmethod
+    def from_dict(cls, data):
+        if isinstance(data, cls):
+            return data
+        exchange = cls.__new__(cls)
+        exchange._set(data)
+        return exchange
+
+
+class Ticket(_Record):
+    """A support ticket"""
+
+    __slots__ = ("id", "title", "description", "category_code", "priority_code", "status_code",
+                 "created_at", "support_response_at", "tags", "comments", "exchanges",
+                 "version", "created_ts", "support_response_ts")
+    KEYS = ("id", "title", "description", "category", "priority", "status",
+            "created_at", "support_response_at", "tags", "comments", "exchanges",
+            "version", "created_ts", "support_response_ts")
+    _key_set = frozenset(KEYS)
+
+    @property
+    def priority(self):
+        return PRIORITIES.value(self.priority_code)
+
+    @property
+    def status(self):
+        return STATUSES.value(self.status_code)
+
+    @property
+    def category(self):
+        return CATEGORIES.value(self.category_code)
+
+    @classmethod
+    def from_dict(cls, data):
+        """Ticket for a dict of the JSON schema (model objects are returned as they are)"""
+        if isinstance(data, cls):
+            return data
+        ticket = cls.__new__(cls)
+        extra = None
+        for key, value in data.items():
+            enum = ENUM_FIELDS.get(key)
+            if enum is not None:
+                setattr(ticket, enum[0], enum[1].code(value))
+            elif key == "exchanges":
+                ticket.exchanges = [Exchange.from_dict(e) for e in value]
+            elif key in cls._key_set:
+                setattr(ticket, key, value)
+            else:
+                if extra is None:
+                    extra = {}
+                extra[key] = value
+        ticket.extra = extra
+        return ticket
+
+    def to_dict(self):
+        data = super().to_dict()
+        if "exchanges" in data:
+            data["exchanges"] = [e.to_dict() for e in data["exchanges"]]
+        return data
+
+
+def as_dict(ticket):
+    """A ticket as a plain dict, copied if it is a model object"""
+    return ticket.to_dict() if isinstance(ticket, _Record) else ticket
+
+
+def to_json(obj):
+    """``default`` hook for json.dumps that serializes model objects"""
+    if isinstance(obj, _Record):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
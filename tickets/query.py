@@ -0,0 +1,173 @@
+"""Ticket filtering shared by the storage backends.
+
+The JSON store answers filters from a ``FilterIndex``: one id set per
+status, priority and category value, and the tickets sorted by
+``created_ts`` for date ranges. ``select()`` starts from the most selective
+predicate, probes the others only for the ids still left and runs the
+full-text search last, restricted to those ids.
+
+Both stores return query results as a ``Selection``, a lazy sequence of
+ids that are resolved to tickets only as they are accessed, so a page of
+the card view or a streaming export never copies the full result.
+"""
+from bisect import bisect_left, bisect_right
+from collections.abc import Sequence
+from datetime import date, timedelta
+
+from .model import ENUM_FIELDS
+from .timestamps import parse_ts
+
+# Tickets resolved per step when a Selection is iterated
+RESOLVE_CHUNK = 500
+
+_NO_IDS = frozenset()
+
+
+def iso_day(value, offset=0):
+    """Normalize a date or ISO string to ``YYYY-MM-DD``, optionally shifted by days"""
+    if value is None:
+        return None
+    if not isinstance(value, date):
+        value = date.fromisoformat(str(value)[:10])
+    return (value + timedelta(days=offset)).isoformat()[:10]
+
+
+class Selection(Sequence):
+    """Ids of the tickets matching a query, resolved to tickets on access
+
+    ``resolve`` maps a list of ids to the list of their tickets. Slicing
+    resolves only the ids in the slice, iterating resolves them in chunks.
+    """
+
+    def __init__(self, ids, resolve):
+        self.ids = ids
+        self._resolve = resolve
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self._resolve(self.ids[index])
+        return self._resolve([self.ids[index]])[0]
+
+    def __iter__(self):
+        for start in range(0, len(self.ids), RESOLVE_CHUNK):
+            yield from self._resolve(self.ids[start:start + RESOLVE_CHUNK])
+
+
+class FilterIndex:
+    """Secondary indexes over the filterable fields of model tickets"""
+
+    def __init__(self):
+        # filter name -> {enum code: ids of the tickets with that value}
+        self._sets = {name: {} for name in ENUM_FIELDS}
+        # ticket id -> created_ts
+        self._created = {}
+        # created_ts and id of every ticket with a valid created_at, sorted by created_ts
+        self._ts = []
+        self._ts_ids = []
+
+    @classmethod
+    def from_tickets(cls, tickets):
+        """Build the indexes with a full scan"""
+        index = cls()
+        for ticket in tickets:
+            index._add_sets(ticket)
+            index._created[ticket["id"]] = ticket.get("created_ts")
+        dated = sorted((ts, i) for i, ts in index._created.items() if ts is not None)
+        index._ts = [ts for ts, _ in dated]
+        index._ts_ids = [i for _, i in dated]
+        return index
+
+    def add(self, ticket):
+        """Index a ticket"""
+        self._add_sets(ticket)
+        ts = ticket.get("created_ts")
+        self._created[ticket["id"]] = ts
+        if ts is not None:
+            # New tickets are usually the newest, so this is mostly an append
+            position = bisect_right(self._ts, ts)
+            self._ts.insert(position, ts)
+            self._ts_ids.insert(position, ticket["id"])
+
+    def remove(self, ticket):
+        """Stop indexing a ticket"""
+        ticket_id = ticket["id"]
+        for name, (slot, _) in ENUM_FIELDS.items():
+            ids = self._sets[name].get(getattr(ticket, slot, None))
+            if ids is not None:
+                ids.discard(ticket_id)
+                if not ids:
+                    del self._sets[name][getattr(ticket, slot, None)]
+        ts = self._created.pop(ticket_id, None)
+        if ts is not None:
+            position = self._ts_ids.index(ticket_id, bisect_left(self._ts, ts))
+            del self._ts[position]
+            del self._ts_ids[position]
+
+    def created_ids(self, timestamps):
+        """Ids of the tickets whose ``created_ts`` is one of the given timestamps, in id order"""
+        ids = []
+        for ts in timestamps:
+            ids.extend(self._ts_ids[bisect_left(self._ts, ts):bisect_right(self._ts, ts)])
+        return sorted(ids)
+
+    def ids(self, name, value):
+        """Ids of the tickets with a value of an enum field, in creation (id) order"""
+        code = ENUM_FIELDS[name][1].lookup(value)
+        return sorted(self._sets[name].get(code, _NO_IDS)) if code is not None else []
+
+    def select(self, search_index=None, search=None, status=None, priority=None, category=None,
+               date_from=None, date_to=None):
+        """Ids of the tickets matching all given filters (None means no filter)
+
+        The ids come in creation (id) order, or best match first with a
+        search text.
+        """
+        sets = []
+        for name, value in (("status", status), ("priority", priority), ("category", category)):
+            if value is not None:
+                # A value no ticket ever had has no code and matches nothing
+                code = ENUM_FIELDS[name][1].lookup(value)
+                sets.append(self._sets[name].get(code, _NO_IDS) if code is not None else _NO_IDS)
+        sets.sort(key=len)
+        if sets and not sets[0]:
+            return []
+
+        dated = date_from is not None or date_to is not None
+        if dated:
+            low = parse_ts(iso_day(date_from))
+            high = parse_ts(iso_day(date_to, offset=1))
+            start = 0 if low is None else bisect_left(self._ts, low)
+            end = len(self._ts) if high is None else bisect_left(self._ts, high)
+            if end <= start:
+                return []
+
+        if dated and (not sets or end - start < len(sets[0])):
+            # The date range is the most selective predicate: walk it and probe the sets
+            ids = self._ts_ids[start:end]
+            if sets:
+                ids = [i for i in ids if all(i in s for s in sets)]
+        elif sets:
+            # Intersecting from the smallest set only ever iterates the smaller side
+            ids = sets[0].intersection(*sets[1:]) if len(sets) > 1 else sets[0]
+            if dated:
+                created = self._created
+                ids = [i for i in ids if created[i] is not None
+                       and (low is None or created[i] >= low) and (high is None or created[i] < high)]
+        else:
+            ids = None
+
+        if search and search_index is not None:
+            within = None
+            if ids is not None:
+                within = ids if isinstance(ids, (set, frozenset)) else set(ids)
+            ranked = search_index.search(search, within=within)
+            if ranked is not None:
+                return ranked
+        return sorted(self._created if ids is None else ids)
+
+    def _add_sets(self, ticket):
+        for name, (slot, _) in ENUM_FIELDS.items():
+            self._sets[name].setdefault(getattr(ticket, slot, None), set()).add(ticket["id"])
@@ -0,0 +1,229 @@
+"""Time-bucketed rollups of ticket activity for the trend charts.
+
+For every day, ISO week and month, and every category and priority, the
+rollups hold
+
+- ``opened``: tickets created in the bucket (by ``created_ts``)
+- ``asked``: questions asked in the bucket (by ``question_ts``)
+- ``answered``: questions answered in the bucket (by ``response_ts``)
+- a quantile sketch (see sketch.py) of the response times of the
+  questions answered in the bucket, from which ``p50_hours``,
+  ``p90_hours`` and ``p99_hours`` are read.
+
+Like the statistics (see stats.py) they are maintained with ``add()`` and
+``remove()`` as tickets change, so a trend query costs O(buckets) instead
+of a scan over all exchanges. Merging the sketches of the month buckets
+gives the percentiles and SLA breaches over the whole history in
+O(months), see ``response_table()``. The JSON store keeps a ``Rollups``
+object in its snapshot, the SQLite store applies the same changes to its
+``rollups`` and ``rollup_times`` tables.
+
+Missing categories and priorities are rolled up under ``""``.
+"""
+from datetime import date
+from functools import lru_cache
+
+import pandas as pd
+
+from .sketch import QuantileSketch, bin_of
+
+ROLLUP_FORMAT = 2
+
+GRANULARITIES = ("day", "week", "month")
+COUNTS = ("opened", "asked", "answered")
+# Response time percentiles, metric -> quantile
+PERCENTILES = {"p50_hours": 0.5, "p90_hours": 0.9, "p99_hours": 0.99}
+METRICS = COUNTS + tuple(PERCENTILES)
+
+SECONDS_PER_DAY = 86400
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+@lru_cache(maxsize=4096)
+def _buckets(day):
+    """Starts of the day, week (Monday) and month containing a day since the epoch"""
+    # 1970-01-01 was a Thursday
+    week = day - (day + 3) % 7
+    month = date.fromordinal(_EPOCH_ORDINAL + day).replace(day=1).toordinal() - _EPOCH_ORDINAL
+    return tuple(d * SECONDS_PER_DAY for d in (day, week, month))
+
+
+def bucket_start(ts, granularity):
+    """Epoch seconds of the start of the day, week (Monday) or month containing ts"""
+    return _buckets(ts // SECONDS_PER_DAY)[GRANULARITIES.index(granularity)]
+
+
+def to_series(values):
+    """Series of values indexed by bucket start, in time order"""
+    buckets = sorted(values)
+    return pd.Series([values[b] for b in buckets], index=pd.to_datetime(buckets, unit="s"), dtype="float64")
+
+
+def _bump_time(cells, key, index, amount):
+    sketch = cells.get(key)
+    if sketch is None:
+        sketch = cells[key] = QuantileSketch()
+    sketch.add_bin(index, amount)
+    if not sketch:
+        del cells[key]
+
+
+def response_table(cells, by, sla_hours=None):
+    """Response time percentiles and SLA breaches per category or priority
+
+    ``cells`` are (category, priority, sketch) triples, typically one per
+    month, ``sla_hours`` maps priorities to their response time target.
+    Returns a DataFrame indexed by the values of ``by`` with the columns
+    ``count``, ``mean_hours``, ``p50_hours``, ``p90_hours``, ``p99_hours``
+    and ``breaches`` (answers slower than the SLA of their ticket's
+    priority).
+    """
+    sketches = {}
+    breaches = {}
+    for category, priority, sketch in cells:
+        value = category if by == "category" else priority
+        sketches.setdefault(value, QuantileSketch()).merge(sketch)
+        target = (sla_hours or {}).get(priority)
+        if target is not None:
+            breaches[value] = breaches.get(value, 0) + sketch.count_above(target * 3600)
+    rows = {}
+    for value, sketch in sketches.items():
+        row = {"count": sketch.count, "mean_hours": sketch.mean() / 3600}
+        for metric, q in PERCENTILES.items():
+            row[metric] = sketch.quantile(q) / 3600
+        row["breaches"] = breaches.get(value, 0)
+        rows[value] = row
+    return pd.DataFrame.from_dict(rows, orient="index",
+                                  columns=["count", "mean_hours", *PERCENTILES, "breaches"])
+
+
+def percentile_trend(cells, metric, category=None, priority=None):
+    """A percentile metric per bucket as a Series, from (bucket, category, priority, sketch) cells"""
+    merged = {}
+    for bucket, c, p, sketch in cells:
+        if (category is None or c == category) and (priority is None or p == priority):
+            merged.setdefault(bucket, QuantileSketch()).merge(sketch)
+    return to_series({bucket: sketch.quantile(PERCENTILES[metric]) / 3600 for bucket, sketch in merged.items()})
+
+
+class Rollups:
+    """Counters and response time sketches per granularity, bucket, category and priority"""
+
+    def __init__(self):
+        # granularity -> {(bucket, category, priority): [opened, asked, answered]}
+        self.counts = {g: {} for g in GRANULARITIES}
+        # granularity -> {(bucket, category, priority): QuantileSketch of response seconds}
+        self.times = {g: {} for g in GRANULARITIES}
+        # The same dicts in GRANULARITIES order, for add()
+        self._count_cells = [self.counts[g] for g in GRANULARITIES]
+        self._time_cells = [self.times[g] for g in GRANULARITIES]
+
+    @classmethod
+    def from_tickets(cls, tickets):
+        """Build the rollups with a full scan"""
+        rollups = cls()
+        for ticket in tickets:
+            rollups.add(ticket)
+        return rollups
+
+    def add(self, ticket, sign=1):
+        """Count a ticket (sign=-1 removes it again)"""
+        category = ticket.get("category") or ""
+        priority = ticket.get("priority") or ""
+        # (timestamp, counter column) of every event of the ticket
+        events = []
+        if ticket.get("created_ts") is not None:
+            events.append((ticket["created_ts"], 0))
+        for exchange in ticket.get("exchanges", []):
+            if exchange.get("question_ts") is not None:
+                events.append((exchange["question_ts"], 1))
+            response_ts = exchange.get("response_ts")
+            if response_ts is not None:
+                events.append((response_ts, 2))
+                seconds = exchange.get("response_seconds")
+                if seconds is not None:
+                    index = bin_of(seconds)
+                    for cells, bucket in zip(self._time_cells, _buckets(response_ts // SECONDS_PER_DAY)):
+                        _bump_time(cells, (bucket, category, priority), index, sign)
+
+        for ts, column in events:
+            for cells, bucket in zip(self._count_cells, _buckets(ts // SECONDS_PER_DAY)):
+                key = (bucket, category, priority)
+                counts = cells.get(key)
+                if counts is None:
+                    counts = cells[key] = [0, 0, 0]
+                counts[column] += sign
+                if not counts[column] and not any(counts):
+                    del cells[key]
+
+    def remove(self, ticket):
+        """Stop counting a ticket"""
+        self.add(ticket, -1)
+
+    def count_rows(self):
+        """(granularity, bucket, category, priority, opened, asked, answered) per cell"""
+        for g, cells in self.counts.items():
+            for key, counts in cells.items():
+                yield (g, *key, *counts)
+
+    def time_rows(self):
+        """(granularity, bucket, category, priority, bin, count) per sketch bin"""
+        for g, cells in self.times.items():
+            for key, sketch in cells.items():
+                for index, n in sketch.bins.items():
+                    yield (g, *key, index, n)
+
+    def merge(self, other):
+        """Add the counts and sketches of other rollups to these, e.g. of archived tickets"""
+        for g in GRANULARITIES:
+            cells = self.counts[g]
+            for key, counts in other.counts[g].items():
+                mine = cells.get(key)
+                if mine is None:
+                    cells[key] = list(counts)
+                else:
+                    for column, count in enumerate(counts):
+                        mine[column] += count
+            for key, sketch in other.times[g].items():
+                self.times[g].setdefault(key, QuantileSketch()).merge(sketch)
+        return self
+
+    def time_cells(self, granularity="month"):
+        """(bucket, category, priority, sketch) per bucket"""
+        for (bucket, category, priority), sketch in self.times[granularity].items():
+            yield bucket, category, priority, sketch
+
+    def sketches(self, granularity="month"):
+        """(category, priority, sketch) per bucket, the cells for response_table()"""
+        for (_, category, priority), sketch in self.times[granularity].items():
+            yield category, priority, sketch
+
+    def trend(self, metric, granularity="day", category=None, priority=None):
+        """Values of a metric per bucket as a Series indexed by bucket start"""
+        if metric in PERCENTILES:
+            return percentile_trend(self.time_cells(granularity), metric, category, priority)
+        values = {}
+        column = COUNTS.index(metric)
+        for (bucket, c, p), counts in self.counts[granularity].items():
+            if (category is None or c == category) and (priority is None or p == priority) and counts[column]:
+                values[bucket] = values.get(bucket, 0) + counts[column]
+        return to_series(values)
+
+    def to_dict(self):
+        return {
+            "format": ROLLUP_FORMAT,
+            "counts": [list(row) for row in self.count_rows()],
+            "times": [list(row) for row in self.time_rows()],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Restore persisted rollups, None if they were written by another format"""
+        if not data or data.get("format") != ROLLUP_FORMAT:
+            return None
+        rollups = cls()
+        for g, bucket, category, priority, *counts in data["counts"]:
+            rollups.counts[g][(bucket, category, priority)] = counts
+        for g, bucket, category, priority, index, n in data["times"]:
+            rollups.times[g].setdefault((bucket, category, priority), QuantileSketch()).bins[index] = n
+        return rollups
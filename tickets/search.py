@@ -0,0 +1,175 @@
+"""Full-text search over tickets.
+
+Titles, descriptions, tags, comments and the question and response texts
+of all exchanges are split into terms. Terms are case folded and German
+umlauts are spelled out (``Größe`` and ``groesse`` both become
+``groesse``), other accents are dropped.
+
+A query matches a ticket if every query term is a prefix of one of its
+terms. Matches are ranked by the summed field weights of the matching
+terms, each scaled by how rare the query term is across all tickets.
+
+The JSON store keeps a ``SearchIndex`` in memory and updates it with every
+applied change, like the statistics. The SQLite store keeps the same
+terms and weights in its ``search_terms`` table.
+"""
+import math
+import re
+import unicodedata
+from bisect import bisect_left, insort
+from collections import Counter
+
+# Bump when the terms produced for a ticket change, so stored indexes get rebuilt
+SEARCH_FORMAT = 1
+
+# How much one occurrence of a term counts, per field
+FIELD_WEIGHTS = {
+    "title": 3,
+    "tags": 3,
+    "description": 1,
+    "comments": 1,
+    "exchanges": 1,
+}
+
+_WORD = re.compile(r"\w+")
+# Combining diacritical marks, left over from accented letters after NFKD
+_MARKS = re.compile("[\u0300-\u036f]+")
+
+
+def normalize(text):
+    """Case fold a text, spell out umlauts and drop other accents"""
+    if text.isascii():
+        return text.lower()
+    # Chained replace() is several times faster than translate() with a dict table
+    text = unicodedata.normalize("NFC", text).casefold().replace("ä", "ae").replace("ö", "oe").replace("ü", "ue")
+    if text.isascii():
+        return text
+    return _MARKS.sub("", unicodedata.normalize("NFKD", text))
+
+
+def tokenize(text):
+    """Normalized terms of a text in order"""
+    return _WORD.findall(normalize(text)) if text else []
+
+
+def query_terms(text):
+    """Distinct normalized terms of a search query"""
+    return list(dict.fromkeys(tokenize(text)))
+
+
+def ticket_terms(ticket):
+    """Weighted terms of a ticket as a Counter"""
+    # Texts are grouped by weight so that each group is tokenized in one go
+    texts = {}
+
+    def add(field, text):
+        if text:
+            texts.setdefault(FIELD_WEIGHTS[field], []).append(text)
+
+    add("title", ticket.get("title"))
+    add("description", ticket.get("description"))
+    for tag in ticket.get("tags", []):
+        add("tags", tag)
+    for comment in ticket.get("comments", []):
+        add("comments", comment)
+    for exchange in ticket.get("exchanges", []):
+        add("exchanges", exchange.get("question_text"))
+        add("exchanges", exchange.get("response_text"))
+
+    # Repeating the terms of a group weight times lets Counter do all the counting
+    tokens = []
+    for weight, group in texts.items():
+        tokens.extend(tokenize("\n".join(group)) * weight)
+    return Counter(tokens)
+
+
+def prefix_end(prefix):
+    """Smallest string greater than every string that starts with prefix"""
+    return prefix + "\U0010ffff"
+
+
+def idf(ticket_count, matching):
+    """Weight of a query term that matches ``matching`` of ``ticket_count`` tickets"""
+    return math.log(1 + ticket_count / matching)
+
+
+class SearchIndex:
+    """Inverted index from terms to the tickets containing them"""
+
+    def __init__(self):
+        # term -> {ticket id: weight}
+        self._postings = {}
+        # All terms in sorted order, for prefix lookups
+        self._terms = []
+        # ticket id -> the terms it was indexed with, for removal
+        self._docs = {}
+
+    @classmethod
+    def from_tickets(cls, tickets):
+        """Build the index with a full scan"""
+        index = cls()
+        for ticket in tickets:
+            terms = ticket_terms(ticket)
+            index._docs[ticket["id"]] = terms
+            for term, weight in terms.items():
+                index._postings.setdefault(term, {})[ticket["id"]] = weight
+        index._terms = sorted(index._postings)
+        return index
+
+    def add(self, ticket):
+        """Index a ticket"""
+        terms = ticket_terms(ticket)
+        self._docs[ticket["id"]] = terms
+        for term, weight in terms.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                insort(self._terms, term)
+            postings[ticket["id"]] = weight
+
+    def remove(self, ticket):
+        """Stop indexing a ticket"""
+        terms = self._docs.pop(ticket["id"], None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self._postings[term]
+            del postings[ticket["id"]]
+            if not postings:
+                del self._postings[term]
+                del self._terms[bisect_left(self._terms, term)]
+
+    def search(self, text, within=None):
+        """Ids of the tickets matching every term of a query, best match first
+
+        ``within`` optionally restricts the result to a set of ids (term
+        weights are still computed over all tickets). Returns None if the
+        query contains no terms at all.
+        """
+        terms = query_terms(text)
+        if not terms:
+            return None
+        scores = None
+        for term in terms:
+            matches = self._match(term)
+            if not matches:
+                return []
+            weight = idf(len(self._docs), len(matches))
+            if scores is None:
+                scores = {i: w * weight for i, w in matches.items() if within is None or i in within}
+                if not scores:
+                    return []
+            else:
+                scores = {i: s + matches[i] * weight for i, s in scores.items() if i in matches}
+                if not scores:
+                    return []
+        return sorted(scores, key=lambda i: (-scores[i], i))
+
+    def _match(self, prefix):
+        """Summed weights of all terms starting with prefix, per ticket"""
+        matches = Counter()
+        start = bisect_left(self._terms, prefix)
+        end = bisect_left(self._terms, prefix_end(prefix), start)
+        for term in self._terms[start:end]:
+            matches.update(self._postings[term])
+        return matches
@@ -0,0 +1,288 @@
+"""Ticket operations shared by the Streamlit app and the HTTP API.
+
+``TicketService`` wraps a store (see ``open_store()``) with the operations
+a client needs: create tickets, add questions, answer them, delete tickets,
+query, read the statistics and change the settings (see settings.py). New
+tickets are validated like imported ones (see importer.py), so the app,
+the API and the importer all write the same schema.
+
+Errors are reported with the exceptions the stores already use: a
+``ValueError`` for invalid input, ``ConflictError`` for a ticket that was
+deleted or changed in between, ``NotFoundError`` (a ``KeyError``) for an
+unknown ticket id.
+"""
+from contextlib import contextmanager
+from datetime import datetime
+
+from . import open_store
+from .errors import ConflictError, NotFoundError
+from .importer import validate_ticket
+from .model import as_dict, seed_codes
+from .settings import FIELDS, SettingsStore, settings_path, validate
+from .timestamps import TIME_FORMAT, parse_ts
+
+# Tickets returned by query() if no limit is given
+DEFAULT_LIMIT = 100
+
+QUERY_FILTERS = ("status", "priority", "category", "date_from", "date_to", "search")
+
+
+def _now():
+    return datetime.now().strftime(TIME_FORMAT)
+
+
+def _timestamp(value, name):
+    """A timestamp argument, now if it is missing, raise ValueError if it is invalid"""
+    if value is None:
+        return _now()
+    if not isinstance(value, str) or parse_ts(value) is None:
+        raise ValueError(f"{name} must be a timestamp like {_now()!r}")
+    return value
+
+
+def _check_version(expected_version):
+    if expected_version is None:
+        return
+    if isinstance(expected_version, bool) or not isinstance(expected_version, int):
+        raise ValueError("expected_version must be an integer")
+
+
+def new_ticket(record):
+    """A validated ticket for a create request, raise ValueError if it is invalid
+
+    ``created_at`` defaults to now. A ticket without exchanges starts its
+    conversation with the description as the first question, like a ticket
+    created in the app.
+    """
+    if not isinstance(record, dict):
+        raise ValueError("ticket must be an object")
+    ticket = validate_ticket({"created_at": _now(), **record})
+    if not ticket["exchanges"] and ticket["description"]:
+        ticket["exchanges"] = [{
+            "question_at": ticket["created_at"],
+            "question_text": ticket["description"],
+            "response_at": None,
+            "response_text": "",
+        }]
+    return ticket
+
+
+class TicketService:
+    """Ticket operations on top of a store"""
+
+    def __init__(self, store, settings):
+        self.store = store
+        self.settings = settings
+        # The configured values get the first enum codes of the in-memory tickets
+        seed_codes(settings.values)
+
+    @classmethod
+    def open(cls, path):
+        """Service for the store at a path (see open_store()) and its settings file"""
+        store = open_store(path)
+        store.load()
+        settings = SettingsStore(settings_path(path))
+        settings.load()
+        return cls(store, settings)
+
+    def create(self, record):
+        """Validate and add a ticket, return its id"""
+        return self.store.create(new_ticket(record))
+
+    def create_many(self, records):
+        """Validate and add several tickets with one write, return their ids
+
+        Nothing is written if any record is invalid; the ValueError names
+        the position of the first invalid record.
+        """
+        tickets = []
+        for i, record in enumerate(records):
+            try:
+                tickets.append(new_ticket(record))
+            except ValueError as e:
+                raise ValueError(f"ticket {i}: {e}") from None
+        return self.store.create_many(tickets) if tickets else []
+
+    def add_question(self, ticket_id, text, asked_at=None, expected_version=None):
+        """Append a new, unanswered question to a ticket"""
+        if not isinstance(text, str) or not text.strip():
+            raise ValueError("text must be a non-empty string")
+        asked_at = _timestamp(asked_at, "asked_at")
+        _check_version(expected_version)
+        self.store.refresh()
+        self._ticket(ticket_id)
+        with self._known(ticket_id):
+            self.store.add_exchange(ticket_id, {
+                "question_at": asked_at,
+                "question_text": text,
+                "response_at": None,
+                "response_text": ""
+            }, expected_version)
+
+    def answer(self, ticket_id, text, answered_at=None, index=None, expected_version=None):
+        """Answer a question of a ticket, by default the last unanswered one, return its index"""
+        if text is not None and not isinstance(text, str):
+            raise ValueError("text must be a string")
+        if index is not None and (isinstance(index, bool) or not isinstance(index, int) or index < 0):
+            raise ValueError("index must be a non-negative integer")
+        answered_at = _timestamp(answered_at, "answered_at")
+        _check_version(expected_version)
+        self.store.refresh()
+        exchanges = self._ticket(ticket_id).get("exchanges", [])
+        if index is None:
+            open_questions = [i for i, e in enumerate(exchanges) if not e.get("response_at")]
+            if not open_questions:
+                raise ValueError(f"Ticket {ticket_id} has no unanswered question")
+            index = open_questions[-1]
+        elif index >= len(exchanges):
+            raise ValueError(f"Ticket {ticket_id} has no question {index}")
+        with self._known(ticket_id):
+            self.store.answer_exchange(ticket_id, index, answered_at, text or "", expected_version)
+        return index
+
+    def set_support_response(self, ticket_id, response_at, expected_version=None):
+        """Set the time of the support response of a ticket"""
+        self.store.update(ticket_id, expected_version=expected_version, support_response_at=response_at)
+
+    def delete(self, ticket_id, expected_version=None):
+        """Delete a ticket (a no-op if it is already gone)"""
+        self.store.delete(ticket_id, expected_version)
+
+    def get(self, ticket_id):
+        """The ticket as a dict, raise NotFoundError if there is none with that id"""
+        self.store.refresh()
+        return as_dict(self._ticket(ticket_id))
+
+    def query(self, offset=0, limit=DEFAULT_LIMIT, **filters):
+        """(number of matches, dicts of the matches from offset to offset + limit)"""
+        self.store.refresh()
+        selection = self.store.query(**filters)
+        return len(selection), [as_dict(t) for t in selection[offset:offset + limit]]
+
+    def stats(self):
+        """Counters over all tickets as a dict"""
+        self.store.refresh()
+        stats = self.store.stats
+        return {
+            "tickets": stats.tickets,
+            "exchanges": stats.exchanges,
+            "answered": stats.answered,
+            "pending": stats.pending,
+            "avg_response_hours": stats.avg_response_hours,
+            "by_priority": dict(stats.by_priority),
+            "by_status": dict(stats.by_status),
+            "by_category": dict(stats.by_category),
+        }
+
+    def get_settings(self):
+        """The current settings with their ``version``"""
+        self.refresh_settings()
+        return {"version": self.settings.version, **self.settings.values}
+
+    def refresh_settings(self):
+        """Pick up settings saved by another process, return True if they changed"""
+        if not self.settings.refresh():
+            return False
+        seed_codes(self.settings.values)
+        return True
+
+    def update_settings(self, values, renames=None, expected_version=None):
+        """Save new settings and migrate the tickets of renamed values, return the new version
+
+        Lists missing from ``values`` stay as they are. ``renames`` maps a
+        value list (``priorities``, ``categories``, ``statuses``) to
+        ``{old value: new value}``; the new values must be in the new
+        settings. Several old values may go to the same new one. The SLA
+        target of a renamed priority moves along unless ``values`` sets one
+        for the new name, and so does a renamed ``resolved_status`` unless
+        ``values`` sets it.
+        """
+        renames = renames or {}
+        if not isinstance(renames, dict) or not all(isinstance(m, dict) for m in renames.values()):
+            raise ValueError("renames must map settings lists to {old: new} objects")
+        resolved_status = values.get("resolved_status")
+        values = {**self.settings.values, **values}
+        if resolved_status is None:
+            status = values["resolved_status"]
+            values["resolved_status"] = renames.get("statuses", {}).get(status, status)
+        if isinstance(values["sla_hours"], dict):
+            sla_hours = values["sla_hours"] = dict(values["sla_hours"])
+            for old, new in renames.get("priorities", {}).items():
+                if old in sla_hours:
+                    sla_hours.setdefault(new, sla_hours[old])
+        values = validate(values)
+        renames = {name: {old: new for old, new in mapping.items() if old != new} for name, mapping in renames.items()}
+        for name, mapping in renames.items():
+            if name not in FIELDS:
+                raise ValueError(f"unknown settings list: {name!r}")
+            unknown = [new for new in mapping.values() if new not in values[name]]
+            if unknown:
+                raise ValueError(f"{name}: {unknown[0]!r} is not configured")
+        version = self.settings.save(values, expected_version)
+        seed_codes(self.settings.values)
+        # The settings come first: a ticket left with an old value after a
+        # crash shows up as not configured and can be moved again
+        for name, mapping in renames.items():
+            self.store.rename_values(FIELDS[name], mapping)
+        return version
+
+    def batch(self, operations):
+        """Run a list of operations, return one result dict per operation
+
+        Operations are dicts with an ``op`` of ``create``, ``add_question``,
+        ``answer`` or ``delete`` and the arguments of the method of that
+        name. Runs of consecutive creates are written with one
+        create_many(). A failed operation does not stop the others; its
+        result has ``ok: false`` and the error.
+        """
+        results = [None] * len(operations)
+        creates = []
+
+        def flush():
+            if creates:
+                ids = self.store.create_many([ticket for _, ticket in creates])
+                for (i, _), ticket_id in zip(creates, ids):
+                    results[i] = {"ok": True, "id": ticket_id}
+                creates.clear()
+
+        for i, operation in enumerate(operations):
+            try:
+                if not isinstance(operation, dict):
+                    raise ValueError("operation is not an object")
+                op = operation.get("op")
+                if op == "create":
+                    creates.append((i, new_ticket(operation.get("ticket") or {})))
+                    continue
+                flush()
+                if op == "add_question":
+                    self.add_question(operation["id"], operation.get("text"), operation.get("asked_at"),
+                                      operation.get("expected_version"))
+                    results[i] = {"ok": True}
+                elif op == "answer":
+                    index = self.answer(operation["id"], operation.get("text"), operation.get("answered_at"),
+                                        operation.get("index"), operation.get("expected_version"))
+                    results[i] = {"ok": True, "index": index}
+                elif op == "delete":
+                    self.delete(operation["id"], operation.get("expected_version"))
+                    results[i] = {"ok": True}
+                else:
+                    raise ValueError(f"unknown op: {op!r}")
+            except (ValueError, KeyError, TypeError, ConflictError) as e:
+                results[i] = {"ok": False, "error": type(e).__name__, "message": str(e)}
+        flush()
+        return results
+
+    @contextmanager
+    def _known(self, ticket_id):
+        """Report a ticket deleted during a write like an unknown one"""
+        try:
+            yield
+        except ConflictError:
+            self._ticket(ticket_id)
+            raise
+
+    def _ticket(self, ticket_id):
+        ticket = self.store.get(ticket_id)
+        if ticket is None:
+            raise NotFoundError(ticket_id)
+        return ticket
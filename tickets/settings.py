@@ -0,0 +1,159 @@
+"""App settings persisted next to the ticket store.
+
+The configured priorities, categories, statuses, SLA targets and the
+status of resolved tickets (the ones the archive moves, see archive.py)
+are kept in a small JSON file beside the store (``tickets_settings.json``
+for ``tickets.json`` or ``tickets.db``), so they are shared by all
+sessions and processes and survive a restart. Every save bumps the
+``version`` in the file. Callers pass the version they edited to
+``save()``, which turns the save into a compare-and-swap like
+``expected_version`` of the stores.
+
+A change of the value lists can rename or merge values (``{old: new}``
+per field). The tickets are then migrated with the stores'
+``rename_values()``, which touches only the tickets that carry a renamed
+value and updates the statistics, rollups and filter indexes for just
+those tickets. Everything else that depends on the settings (the enum
+codes, the chart specs) is keyed by the values, so a new settings version
+only makes the app seed a few new codes and miss its chart cache once.
+"""
+import json
+import os
+import threading
+
+from .errors import ConflictError
+from .locking import FileLock
+
+SETTINGS_FORMAT = 1
+
+DEFAULTS = {
+    "priorities": ["🟢 Niedrig", "🟡 Mittel", "🔴 Hoch"],
+    "categories": ["Bug", "Feature Request", "Support", "Dokumentation", "Sonstiges"],
+    "statuses": ["Offen", "In Bearbeitung", "Gelöst"],
+    # Response time target per priority in hours
+    "sla_hours": {"🟢 Niedrig": 72, "🟡 Mittel": 24, "🔴 Hoch": 4},
+    # One of the statuses, its tickets are archived after a while (see archive.py)
+    "resolved_status": "Gelöst",
+}
+
+# Value lists of the settings -> ticket field they configure
+FIELDS = {"priorities": "priority", "categories": "category", "statuses": "status"}
+
+
+def settings_path(store_path):
+    """Settings file of the ticket store at a path"""
+    return os.path.splitext(store_path)[0] + "_settings.json"
+
+
+def _file_id(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+def _value_list(values, name):
+    if not isinstance(values, list) or not all(isinstance(v, str) for v in values):
+        raise ValueError(f"{name} must be a list of strings")
+    values = list(dict.fromkeys(v.strip() for v in values if v.strip()))
+    if not values:
+        raise ValueError(f"{name} must not be empty")
+    return values
+
+
+def validate(values):
+    """Settings with blank and duplicate values dropped, raise ValueError if they are invalid"""
+    settings = {name: _value_list(values.get(name), name) for name in FIELDS}
+    sla_hours = values.get("sla_hours") or {}
+    if not isinstance(sla_hours, dict):
+        raise ValueError("sla_hours must be an object")
+    for priority, hours in sla_hours.items():
+        if isinstance(hours, bool) or not isinstance(hours, (int, float)) or hours <= 0:
+            raise ValueError(f"sla_hours of {priority} must be a positive number")
+    # Targets of priorities that are no longer configured are dropped
+    settings["sla_hours"] = {p: sla_hours[p] for p in settings["priorities"] if p in sla_hours}
+    if values.get("resolved_status") not in settings["statuses"]:
+        raise ValueError(f"resolved_status {values.get('resolved_status')!r} is not a configured status")
+    settings["resolved_status"] = values["resolved_status"]
+    return settings
+
+
+def guess_renames(old, new):
+    """{old value: new value} for values that were replaced in place in a list
+
+    A value counts as renamed if it was removed and the value now at its
+    position was added. Anything else is left to the caller.
+    """
+    return {a: b for a, b in zip(old, new) if a != b and a not in new and b not in old}
+
+
+class SettingsStore:
+    """Versioned settings in a JSON file, shared by all sessions of a process"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file_lock = FileLock(path + ".lock")
+        self._file_id = None
+        self._values = dict(DEFAULTS)
+        self._version = 0
+
+    @property
+    def version(self):
+        """Number of saves so far, 0 while the defaults are in use"""
+        return self._version
+
+    @property
+    def values(self):
+        """The current settings as a dict, not to be modified"""
+        return self._values
+
+    def load(self):
+        """Read the settings file, keep the defaults if there is none"""
+        with self._lock:
+            self._file_id = _file_id(self.path)
+            if self._file_id is None:
+                self._values, self._version = dict(DEFAULTS), 0
+                return self._values
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("format") != SETTINGS_FORMAT:
+                raise ValueError(f"{self.path}: unknown settings format {data.get('format')!r}")
+            self._values = {name: data.get(name, default) for name, default in DEFAULTS.items()}
+            self._version = data["version"]
+            return self._values
+
+    def refresh(self):
+        """Pick up a save of another process, costs one ``stat`` if there was none
+
+        Returns True if the settings changed.
+        """
+        if _file_id(self.path) == self._file_id:
+            return False
+        version = self._version
+        self.load()
+        return self._version != version
+
+    def save(self, values, expected_version=None):
+        """Validate and write new settings, return the new version
+
+        Raises ConflictError if the settings were saved by someone else
+        after expected_version.
+        """
+        settings = validate(values)
+        with self._file_lock:
+            self.refresh()
+            if expected_version is not None and self._version != expected_version:
+                raise ConflictError(
+                    f"Settings are at version {self._version}, expected {expected_version}"
+                )
+            data = {"format": SETTINGS_FORMAT, "version": self._version + 1, **settings}
+            tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            self.load()
+        return self._version
@@ -0,0 +1,98 @@
+"""Mergeable quantile sketch for response times.
+
+``QuantileSketch`` follows the DDSketch idea: values are counted in bins
+on a logarithmic scale, bin ``i`` holding the values in
+``(GAMMA ** (i - 1), GAMMA ** i]``. Every quantile read back is within
+``ALPHA`` (2.5%) of the true value relative to it, for any history length,
+while the number of bins only grows with the logarithm of the value range
+(a few hundred bins cover one second to one year).
+
+Two sketches are merged by adding their bin counts, so sketches kept per
+time bucket (see rollups.py) can be combined into one for any range of
+buckets, category or priority. Counts may also be subtracted, which is
+how the stores take back the response times of a ticket that changed.
+"""
+import math
+from collections import Counter
+
+ALPHA = 0.025
+GAMMA = (1 + ALPHA) / (1 - ALPHA)
+_LOG_GAMMA = math.log(GAMMA)
+
+# Bin of response times below one second (immediate answers)
+ZERO_BIN = -1
+
+
+def bin_of(seconds):
+    """Bin of a value"""
+    if seconds < 1:
+        return ZERO_BIN
+    return math.ceil(math.log(seconds) / _LOG_GAMMA - 1e-9)
+
+
+def bin_value(index):
+    """Value that represents a bin, within ALPHA of every value in it"""
+    if index == ZERO_BIN:
+        return 0.0
+    return 2 * GAMMA ** index / (GAMMA + 1)
+
+
+class QuantileSketch:
+    """Counts of values per logarithmic bin"""
+
+    __slots__ = ("bins",)
+
+    def __init__(self, bins=None):
+        self.bins = Counter(bins or ())
+
+    def __bool__(self):
+        return bool(self.bins)
+
+    @property
+    def count(self):
+        return sum(self.bins.values())
+
+    def add(self, value, count=1):
+        """Count a value (a negative count removes it again)"""
+        self.add_bin(bin_of(value), count)
+
+    def add_bin(self, index, count):
+        bins = self.bins
+        bins[index] += count
+        if not bins[index]:
+            del bins[index]
+
+    def merge(self, other):
+        """Add the counts of another sketch to this one"""
+        for index, count in other.bins.items():
+            self.add_bin(index, count)
+        return self
+
+    def quantile(self, q):
+        """Approximate q-quantile (0 <= q <= 1) of the counted values, None if there are none"""
+        total = self.count
+        if total <= 0:
+            return None
+        # Lower quantile: the value at rank q * (total - 1), counting from 0
+        rank = q * (total - 1)
+        seen = 0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen > rank:
+                return bin_value(index)
+        return bin_value(max(self.bins))
+
+    def mean(self):
+        """Approximate mean of the counted values, None if there are none"""
+        total = self.count
+        if total <= 0:
+            return None
+        return sum(bin_value(index) * count for index, count in self.bins.items()) / total
+
+    def count_above(self, threshold):
+        """Approximate number of values greater than threshold
+
+        Bins that straddle the threshold are counted if their
+        representative value is above it.
+        """
+        return sum(count for index, count in self.bins.items() if bin_value(index) > threshold)
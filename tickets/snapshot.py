@@ -0,0 +1,284 @@
+"""Snapshot files of the journaled store, as JSON or in a binary format.
+
+``JournalStore`` writes its snapshot as JSON by default. A store path
+ending in ``.bin`` selects the binary format instead. The binary format is
+read through ``mmap``, so a cold start does not parse the tickets. A
+ticket only costs a small ``MappedTicket`` with its id, enum codes,
+version and parsed timestamps. Its text fields are decoded on first
+access, which means a ticket is decoded when it is shown, searched (the
+search index is built on the first search, see store.py) or exported.
+Filters, statistics and rollups need none of them.
+
+Binary layout (little endian, sections aligned to 8 bytes)::
+
+    header    magic, format, ticket count, offset and length of the metadata
+    id        int64 per ticket, in creation order
+    version   int64 per ticket, 0 if the ticket has none
+    created_ts, support_response_ts
+              int64 per ticket, NULL_TS if the timestamp is missing
+    priority, status, category
+              uint16 per ticket, index into the value list of the field in
+              the metadata, NULL_CODE if the ticket has no value
+    offsets   uint64 per ticket plus one, into the string heap
+    heap      per ticket a UTF-8 JSON object with all other fields
+              (title, description, created_at, exchanges, ...)
+    metadata  UTF-8 JSON: seq, next_id, stats, rollups and the value lists
+
+The enum codes of the file are its own, because the codes of the model
+are interned per process. On load, the value lists are mapped onto the
+codes of the process once.
+
+Convert an existing store between the formats (the journal is folded in)::
+
+    python -m tickets.snapshot tickets.json tickets.bin [--check]
+    python -m tickets.snapshot tickets.bin tickets.json
+"""
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from .model import ENUM_FIELDS, Exchange, Ticket, to_json
+
+BINARY_FORMAT = 1
+BINARY_EXTENSION = ".bin"
+MAGIC = b"TICKETS\x00"
+
+# magic, format, ticket count, metadata offset, metadata length
+HEADER = struct.Struct("<8sIIQQ")
+
+NULL_TS = -(1 << 63)
+NULL_CODE = 0xFFFF
+
+# Columns in file order, int64 and uint16
+INT_COLUMNS = ("id", "version", "created_ts", "support_response_ts")
+CODE_COLUMNS = ("priority", "status", "category")
+
+# Ticket fields kept in columns, everything else goes to the heap
+COLUMN_FIELDS = frozenset(INT_COLUMNS + CODE_COLUMNS)
+
+
+def is_binary(path):
+    """Whether snapshots at a path are written in the binary format"""
+    return os.path.splitext(path)[1].lower() == BINARY_EXTENSION
+
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+
+def _layout(count):
+    """Offsets of the columns, the offsets table and the heap for a ticket count"""
+    offsets = {}
+    position = _align(HEADER.size)
+    for name in INT_COLUMNS:
+        offsets[name] = position
+        position += 8 * count
+    for name in CODE_COLUMNS:
+        offsets[name] = position
+        position = _align(position + 2 * count)
+    offsets["offsets"] = position
+    offsets["heap"] = position + 8 * (count + 1)
+    return offsets
+
+
+def _little_endian(values):
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values
+
+
+def _column(buffer, typecode, offset, count):
+    values = array(typecode)
+    values.frombytes(buffer[offset:offset + values.itemsize * count])
+    return _little_endian(values)
+
+
+class MappedTicket(Ticket):
+    """A ticket of a binary snapshot whose text fields are decoded from the heap on first access"""
+
+    __slots__ = ("_snapshot", "_row")
+
+    # Slots that stay unset until the heap entry of the ticket is decoded
+    _LAZY = frozenset(("title", "description", "created_at", "support_response_at", "tags", "comments",
+                       "exchanges", "extra"))
+
+    def __getattr__(self, name):
+        # Only called for unset slots
+        if name not in MappedTicket._LAZY:
+            raise AttributeError(name)
+        try:
+            object.__getattribute__(self, "extra")
+        except AttributeError:
+            self._decode()
+        return object.__getattribute__(self, name)
+
+    def _decode(self):
+        extra = None
+        for key, value in self._snapshot.heap_entry(self._row).items():
+            if key == "exchanges":
+                self.exchanges = [Exchange.from_dict(e) for e in value]
+            elif key in self._key_set:
+                setattr(self, key, value)
+            else:
+                if extra is None:
+                    extra = {}
+                extra[key] = value
+        self.extra = extra
+
+    def raw(self):
+        """The encoded heap entry of the ticket"""
+        # Tickets are replaced, never changed, so the entry is always current
+        return self._snapshot.heap_bytes(self._row)
+
+
+class BinarySnapshot:
+    """A binary snapshot file opened with mmap"""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            # On POSIX the mapping stays valid after the file is closed or
+            # replaced. Tickets read from it keep it open, compaction copies
+            # their entries from it. Windows cannot replace a mapped file, so
+            # JournalStore refuses binary snapshots there.
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.count, meta_offset, meta_length = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != BINARY_FORMAT:
+            raise ValueError(f"{path}: not a binary ticket snapshot of format {BINARY_FORMAT}")
+        self.meta = json.loads(self._map[meta_offset:meta_offset + meta_length])
+        self._layout = _layout(self.count)
+        self._offsets = _column(self._map, "Q", self._layout["offsets"], self.count + 1)
+        self._heap = self._layout["heap"]
+
+    def heap_bytes(self, row):
+        return self._map[self._heap + self._offsets[row]:self._heap + self._offsets[row + 1]]
+
+    def heap_entry(self, row):
+        return json.loads(self.heap_bytes(row))
+
+    def tickets(self):
+        """A MappedTicket per row, built from the columns only"""
+        layout, count = self._layout, self.count
+        ints = [_column(self._map, "q", layout[name], count) for name in INT_COLUMNS]
+        codes = []
+        for name in CODE_COLUMNS:
+            # File code -> code of this process
+            interned = [ENUM_FIELDS[name][1].code(value) for value in self.meta["values"][name]]
+            codes.append([None if c == NULL_CODE else interned[c]
+                          for c in _column(self._map, "H", layout[name], count)])
+        slots = [ENUM_FIELDS[name][0] for name in CODE_COLUMNS]
+        tickets = []
+        for row, (ticket_id, version, created_ts, support_response_ts) in enumerate(zip(*ints)):
+            ticket = MappedTicket.__new__(MappedTicket)
+            ticket.id = ticket_id
+            if version:
+                ticket.version = version
+            # Set even if missing, like annotate_ticket() does
+            ticket.created_ts = None if created_ts == NULL_TS else created_ts
+            ticket.support_response_ts = None if support_response_ts == NULL_TS else support_response_ts
+            for slot, column in zip(slots, codes):
+                if column[row] is not None:
+                    setattr(ticket, slot, column[row])
+            ticket._snapshot = self
+            ticket._row = row
+            tickets.append(ticket)
+        return tickets
+
+
+def _heap_entry(ticket):
+    if isinstance(ticket, MappedTicket):
+        # Unchanged since it was read, copied without decoding it
+        return ticket.raw()
+    rest = {key: value for key, value in ticket.items() if key not in COLUMN_FIELDS}
+    return json.dumps(rest, ensure_ascii=False, separators=(",", ":"), default=to_json).encode("utf-8")
+
+
+def write_binary(f, meta, tickets):
+    """Write a binary snapshot of model tickets and the metadata dict to a binary file"""
+    tickets = list(tickets)
+    count = len(tickets)
+    layout = _layout(count)
+    ints = {name: array("q") for name in INT_COLUMNS}
+    codes = {name: array("H") for name in CODE_COLUMNS}
+    values = {name: {} for name in CODE_COLUMNS}
+    offsets = array("Q", [0])
+    f.seek(layout["heap"])
+    heap_size = 0
+    for ticket in tickets:
+        ints["id"].append(ticket["id"])
+        ints["version"].append(ticket.get("version") or 0)
+        for name in ("created_ts", "support_response_ts"):
+            ts = ticket.get(name)
+            ints[name].append(NULL_TS if ts is None else ts)
+        for name in CODE_COLUMNS:
+            value = ticket.get(name)
+            codes[name].append(NULL_CODE if value is None else values[name].setdefault(value, len(values[name])))
+        entry = _heap_entry(ticket)
+        f.write(entry)
+        heap_size += len(entry)
+        offsets.append(heap_size)
+    meta = json.dumps({**meta, "values": {name: list(v) for name, v in values.items()}},
+                      ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    meta_offset = layout["heap"] + heap_size
+    f.write(meta)
+    f.seek(0)
+    f.write(HEADER.pack(MAGIC, BINARY_FORMAT, count, meta_offset, len(meta)))
+    for name, column in (*ints.items(), *codes.items(), ("offsets", offsets)):
+        f.seek(layout[name])
+        f.write(_little_endian(column).tobytes())
+
+
+def read_binary(path):
+    """(metadata, model tickets) of a binary snapshot file"""
+    snapshot = BinarySnapshot(path)
+    return snapshot.meta, snapshot.tickets()
+
+
+def convert(source, target, check=False):
+    """Write the tickets of the store at source (with its journal) as a snapshot at target
+
+    The format of the target is picked by its extension. With check, the
+    target is read back and compared with the source. Returns the number
+    of tickets.
+    """
+    from .store import JournalStore
+
+    store = JournalStore(source)
+    store.load()
+    target_store = JournalStore(target)
+    # A shared journal (tickets.json -> tickets.bin) is fine: the snapshot
+    # keeps the seq of the source, so its records are skipped on replay
+    journal = target_store.journal_path
+    if journal != store.journal_path and os.path.exists(journal) and os.path.getsize(journal):
+        raise ValueError(f"{journal} would be replayed on top of the converted snapshot")
+    store.write_snapshot(target)
+    if check:
+        target_store.load()
+        if [t.to_dict() for t in target_store.tickets] != [t.to_dict() for t in store.tickets]:
+            raise ValueError(f"{target} does not read back the tickets of {source}")
+        if target_store.stats.to_dict() != store.stats.to_dict():
+            raise ValueError(f"{target} does not read back the statistics of {source}")
+    return len(store.tickets)
+
+
+def main(argv=None):
+    """Convert a journaled ticket store between the JSON and the binary snapshot format"""
+    parser = argparse.ArgumentParser(prog="python -m tickets.snapshot", description=main.__doc__)
+    parser.add_argument("source", help="store to read, e.g. tickets.json")
+    parser.add_argument("target", help=f"snapshot to write, binary if it ends in {BINARY_EXTENSION}")
+    parser.add_argument("--check", action="store_true", help="read the target back and compare")
+    args = parser.parse_args(argv)
+    try:
+        count = convert(args.source, args.target, args.check)
+    except (OSError, ValueError) as e:
+        print(e, file=sys.stderr)
+        return 1
+    print(f"{count} Tickets nach {args.target} geschrieben")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
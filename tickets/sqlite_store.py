@@ -0,0 +1,820 @@
+"""SQLite ticket store.
+
+Tickets, exchanges, tags and comments live in normalized tables. The
+columns the ticket list filters on (status, priority, category and
+created_at) are indexed, so filters and date ranges are answered by SQLite
+instead of a Python scan over every ticket.
+
+One store instance is meant to be shared by all sessions of a process. The
+full ticket list is cached as a read-only tuple of ``Ticket`` objects (see
+model.py) and only re-read when the database changed, including commits
+from other processes.
+
+Writes run in ``BEGIN IMMEDIATE`` transactions, so a read-check-write
+sequence is atomic across processes. Each ticket row has a ``version``
+that is bumped on every change; callers can pass ``expected_version`` to
+turn a write into a compare-and-swap.
+
+Ids come from a monotonic sequence kept in the ``meta`` table, so the id
+of a deleted ticket is never reused.
+
+Statistics (see stats.py) are kept in the ``meta`` table and updated in
+the same transaction as the change they reflect. So are the time-bucketed
+rollups (see rollups.py) in the ``rollups`` and ``rollup_times`` tables.
+The parsed timestamp fields from timestamps.py are stored in their own
+integer columns.
+
+The full-text search index (see search.py) is the ``search_terms`` table,
+one row per term and ticket. It is rewritten for a ticket in the same
+transaction as every change to that ticket, and prefix queries are index
+range scans on it.
+"""
+import json
+import sqlite3
+import sys
+import threading
+from contextlib import contextmanager
+
+from .errors import ConflictError
+from .model import ENUM_FIELDS, Ticket, as_dict
+from .query import Selection, iso_day
+from .rollups import COUNTS, PERCENTILES, ROLLUP_FORMAT, Rollups, response_table, to_series
+from .search import SEARCH_FORMAT, idf, prefix_end, query_terms, ticket_terms
+from .sketch import QuantileSketch
+from .stats import TicketStats
+from .timestamps import annotate_exchange, annotate_ticket, parse_ts
+from .timing import span
+
+TICKET_COLUMNS = ("id", "title", "description", "category", "priority", "status",
+                  "created_at", "support_response_at", "version", "created_ts", "support_response_ts")
+EXCHANGE_COLUMNS = ("question_at", "question_text", "response_at", "response_text",
+                    "question_ts", "response_ts", "response_seconds")
+
+# Ticket keys whose absence would read back as NULL or as no child rows. The
+# present column has one bit per key that the stored ticket had.
+OPTIONAL_KEYS = ("support_response_at", "tags", "comments", "exchanges")
+ALL_PRESENT = (1 << len(OPTIONAL_KEYS)) - 1
+
+# Values bound per IN (...) list, well below the parameter limit of SQLite
+SQL_CHUNK = 500
+
+INSERT_EXCHANGE = (
+    f"INSERT INTO exchanges (ticket_id, position, {', '.join(EXCHANGE_COLUMNS)}, extra)"
+    f" VALUES ({', '.join('?' * (len(EXCHANGE_COLUMNS) + 3))})"
+)
+
+# Columns added after the first release of the schema, with their definitions
+ADDED_COLUMNS = {
+    "tickets": {
+        "version": "INTEGER NOT NULL DEFAULT 1",
+        "created_ts": "INTEGER",
+        "support_response_ts": "INTEGER",
+        # Rows written before the column existed always read back with all keys
+        "present": f"INTEGER NOT NULL DEFAULT {ALL_PRESENT}",
+    },
+    "exchanges": {
+        "question_ts": "INTEGER",
+        "response_ts": "INTEGER",
+        "response_seconds": "INTEGER",
+    },
+}
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS tickets (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    description TEXT NOT NULL,
+    category TEXT,
+    priority TEXT,
+    status TEXT,
+    created_at TEXT NOT NULL,
+    support_response_at TEXT,
+    extra TEXT,
+    version INTEGER NOT NULL DEFAULT 1,
+    created_ts INTEGER,
+    support_response_ts INTEGER,
+    present INTEGER NOT NULL DEFAULT {ALL_PRESENT}
+);
+CREATE INDEX IF NOT EXISTS tickets_status ON tickets (status, created_at);
+CREATE INDEX IF NOT EXISTS tickets_priority ON tickets (priority, created_at);
+CREATE INDEX IF NOT EXISTS tickets_category ON tickets (category, created_at);
+CREATE INDEX IF NOT EXISTS tickets_created_at ON tickets (created_at);
+
+CREATE TABLE IF NOT EXISTS exchanges (
+    ticket_id INTEGER NOT NULL REFERENCES tickets (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    question_at TEXT,
+    question_text TEXT,
+    response_at TEXT,
+    response_text TEXT,
+    extra TEXT,
+    question_ts INTEGER,
+    response_ts INTEGER,
+    response_seconds INTEGER,
+    PRIMARY KEY (ticket_id, position)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS tags (
+    ticket_id INTEGER NOT NULL REFERENCES tickets (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    tag TEXT NOT NULL,
+    PRIMARY KEY (ticket_id, position)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS tags_tag ON tags (tag);
+
+CREATE TABLE IF NOT EXISTS comments (
+    ticket_id INTEGER NOT NULL REFERENCES tickets (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    body TEXT NOT NULL,
+    PRIMARY KEY (ticket_id, position)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS search_terms (
+    term TEXT NOT NULL,
+    ticket_id INTEGER NOT NULL REFERENCES tickets (id) ON DELETE CASCADE,
+    weight INTEGER NOT NULL,
+    PRIMARY KEY (term, ticket_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS search_terms_ticket ON search_terms (ticket_id);
+
+CREATE TABLE IF NOT EXISTS rollups (
+    granularity TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    category TEXT NOT NULL,
+    priority TEXT NOT NULL,
+    opened INTEGER NOT NULL,
+    asked INTEGER NOT NULL,
+    answered INTEGER NOT NULL,
+    PRIMARY KEY (granularity, bucket, category, priority)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS rollup_times (
+    granularity TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    category TEXT NOT NULL,
+    priority TEXT NOT NULL,
+    bin INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (granularity, bucket, category, priority, bin)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def _exchange_row(ticket_id, position, exchange):
+    return ((ticket_id, position) + tuple(exchange.get(c) for c in EXCHANGE_COLUMNS)
+            + (_extra(exchange, EXCHANGE_COLUMNS),))
+
+
+def _present(ticket):
+    """Bits of the optional keys a ticket has, see OPTIONAL_KEYS"""
+    return sum(1 << i for i, key in enumerate(OPTIONAL_KEYS) if key in ticket)
+
+
+def _extra(record, known):
+    """Serialize the keys of a record that have no column of their own"""
+    rest = {k: v for k, v in record.items() if k not in known}
+    return json.dumps(rest, ensure_ascii=False) if rest else None
+
+
+class SQLiteStore:
+    """Ticket store backed by a local SQLite database"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._view_version = None
+        self._view = ()
+        self._stats_version = None
+        self._stats_view = None
+        # Autocommit mode, transactions are started explicitly in _transaction()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute("PRAGMA foreign_keys = ON")
+        self._conn.executescript(SCHEMA)
+        with self._transaction():
+            migrated = self._migrate()
+            if migrated:
+                # Fill the new timestamp columns by rewriting every ticket once
+                tickets = self._fetch_locked("", ())
+                self._conn.execute("DELETE FROM tickets")
+                self._insert(*(annotate_ticket(ticket) for ticket in tickets))
+            if migrated or self._read_meta("search_format") != str(SEARCH_FORMAT):
+                # Databases created before the search index, or by another index format
+                self._rebuild_search()
+            if self._read_stats() is None:
+                # Databases created before statistics were stored, or by another stats format
+                self._write_stats(TicketStats.from_tickets(self._fetch_locked("", ())))
+            if self._read_meta("rollup_format") != str(ROLLUP_FORMAT):
+                self._rebuild_rollups()
+
+    @property
+    def version(self):
+        """Value that changes whenever the ticket data changes"""
+        with self._lock:
+            # data_version only moves for commits made by other connections
+            data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            return data_version, self._writes
+
+    @property
+    def tickets(self):
+        """Read-only view of all tickets in creation order"""
+        version = self.version
+        if version != self._view_version:
+            self._view = tuple(self._fetch("", ()))
+            self._view_version = version
+        return self._view
+
+    @property
+    def stats(self):
+        """Statistics as of the current version"""
+        version = self.version
+        if version != self._stats_version:
+            with self._lock:
+                self._stats_view = self._read_stats() or TicketStats()
+            self._stats_version = version
+        return self._stats_view
+
+    def trend(self, metric, granularity="day", category=None, priority=None):
+        """A rollup metric per day, week or month as a Series, see Rollups.trend()"""
+        where = "granularity = ?"
+        params = [granularity]
+        if category is not None:
+            where += " AND category = ?"
+            params.append(category)
+        if priority is not None:
+            where += " AND priority = ?"
+            params.append(priority)
+        with self._lock:
+            if metric in PERCENTILES:
+                sketches = {}
+                for bucket, index, n in self._conn.execute(
+                    f"SELECT bucket, bin, SUM(count) FROM rollup_times WHERE {where} GROUP BY bucket, bin", params
+                ):
+                    sketches.setdefault(bucket, QuantileSketch()).bins[index] = n
+                values = {bucket: sketch.quantile(PERCENTILES[metric]) / 3600 for bucket, sketch in sketches.items()}
+            else:
+                if metric not in COUNTS:
+                    raise ValueError(f"Unknown rollup metric: {metric}")
+                column = metric
+                values = dict(self._conn.execute(
+                    f"SELECT bucket, SUM({column}) FROM rollups WHERE {where} AND {column} != 0 GROUP BY bucket",
+                    params,
+                ).fetchall())
+        return to_series(values)
+
+    def response_times(self, by, sla_hours=None):
+        """Response time percentiles and SLA breaches per category or priority, see response_table()"""
+        return response_table(((c, p, sketch) for _, c, p, sketch in self.response_sketches("month")),
+                              by, sla_hours)
+
+    def response_sketches(self, granularity="month"):
+        """(bucket, category, priority, sketch) of the response time rollups"""
+        sketches = {}
+        with self._lock:
+            for bucket, category, priority, index, n in self._conn.execute(
+                "SELECT bucket, category, priority, bin, count FROM rollup_times WHERE granularity = ?",
+                (granularity,),
+            ):
+                sketches.setdefault((bucket, category, priority), QuantileSketch()).bins[index] = n
+        return [(*key, sketch) for key, sketch in sketches.items()]
+
+    def get(self, ticket_id):
+        """Return the ticket with the given id or None"""
+        found = self._fetch("WHERE id = ?", (ticket_id,))
+        return found[0] if found else None
+
+    def get_many(self, ids):
+        """Return the tickets with the given ids in that order, skipping unknown ids"""
+        return self._resolve(ids)
+
+    def load(self):
+        """Read all tickets"""
+        return self.tickets
+
+    def refresh(self):
+        """Return True if the database changed since the cached view was built"""
+        return self.version != self._view_version
+
+    def query(self, **filters):
+        """Return the tickets matching the given filters, evaluated in SQL, as a lazy Selection
+
+        Only the ids are selected up front, tickets are loaded as the
+        Selection is accessed. With a search text, the result is ordered by
+        relevance instead of creation order.
+        """
+        return Selection(self.query_ids(**filters), self._resolve)
+
+    def query_ids(self, **filters):
+        """Return only the ids of the matching tickets, without loading them"""
+        where, params, order = self._where(**filters)
+        with self._lock:
+            return [row[0] for row in self._conn.execute(f"SELECT id FROM tickets {where} ORDER BY {order}", params)]
+
+    def created_at_ids(self, values):
+        """Ids of the tickets created at one of the given ``created_at`` timestamps, from the index"""
+        values = list(values)
+        ids = []
+        with self._lock:
+            for start in range(0, len(values), SQL_CHUNK):
+                chunk = values[start:start + SQL_CHUNK]
+                ids.extend(row[0] for row in self._conn.execute(
+                    f"SELECT id FROM tickets WHERE created_at IN ({', '.join('?' * len(chunk))})", chunk))
+        return sorted(ids)
+
+    def _where(self, status=None, priority=None, category=None,
+               date_from=None, date_to=None, search=None):
+        """Build the JOIN/WHERE clause, its parameters and the ORDER BY terms for a ticket filter"""
+        join, params = self._search_join(search) if search else ("", [])
+        clauses = []
+        for column, value in (("status", status), ("priority", priority), ("category", category)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if date_from is not None:
+            clauses.append("created_at >= ?")
+            params.append(iso_day(date_from))
+        if date_to is not None:
+            # created_at is "YYYY-MM-DD HH:MM:SS", so compare against the next day
+            clauses.append("created_at < ?")
+            params.append(iso_day(date_to, offset=1))
+        where = "WHERE " + " AND ".join(clauses) if clauses else ""
+        if not join:
+            return where, params, "id"
+        return f"{join} {where}", params, "matches.score DESC, id"
+
+    def _search_join(self, text):
+        """JOIN clause and parameters that keep and score the tickets matching a search text
+
+        Every query term contributes one grouped range scan over
+        search_terms; a ticket matches if all of them found it.
+        """
+        terms = query_terms(text)
+        if not terms:
+            return "", []
+        parts = []
+        params = []
+        with self._lock:
+            ticket_count = self._conn.execute("SELECT COUNT(*) FROM tickets").fetchone()[0]
+            for term in terms:
+                matching = self._conn.execute(
+                    "SELECT COUNT(DISTINCT ticket_id) FROM search_terms WHERE term >= ? AND term < ?",
+                    (term, prefix_end(term)),
+                ).fetchone()[0]
+                parts.append(
+                    "SELECT ticket_id, SUM(weight) * ? AS score FROM search_terms"
+                    " WHERE term >= ? AND term < ? GROUP BY ticket_id"
+                )
+                params.extend([idf(ticket_count, matching or 1), term, prefix_end(term)])
+        params.append(len(terms))
+        join = (
+            f"JOIN (SELECT ticket_id, SUM(score) AS score FROM ({' UNION ALL '.join(parts)})"
+            " GROUP BY ticket_id HAVING COUNT(*) = ?) AS matches ON matches.ticket_id = tickets.id"
+        )
+        return join, params
+
+    # Mutations
+
+    def create(self, ticket):
+        """Add a new ticket, assign it the next id of the sequence and return the id"""
+        with self._transaction():
+            ticket["id"] = self._next_id()
+            self._write_meta("next_id", str(ticket["id"] + 1))
+            ticket.setdefault("version", 1)
+            self._insert(annotate_ticket(ticket))
+            self._index(ticket)
+            stats = self._read_stats()
+            stats.add(ticket)
+            self._write_stats(stats)
+            self._write_rollups(Rollups.from_tickets([ticket]))
+        return ticket["id"]
+
+    def create_many(self, tickets):
+        """Add several new tickets in one transaction and return their ids
+
+        Ids are kept if they are not below the next id of the sequence,
+        other tickets get the next ids.
+        """
+        with self._transaction():
+            next_id = self._next_id()
+            stats = self._read_stats()
+            for ticket in tickets:
+                if ticket.get("id") is None or ticket["id"] < next_id:
+                    ticket["id"] = next_id
+                next_id = ticket["id"] + 1
+                ticket.setdefault("version", 1)
+                stats.add(annotate_ticket(ticket))
+            self._insert(*tickets)
+            self._index(*tickets)
+            self._write_stats(stats)
+            self._write_rollups(Rollups.from_tickets(tickets))
+            self._write_meta("next_id", str(next_id))
+        return [ticket["id"] for ticket in tickets]
+
+    def update(self, ticket_id, expected_version=None, **fields):
+        """Overwrite top-level fields of a ticket"""
+        with self._transaction(ticket_id):
+            version = self._check(ticket_id, expected_version)
+            ticket = self._fetch_locked("WHERE id = ?", (ticket_id,))[0]
+            ticket.update(fields)
+            ticket["version"] = version + 1
+            self._conn.execute("DELETE FROM tickets WHERE id = ?", (ticket_id,))
+            self._insert(annotate_ticket(ticket, exchanges=False))
+
+    def add_exchange(self, ticket_id, exchange, expected_version=None):
+        """Append a question/response exchange to a ticket"""
+        with self._transaction(ticket_id):
+            self._check(ticket_id, expected_version)
+            position = self._conn.execute(
+                "SELECT COALESCE(MAX(position) + 1, 0) FROM exchanges WHERE ticket_id = ?", (ticket_id,)
+            ).fetchone()[0]
+            self._insert_exchange(ticket_id, position, annotate_exchange(dict(exchange)))
+            self._conn.execute("UPDATE tickets SET present = present | ? WHERE id = ?",
+                               (1 << OPTIONAL_KEYS.index("exchanges"), ticket_id))
+            self._bump(ticket_id)
+
+    def answer_exchange(self, ticket_id, index, response_at, response_text, expected_version=None):
+        """Store the support response for an exchange
+
+        Raises ConflictError if the exchange was answered by someone else.
+        """
+        with self._transaction(ticket_id):
+            self._check(ticket_id, expected_version)
+            response_ts = parse_ts(response_at)
+            cursor = self._conn.execute(
+                "UPDATE exchanges SET response_at = ?, response_text = ?, response_ts = ?,"
+                " response_seconds = ? - question_ts"
+                " WHERE ticket_id = ? AND position = ? AND response_at IS NULL",
+                (response_at, response_text, response_ts, response_ts, ticket_id, index),
+            )
+            if cursor.rowcount == 0:
+                raise ConflictError(f"Exchange {index} of ticket {ticket_id} is already answered")
+            self._conn.execute(
+                "UPDATE tickets SET support_response_at = ?, support_response_ts = ?, present = present | ?"
+                " WHERE id = ?",
+                (response_at, response_ts, 1 << OPTIONAL_KEYS.index("support_response_at"), ticket_id),
+            )
+            self._bump(ticket_id)
+
+    def delete(self, ticket_id, expected_version=None):
+        """Remove a ticket together with its exchanges, tags and comments (a no-op if it is already gone)"""
+        with self._transaction(ticket_id):
+            if self._version_of(ticket_id) is None:
+                return
+            self._check(ticket_id, expected_version)
+            self._conn.execute("DELETE FROM tickets WHERE id = ?", (ticket_id,))
+
+    def rename_values(self, field, values):
+        """Replace values of an enum field ({old: new}) in every ticket that has one
+
+        Only the rows of the tickets with an old value are updated (and get
+        a new version); the statistics and rollups are adjusted by the
+        difference in the same transaction.
+        """
+        if field not in ENUM_FIELDS:
+            raise ValueError(f"{field} is not an enum field")
+        if not values:
+            return
+        with self._transaction():
+            tickets = self._fetch_locked(f"WHERE {field} IN ({', '.join('?' * len(values))})", tuple(values))
+            stats = self._read_stats()
+            rollups = Rollups()
+            for ticket in tickets:
+                renamed = {**ticket, field: values[ticket[field]]}
+                stats.remove(ticket)
+                rollups.remove(ticket)
+                stats.add(renamed)
+                rollups.add(renamed)
+            self._conn.executemany(
+                f"UPDATE tickets SET {field} = ?, version = version + 1 WHERE id = ?",
+                [(values[ticket[field]], ticket["id"]) for ticket in tickets],
+            )
+            self._write_stats(stats)
+            self._write_rollups(rollups)
+
+    def delete_many(self, versions):
+        """Remove several tickets in one transaction, return the ids that were removed
+
+        ``versions`` maps ticket ids to their expected version (or None).
+        Tickets that are gone or at another version are skipped instead of
+        failing the whole change.
+        """
+        if not versions:
+            return []
+        with self._transaction():
+            marks = ", ".join("?" * len(versions))
+            ids = [i for i, version in self._conn.execute(f"SELECT id, version FROM tickets WHERE id IN ({marks})",
+                                                           tuple(versions))
+                   if versions[i] is None or versions[i] == version]
+            if not ids:
+                return []
+            tickets = self._fetch_locked(f"WHERE id IN ({', '.join('?' * len(ids))})", tuple(ids))
+            stats = self._read_stats()
+            rollups = Rollups()
+            for ticket in tickets:
+                stats.remove(ticket)
+                rollups.remove(ticket)
+            self._conn.executemany("DELETE FROM tickets WHERE id = ?", [(i,) for i in ids])
+            self._write_stats(stats)
+            self._write_rollups(rollups)
+        return ids
+
+    def restore(self, tickets):
+        """Add tickets under their own ids and versions in one transaction, e.g. back from the archive
+
+        Raises ConflictError if one of the ids is in use.
+        """
+        if not tickets:
+            return
+        tickets = [annotate_ticket(as_dict(ticket)) for ticket in tickets]
+        with self._transaction():
+            for ticket in tickets:
+                if self._version_of(ticket["id"]) is not None:
+                    raise ConflictError(f"Ticket {ticket['id']} already exists")
+            self._insert(*tickets)
+            self._index(*tickets)
+            stats = self._read_stats()
+            for ticket in tickets:
+                stats.add(ticket)
+            self._write_stats(stats)
+            self._write_rollups(Rollups.from_tickets(tickets))
+            next_id = max(ticket["id"] for ticket in tickets) + 1
+            self._write_meta("next_id", str(max(next_id, self._next_id())))
+
+    def replace_all(self, tickets):
+        """Replace the whole ticket list in one transaction"""
+        with self._transaction():
+            self._conn.execute("DELETE FROM tickets")
+            tickets = [annotate_ticket(as_dict(ticket)) for ticket in tickets]
+            self._insert(*tickets)
+            self._index(*tickets)
+            self._write_stats(TicketStats.from_tickets(tickets))
+            self._conn.execute("DELETE FROM rollups")
+            self._conn.execute("DELETE FROM rollup_times")
+            self._write_rollups(Rollups.from_tickets(tickets))
+            next_id = max((ticket["id"] + 1 for ticket in tickets), default=1)
+            self._write_meta("next_id", str(max(next_id, self._next_id())))
+
+    def rebuild(self):
+        """Recount the statistics and rollups and rebuild the search index from the tickets"""
+        with self._transaction():
+            self._write_stats(TicketStats.from_tickets(self._fetch_locked("", ())))
+            self._rebuild_rollups()
+            self._rebuild_search()
+
+    def compact(self):
+        """Checkpoint the write-ahead log into the database file and truncate it"""
+        with self._lock:
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    # Internals
+
+    @contextmanager
+    def _transaction(self, ticket_id=None):
+        """Run a write transaction that holds the database write lock from the start
+
+        With a ticket_id, the statistics and the search index are updated
+        for whatever the transaction did to that ticket.
+        """
+        with span("save"), self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                old = self._get_locked(ticket_id) if ticket_id is not None else None
+                yield
+                if ticket_id is not None:
+                    new = self._get_locked(ticket_id)
+                    if old is not None or new is not None:
+                        stats = self._read_stats()
+                        if old is not None:
+                            stats.remove(old)
+                        if new is not None:
+                            stats.add(new)
+                        self._write_stats(stats)
+                        rollups = Rollups()
+                        if old is not None:
+                            rollups.remove(old)
+                        if new is not None:
+                            rollups.add(new)
+                        self._write_rollups(rollups)
+                        self._conn.execute("DELETE FROM search_terms WHERE ticket_id = ?", (ticket_id,))
+                        if new is not None:
+                            self._index(new)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            self._writes += 1
+
+    def _get_locked(self, ticket_id):
+        found = self._fetch_locked("WHERE id = ?", (ticket_id,))
+        return found[0] if found else None
+
+    def _read_meta(self, key):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _write_meta(self, key, value):
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def _next_id(self):
+        """Next id of the persisted sequence"""
+        value = self._read_meta("next_id")
+        if value is not None:
+            return int(value)
+        # Databases created before the sequence was stored
+        return self._conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM tickets").fetchone()[0]
+
+    def _read_stats(self):
+        value = self._read_meta("stats")
+        return TicketStats.from_dict(json.loads(value)) if value else None
+
+    def _write_stats(self, stats):
+        self._write_meta("stats", json.dumps(stats.to_dict(), ensure_ascii=False))
+
+    def _write_rollups(self, delta):
+        """Add the counts of a Rollups object (a delta, possibly negative) to the rollup tables"""
+        counts = list(delta.count_rows())
+        times = list(delta.time_rows())
+        self._conn.executemany(
+            "INSERT INTO rollups (granularity, bucket, category, priority, opened, asked, answered)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT DO UPDATE SET opened = opened + excluded.opened,"
+            " asked = asked + excluded.asked, answered = answered + excluded.answered",
+            counts,
+        )
+        self._conn.executemany(
+            "INSERT INTO rollup_times (granularity, bucket, category, priority, bin, count)"
+            " VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT DO UPDATE SET count = count + excluded.count",
+            times,
+        )
+        # Cells that a removal emptied
+        self._conn.executemany(
+            "DELETE FROM rollups WHERE granularity = ? AND bucket = ? AND category = ? AND priority = ?"
+            " AND opened = 0 AND asked = 0 AND answered = 0",
+            [row[:4] for row in counts if min(row[4:]) < 0],
+        )
+        self._conn.executemany(
+            "DELETE FROM rollup_times WHERE granularity = ? AND bucket = ? AND category = ? AND priority = ?"
+            " AND bin = ? AND count = 0",
+            [row[:5] for row in times if row[5] < 0],
+        )
+
+    def _rebuild_rollups(self):
+        """Roll up every ticket from scratch"""
+        self._conn.execute("DELETE FROM rollups")
+        self._conn.execute("DELETE FROM rollup_times")
+        self._write_rollups(Rollups.from_tickets(self._fetch_locked("", ())))
+        self._write_meta("rollup_format", str(ROLLUP_FORMAT))
+
+    def _index(self, *tickets):
+        """Add the search terms of tickets"""
+        self._conn.executemany(
+            "INSERT INTO search_terms (term, ticket_id, weight) VALUES (?, ?, ?)",
+            [(term, ticket["id"], weight) for ticket in tickets for term, weight in ticket_terms(ticket).items()],
+        )
+
+    def _rebuild_search(self):
+        """Index every ticket from scratch"""
+        self._conn.execute("DELETE FROM search_terms")
+        self._index(*self._fetch_locked("", ()))
+        self._write_meta("search_format", str(SEARCH_FORMAT))
+
+    def _migrate(self):
+        """Add columns missing from databases created by older versions, return True if any"""
+        added = False
+        for table, columns in ADDED_COLUMNS.items():
+            existing = {row[1] for row in self._conn.execute(f"PRAGMA table_info({table})")}
+            for name, definition in columns.items():
+                if name not in existing:
+                    self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+                    added = True
+        return added
+
+    def _version_of(self, ticket_id):
+        row = self._conn.execute("SELECT version FROM tickets WHERE id = ?", (ticket_id,)).fetchone()
+        return row[0] if row else None
+
+    def _check(self, ticket_id, expected_version):
+        """Return the current version of a ticket, raise ConflictError if it does not match"""
+        version = self._version_of(ticket_id)
+        if version is None:
+            raise ConflictError(f"Ticket {ticket_id} no longer exists")
+        if expected_version is not None and version != expected_version:
+            raise ConflictError(f"Ticket {ticket_id} is at version {version}, expected {expected_version}")
+        return version
+
+    def _bump(self, ticket_id):
+        self._conn.execute("UPDATE tickets SET version = version + 1 WHERE id = ?", (ticket_id,))
+
+    def _insert(self, *tickets):
+        """Insert tickets with their child rows, one executemany() per table"""
+        rows = []
+        exchanges = []
+        tags = []
+        comments = []
+        for ticket in tickets:
+            values = [ticket.get(c) for c in TICKET_COLUMNS]
+            values[TICKET_COLUMNS.index("version")] = ticket.get("version", 1)
+            values.append(_extra(ticket, TICKET_COLUMNS + ("tags", "comments", "exchanges")))
+            values.append(_present(ticket))
+            rows.append(values)
+            exchanges.extend(
+                _exchange_row(ticket["id"], position, exchange)
+                for position, exchange in enumerate(ticket.get("exchanges", []))
+            )
+            tags.extend((ticket["id"], i, tag) for i, tag in enumerate(ticket.get("tags", [])))
+            comments.extend((ticket["id"], i, comment) for i, comment in enumerate(ticket.get("comments", [])))
+        self._conn.executemany(
+            f"INSERT INTO tickets ({', '.join(TICKET_COLUMNS)}, extra, present)"
+            f" VALUES ({', '.join('?' * (len(TICKET_COLUMNS) + 2))})",
+            rows,
+        )
+        self._conn.executemany(INSERT_EXCHANGE, exchanges)
+        self._conn.executemany("INSERT INTO tags (ticket_id, position, tag) VALUES (?, ?, ?)", tags)
+        self._conn.executemany("INSERT INTO comments (ticket_id, position, body) VALUES (?, ?, ?)", comments)
+
+    def _insert_exchange(self, ticket_id, position, exchange):
+        self._conn.execute(INSERT_EXCHANGE, _exchange_row(ticket_id, position, exchange))
+
+    def _resolve(self, ids):
+        """Load the tickets with the given ids in that order, skipping ids deleted since"""
+        if not ids:
+            return []
+        found = {t["id"]: t for t in self._fetch(f"WHERE id IN ({', '.join('?' * len(ids))})", tuple(ids))}
+        return [found[i] for i in ids if i in found]
+
+    def _fetch(self, where, params, order="id"):
+        with self._lock:
+            # One read transaction, so tickets and child rows come from the same state
+            self._conn.execute("BEGIN")
+            try:
+                return [Ticket.from_dict(t) for t in self._fetch_locked(where, params, order)]
+            finally:
+                self._conn.execute("COMMIT")
+
+    def _fetch_locked(self, where, params, order="id"):
+        """Load the tickets selected by a WHERE clause together with their child rows
+
+        Only the optional keys the ticket was stored with are set.
+        """
+        rows = self._conn.execute(
+            f"SELECT {', '.join(TICKET_COLUMNS)}, extra, present FROM tickets {where} ORDER BY {order}",
+            params,
+        ).fetchall()
+        tickets = {}
+        for row in rows:
+            ticket = dict(zip(TICKET_COLUMNS, row[:-2]))
+            for i, key in enumerate(OPTIONAL_KEYS):
+                if not row[-1] >> i & 1:
+                    ticket.pop(key, None)
+                elif key not in ticket:
+                    ticket[key] = []
+            if row[-2]:
+                ticket.update(json.loads(row[-2]))
+            tickets[ticket["id"]] = ticket
+        if not tickets:
+            return []
+
+        # Children are selected with the same WHERE clause so that the id list
+        # never has to be passed back into SQLite
+        subquery = f"ticket_id IN (SELECT id FROM tickets {where})" if where else "1"
+        for ticket_id, _, *values, extra in self._conn.execute(
+            f"SELECT ticket_id, position, {', '.join(EXCHANGE_COLUMNS)}, extra"
+            f" FROM exchanges WHERE {subquery} ORDER BY ticket_id, position",
+            params,
+        ):
+            exchange = dict(zip(EXCHANGE_COLUMNS, values))
+            if extra:
+                exchange.update(json.loads(extra))
+            tickets[ticket_id]["exchanges"].append(exchange)
+        for ticket_id, tag in self._conn.execute(
+            f"SELECT ticket_id, tag FROM tags WHERE {subquery} ORDER BY ticket_id, position", params
+        ):
+            tickets[ticket_id]["tags"].append(tag)
+        for ticket_id, body in self._conn.execute(
+            f"SELECT ticket_id, body FROM comments WHERE {subquery} ORDER BY ticket_id, position", params
+        ):
+            tickets[ticket_id]["comments"].append(body)
+        return list(tickets.values())
+
+
+def main(argv=None):
+    """Copy a JSON ticket store into a SQLite database"""
+    from .store import JournalStore
+
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 2:
+        print("Usage: python -m tickets.sqlite_store TICKETS_JSON TICKETS_DB", file=sys.stderr)
+        return 2
+    tickets = JournalStore(argv[0]).load()
+    SQLiteStore(argv[1]).replace_all(tickets)
+    print(f"{len(tickets)} Tickets nach {argv[1]} kopiert")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+"""Ticket statistics maintained incrementally as tickets change.
+
+The stores call ``add()`` for every ticket that appears and ``remove()``
+for every ticket that disappears or is replaced, so the counters are
+always current without rescanning all exchanges on each rerun.
+
+Tickets must carry the parsed timestamp fields from timestamps.py.
+"""
+from collections import Counter
+
+STATS_FORMAT = 1
+
+
+def _bump(counter, key, amount):
+    counter[key] += amount
+    if not counter[key]:
+        del counter[key]
+
+
+class TicketStats:
+    """Counters over all tickets and exchanges"""
+
+    def __init__(self):
+        self.tickets = 0
+        self.exchanges = 0
+        self.answered = 0
+        # Response times are whole seconds, so adding and removing them is exact
+        self.response_count = 0
+        self.response_seconds_total = 0
+        # Response time in hours rounded to 0.1 -> number of exchanges
+        self.response_histogram = Counter()
+        self.by_priority = Counter()
+        self.by_status = Counter()
+        self.by_category = Counter()
+
+    @classmethod
+    def from_tickets(cls, tickets):
+        """Build the counters with a full scan"""
+        stats = cls()
+        for ticket in tickets:
+            stats.add(ticket)
+        return stats
+
+    @property
+    def pending(self):
+        return self.exchanges - self.answered
+
+    @property
+    def avg_response_hours(self):
+        return self.response_seconds_total / self.response_count / 3600 if self.response_count else 0
+
+    def add(self, ticket, sign=1):
+        """Count a ticket (sign=-1 removes it again)"""
+        self.tickets += sign
+        _bump(self.by_priority, ticket["priority"], sign)
+        _bump(self.by_status, ticket["status"], sign)
+        _bump(self.by_category, ticket["category"], sign)
+        for exchange in ticket.get("exchanges", []):
+            self.exchanges += sign
+            if exchange.get("response_at"):
+                self.answered += sign
+            seconds = exchange.get("response_seconds")
+            if seconds is not None:
+                self.response_count += sign
+                self.response_seconds_total += sign * seconds
+                _bump(self.response_histogram, round(seconds / 3600, 1), sign)
+
+    def remove(self, ticket):
+        """Stop counting a ticket"""
+        self.add(ticket, -1)
+
+    def merge(self, other):
+        """Add the counters of other statistics to these, e.g. of archived tickets"""
+        for name in ("tickets", "exchanges", "answered", "response_count", "response_seconds_total"):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        for name in ("response_histogram", "by_priority", "by_status", "by_category"):
+            getattr(self, name).update(getattr(other, name))
+        return self
+
+    def copy(self):
+        other = TicketStats()
+        other.__dict__.update(self.__dict__)
+        for name in ("response_histogram", "by_priority", "by_status", "by_category"):
+            setattr(other, name, Counter(getattr(self, name)))
+        return other
+
+    def to_dict(self):
+        return {
+            "format": STATS_FORMAT,
+            "tickets": self.tickets,
+            "exchanges": self.exchanges,
+            "answered": self.answered,
+            "response_count": self.response_count,
+            "response_seconds_total": self.response_seconds_total,
+            "response_histogram": [[k, v] for k, v in self.response_histogram.items()],
+            "by_priority": dict(self.by_priority),
+            "by_status": dict(self.by_status),
+            "by_category": dict(self.by_category),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Restore persisted counters, None if they were written by another format"""
+        if not data or data.get("format") != STATS_FORMAT:
+            return None
+        stats = cls()
+        for name in ("tickets", "exchanges", "answered", "response_count", "response_seconds_total"):
+            setattr(stats, name, data[name])
+        stats.response_histogram = Counter({k: v for k, v in data["response_histogram"]})
+        stats.by_priority = Counter(data["by_priority"])
+        stats.by_status = Counter(data["by_status"])
+        stats.by_category = Counter(data["by_category"])
+        return stats
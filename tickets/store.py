@@ -0,0 +1,616 @@
+"""Append-only journaled ticket store.
+
+The snapshot file (``tickets.json``) holds the full ticket list as of the
+last compaction. Every change after that is appended to the journal file
+as one small JSON record, so the cost of a write depends on the size of
+the change, not on the number of tickets. Loading reads the snapshot and
+replays the journal on top of it.
+
+One store instance is meant to be shared by all sessions of a process.
+Changes never modify a ticket dict in place but replace it, so the tuple
+returned by ``tickets`` stays a consistent, read-only view for as long as
+a caller holds on to it.
+
+Writers from several sessions or processes are serialized by a lock file.
+Each write first catches up with the journal under that lock, so it is
+applied on top of the latest state on disk instead of overwriting it.
+Every ticket carries a ``version`` that is bumped on each change; callers
+can pass ``expected_version`` to turn a write into a compare-and-swap.
+
+Ids come from a monotonic sequence (``next_id`` in the snapshot, advanced
+by every create record), so the id of a deleted ticket is never reused.
+
+Statistics (see stats.py) and the time-bucketed rollups (see rollups.py)
+are updated with every applied change and saved in the snapshot, so
+neither a rerun nor a cold start has to rescan all exchanges. The filter
+indexes (see query.py) are kept in memory and maintained the same way,
+and so is the full-text search index (see search.py) once the first
+search has built it. Parsed timestamp fields (see timestamps.py) are added
+to every ticket and exchange as it is loaded or written.
+
+A snapshot path ending in ``.bin`` stores the snapshot in the binary
+format of snapshot.py instead of JSON, which is opened with mmap and
+decodes the text of a ticket only when it is accessed. Compaction replaces
+the snapshot while its tickets still use the old mapping, which only POSIX
+allows, so binary snapshots are refused on Windows.
+
+In memory the tickets are ``Ticket`` objects (see model.py), which take a
+fraction of the memory of the dicts they are converted from. Changes are
+still built and journaled as dicts and converted when they are applied.
+Query results resolve their ids against the ticket dict of the moment they
+were made; the store copies that dict before its next change instead of
+modifying it, so a result stays consistent while it is paged or exported.
+"""
+import json
+import os
+import threading
+
+from .errors import ConflictError
+from .locking import FileLock
+from .model import ENUM_FIELDS, Ticket, as_dict, to_json
+from .query import FilterIndex, Selection
+from .rollups import Rollups, response_table
+from .search import SearchIndex
+from .sketch import QuantileSketch
+from .snapshot import MAGIC, is_binary, read_binary, write_binary
+from .stats import TicketStats
+from .timestamps import annotate_exchange, annotate_ticket, parse_ts
+from .timing import span
+
+SNAPSHOT_FORMAT = 1
+
+# A journal below this size is never compacted because of its size alone
+COMPACT_MIN_BYTES = 1 << 20
+
+
+def _file_id(path):
+    """Identify a file version by inode, mtime and size (None if missing)"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+def _write_snapshot(path, meta, tickets, binary=False):
+    """Write a snapshot file with the metadata dict and the tickets"""
+    with open(path, "wb") as f:
+        if binary:
+            write_binary(f, meta, tickets)
+        else:
+            # json.dumps() uses the C encoder, json.dump() would encode in Python
+            f.write(json.dumps({**meta, "tickets": tickets}, ensure_ascii=False, separators=(",", ":"),
+                               default=to_json).encode("utf-8"))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+class JournalStore:
+    """Ticket store backed by a JSON snapshot plus an append-only journal"""
+
+    def __init__(self, snapshot_path, journal_path=None, compact_every=1000):
+        if is_binary(snapshot_path) and os.name == "nt":
+            raise ValueError(f"{snapshot_path}: binary snapshots are not supported on Windows")
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path or os.path.splitext(snapshot_path)[0] + ".journal"
+        self.compact_every = compact_every
+        # _lock guards the in-memory state, _file_lock serializes writers across processes
+        self._lock = threading.RLock()
+        self._file_lock = FileLock(self.snapshot_path + ".lock")
+        self._tickets = {}
+        self._seq = 0
+        self._next_id = 1
+        self._journal_records = 0
+        self._journal_offset = 0
+        self._snapshot_id = None
+        self._version = 0
+        self._view = ()
+        self._stats = TicketStats()
+        self._stats_view = None
+        self._rollups = Rollups()
+        # Built on the first search
+        self._index = None
+        self._filters = FilterIndex()
+        # True while query results may still resolve ids against self._tickets
+        self._shared = False
+        # Called instead of compact() when compacting is due after a write, so
+        # that it can run later, e.g. as a background job (see jobs.py)
+        self.schedule_compaction = None
+
+    @property
+    def version(self):
+        """Counter that changes whenever the ticket data changes"""
+        return self._version
+
+    @property
+    def tickets(self):
+        """Read-only view of all tickets in creation order"""
+        return self._view
+
+    @property
+    def stats(self):
+        """Read-only copy of the statistics for the current version"""
+        with self._lock:
+            if self._stats_view is None:
+                self._stats_view = self._stats.copy()
+            return self._stats_view
+
+    def trend(self, metric, granularity="day", category=None, priority=None):
+        """A rollup metric per day, week or month as a Series, see Rollups.trend()"""
+        with self._lock:
+            return self._rollups.trend(metric, granularity, category, priority)
+
+    def response_times(self, by, sla_hours=None):
+        """Response time percentiles and SLA breaches per category or priority, see response_table()"""
+        with self._lock:
+            return response_table(self._rollups.sketches("month"), by, sla_hours)
+
+    def response_sketches(self, granularity="month"):
+        """(bucket, category, priority, sketch) of the response time rollups, as copies"""
+        with self._lock:
+            return [(b, c, p, QuantileSketch(s.bins)) for b, c, p, s in self._rollups.time_cells(granularity)]
+
+    def get(self, ticket_id):
+        """Return the ticket with the given id or None"""
+        return self._tickets.get(ticket_id)
+
+    def get_many(self, ids):
+        """Return the tickets with the given ids in that order, skipping unknown ids"""
+        tickets = self._tickets
+        return [tickets[i] for i in ids if i in tickets]
+
+    def query(self, **filters):
+        """Return the tickets matching the given filters as a lazy Selection, see FilterIndex.select()
+
+        With a search text, the result is ordered by relevance instead of
+        creation order.
+        """
+        with self._lock:
+            ids = self._filters.select(self._search_index(filters), **filters)
+            tickets = self._tickets
+            self._shared = True
+        return Selection(ids, lambda chunk: [tickets[i] for i in chunk])
+
+    def query_ids(self, **filters):
+        """Return only the ids of the matching tickets"""
+        with self._lock:
+            return self._filters.select(self._search_index(filters), **filters)
+
+    def created_at_ids(self, values):
+        """Ids of the tickets created at one of the given ``created_at`` timestamps"""
+        timestamps = {parse_ts(v) for v in values} - {None}
+        with self._lock:
+            return self._filters.created_ids(timestamps)
+
+    def load(self):
+        """Read the snapshot and replay the journal on top of it"""
+        with self._lock:
+            self._snapshot_id = _file_id(self.snapshot_path)
+            tickets, self._seq, stats, rollups, next_id = self._read_snapshot()
+            self._tickets = {t.id: t for t in tickets}
+            self._next_id = max(next_id, max(self._tickets, default=0) + 1)
+            self._stats = TicketStats.from_dict(stats) or TicketStats.from_tickets(tickets)
+            self._rollups = Rollups.from_dict(rollups) or Rollups.from_tickets(tickets)
+            self._index = None
+            self._filters = FilterIndex.from_tickets(self._tickets.values())
+            self._shared = False
+            self._journal_records = 0
+            self._journal_offset = 0
+            self._replay_journal()
+            self._changed()
+            return self._view
+
+    def refresh(self):
+        """Pick up changes other processes wrote since the last load
+
+        Costs two ``stat`` calls when nothing changed. Returns True if the
+        ticket data was updated.
+        """
+        with self._lock:
+            if _file_id(self.snapshot_path) != self._snapshot_id:
+                self.load()
+                return True
+            journal_id = _file_id(self.journal_path)
+            size = journal_id[2] if journal_id else 0
+            if size < self._journal_offset:
+                self.load()
+                return True
+            if size > self._journal_offset and self._replay_journal():
+                self._changed()
+                return True
+            return False
+
+    # Mutations
+
+    def create(self, ticket):
+        """Add a new ticket, assign it the next id of the sequence and return the id"""
+        ticket.setdefault("version", 1)
+        record = self._commit({"op": "create", "ticket": ticket})
+        return record["ticket"]["id"]
+
+    def create_many(self, tickets):
+        """Add several new tickets with a single journal record and return their ids
+
+        Ids are kept if they are not below the next id of the sequence,
+        other tickets get the next ids.
+        """
+        for ticket in tickets:
+            ticket.setdefault("version", 1)
+        record = self._commit({"op": "create_many", "tickets": tickets})
+        return [ticket["id"] for ticket in record["tickets"]]
+
+    def update(self, ticket_id, expected_version=None, **fields):
+        """Overwrite top-level fields of a ticket"""
+        self._commit({"op": "update", "id": ticket_id, "fields": fields}, expected_version)
+
+    def add_exchange(self, ticket_id, exchange, expected_version=None):
+        """Append a question/response exchange to a ticket"""
+        self._commit({"op": "add_exchange", "id": ticket_id, "exchange": exchange}, expected_version)
+
+    def answer_exchange(self, ticket_id, index, response_at, response_text, expected_version=None):
+        """Store the support response for an exchange
+
+        Raises ConflictError if the exchange was answered by someone else.
+        """
+        self._commit({
+            "op": "answer",
+            "id": ticket_id,
+            "index": index,
+            "response_at": response_at,
+            "response_text": response_text,
+        }, expected_version)
+
+    def delete(self, ticket_id, expected_version=None):
+        """Remove a ticket (a no-op if it is already gone)"""
+        self._commit({"op": "delete", "id": ticket_id}, expected_version)
+
+    def delete_many(self, versions):
+        """Remove several tickets with a single journal record, return the ids that were removed
+
+        ``versions`` maps ticket ids to their expected version (or None).
+        Tickets that are gone or at another version are skipped instead of
+        failing the whole change.
+        """
+        record = self._commit({"op": "delete_many", "ids": [[i, v] for i, v in versions.items()]})
+        return record["ids"]
+
+    def restore(self, tickets):
+        """Add tickets under their own ids and versions, e.g. back from the archive
+
+        Raises ConflictError if one of the ids is in use.
+        """
+        if tickets:
+            self._commit({"op": "restore", "tickets": [as_dict(t) for t in tickets]})
+
+    def rename_values(self, field, values):
+        """Replace values of an enum field ({old: new}) in every ticket that has one
+
+        One journal record covers all tickets. Only the tickets with an old
+        value are replaced (and get a new version), and the statistics,
+        rollups and filter indexes are updated for just those.
+        """
+        if field not in ENUM_FIELDS:
+            raise ValueError(f"{field} is not an enum field")
+        if values:
+            self._commit({"op": "rename", "field": field, "values": values})
+
+    def replace_all(self, tickets):
+        """Replace the whole ticket list, write a fresh snapshot and empty the journal
+
+        Changes other processes made since this store was loaded are
+        replaced too.
+        """
+        tickets = [Ticket.from_dict(annotate_ticket(as_dict(t))) for t in tickets]
+        with span("save"), self._lock, self._file_lock:
+            # Catch up with the files first: the new snapshot takes over the
+            # latest seq and next id, so no journal record is replayed on top
+            self.refresh()
+            self._tickets = {t.id: t for t in tickets}
+            self._next_id = max(self._next_id, max(self._tickets, default=0) + 1)
+            self._stats = TicketStats.from_tickets(self._tickets.values())
+            self._rollups = Rollups.from_tickets(self._tickets.values())
+            self._index = None
+            self._filters = FilterIndex.from_tickets(self._tickets.values())
+            self._shared = False
+            self._changed()
+            meta, snapshot = self._snapshot_data()
+            tmp_path = f"{self.snapshot_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            _write_snapshot(tmp_path, meta, snapshot, binary=is_binary(self.snapshot_path))
+            os.replace(tmp_path, self.snapshot_path)
+            # All records are part of the snapshot now, a crash before this is harmless
+            with open(self.journal_path, "wb"):
+                pass
+            self._snapshot_id = _file_id(self.snapshot_path)
+            self._journal_offset = 0
+            self._journal_records = 0
+
+    def compact(self):
+        """Fold the journal into a new snapshot and truncate the journal
+
+        The snapshot is written without holding the locks, so reads and
+        writes go on meanwhile. Records journaled in the meantime are kept
+        in the new journal.
+        """
+        with self._lock, self._file_lock:
+            meta, tickets = self._snapshot_data()
+            offset = self._journal_offset
+            snapshot_id = self._snapshot_id
+        tmp_path = f"{self.snapshot_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        _write_snapshot(tmp_path, meta, tickets, binary=is_binary(self.snapshot_path))
+        with self._lock, self._file_lock:
+            if _file_id(self.snapshot_path) != snapshot_id:
+                # Another thread or process compacted meanwhile, the offset is no longer valid
+                os.remove(tmp_path)
+                return
+            os.replace(tmp_path, self.snapshot_path)
+            # Records up to data["seq"] are now part of the snapshot and are skipped
+            # on replay, so a crash before the journal is replaced below is harmless.
+            tail = b""
+            if os.path.exists(self.journal_path):
+                with open(self.journal_path, "rb") as f:
+                    f.seek(offset)
+                    tail = f.read()
+            tmp_path = f"{self.journal_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(tail)
+            os.replace(tmp_path, self.journal_path)
+            self._snapshot_id = _file_id(self.snapshot_path)
+            self._journal_offset -= offset
+            self._journal_records = tail.count(b"\n", 0, self._journal_offset)
+
+    def write_snapshot(self, path):
+        """Write a snapshot of the current state to another path, in the format its extension selects
+
+        The journal of this store is folded in, see snapshot.convert().
+        """
+        with self._lock:
+            meta, tickets = self._snapshot_data()
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        _write_snapshot(tmp_path, meta, tickets, binary=is_binary(path))
+        os.replace(tmp_path, path)
+
+    def rebuild(self):
+        """Recount the statistics and rollups and rebuild the indexes from the tickets
+
+        The new structures are built from the current view without holding
+        the lock and swapped in if no change came in between (else the
+        rebuild starts over). The search index is rebuilt only if a search
+        built it before.
+        """
+        while True:
+            with self._lock:
+                version, tickets, searched = self._version, self._view, self._index is not None
+            stats = TicketStats.from_tickets(tickets)
+            rollups = Rollups.from_tickets(tickets)
+            index = SearchIndex.from_tickets(tickets) if searched else None
+            filters = FilterIndex.from_tickets(tickets)
+            with self._lock:
+                if self._version == version:
+                    self._stats, self._rollups, self._index, self._filters = stats, rollups, index, filters
+                    self._stats_view = None
+                    return
+
+    # Internals
+
+    def _changed(self):
+        self._view = tuple(self._tickets.values())
+        self._stats_view = None
+        self._version += 1
+
+    def _compact_bytes(self):
+        """Journal size above which compacting is due
+
+        Compacting once the journal outgrows the snapshot keeps the total
+        cost of compactions linear in the data written, even for large
+        create_many() batches.
+        """
+        snapshot_size = self._snapshot_id[2] if self._snapshot_id else 0
+        return max(snapshot_size, COMPACT_MIN_BYTES)
+
+    def _commit(self, record, expected_version=None):
+        """Validate a change against the latest state on disk, apply and journal it"""
+        with span("save"), self._lock, self._file_lock:
+            self.refresh()
+            if not self._check(record, expected_version):
+                return record
+            if os.path.exists(self.journal_path) and os.path.getsize(self.journal_path) > self._journal_offset:
+                # Torn record from an interrupted append: cut it off so that
+                # the new record is not glued onto it
+                os.truncate(self.journal_path, self._journal_offset)
+            record = {"seq": self._seq + 1, **record}
+            self._apply(record)
+            with open(self.journal_path, "ab") as f:
+                f.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n")
+                f.flush()
+                self._journal_offset = f.tell()
+            self._seq = record["seq"]
+            self._journal_records += 1
+            self._changed()
+            if self._journal_records >= self.compact_every or self._journal_offset > self._compact_bytes():
+                if self.schedule_compaction is not None:
+                    self.schedule_compaction()
+                else:
+                    self.compact()
+            return record
+
+    def _check(self, record, expected_version):
+        """Check a change against the current state, return False to skip it"""
+        op = record["op"]
+        if op == "create":
+            record["ticket"]["id"] = self._next_id
+            return True
+        if op == "rename":
+            return True
+        if op == "delete_many":
+            tickets = self._tickets
+            record["ids"] = [i for i, v in record["ids"]
+                             if i in tickets and (v is None or tickets[i].get("version", 1) == v)]
+            return bool(record["ids"])
+        if op == "restore":
+            for ticket in record["tickets"]:
+                if ticket["id"] in self._tickets:
+                    raise ConflictError(f"Ticket {ticket['id']} already exists")
+            return True
+        if op == "create_many":
+            next_id = self._next_id
+            for ticket in record["tickets"]:
+                if ticket.get("id") is None or ticket["id"] < next_id:
+                    ticket["id"] = next_id
+                next_id = ticket["id"] + 1
+            return True
+
+        ticket = self._tickets.get(record["id"])
+        if ticket is None:
+            if op == "delete":
+                return False
+            raise ConflictError(f"Ticket {record['id']} no longer exists")
+        if expected_version is not None and ticket.get("version", 1) != expected_version:
+            raise ConflictError(
+                f"Ticket {record['id']} is at version {ticket.get('version', 1)}, expected {expected_version}"
+            )
+        if op == "answer":
+            exchanges = ticket.get("exchanges", [])
+            if not 0 <= record["index"] < len(exchanges) or exchanges[record["index"]].get("response_at"):
+                raise ConflictError(f"Exchange {record['index']} of ticket {record['id']} is already answered")
+        return True
+
+    def _apply(self, record):
+        if self._shared:
+            self._tickets = dict(self._tickets)
+            self._shared = False
+        op = record["op"]
+        if op == "create":
+            ticket = self._put(annotate_ticket(record["ticket"]))
+            self._next_id = max(self._next_id, ticket.id + 1)
+            return
+        if op in ("create_many", "restore"):
+            for ticket in record["tickets"]:
+                ticket = self._put(annotate_ticket(ticket))
+                self._next_id = max(self._next_id, ticket.id + 1)
+            return
+        if op == "delete_many":
+            for ticket_id in record["ids"]:
+                ticket = self._tickets.pop(ticket_id, None)
+                if ticket is not None:
+                    self._unput(ticket)
+            return
+        if op == "rename":
+            field = record["field"]
+            # Collected first, so that swapped values ({a: b, b: a}) are not renamed twice
+            moves = [(i, new) for old, new in record["values"].items() for i in self._filters.ids(field, old)]
+            for ticket_id, new in moves:
+                ticket = self._tickets[ticket_id]
+                self._unput(ticket)
+                self._put({**ticket, field: new, "version": ticket.get("version", 1) + 1})
+            return
+
+        ticket = self._tickets.get(record["id"])
+        if ticket is None:
+            return
+        self._unput(ticket)
+        # Replace instead of mutating so that views handed out earlier stay intact
+        version = ticket.get("version", 1) + 1
+        if op == "update":
+            ticket = annotate_ticket({**ticket, **record["fields"], "version": version}, exchanges=False)
+        elif op == "add_exchange":
+            exchange = annotate_exchange(dict(record["exchange"]))
+            ticket = {**ticket, "exchanges": ticket.get("exchanges", []) + [exchange], "version": version}
+        elif op == "answer":
+            exchanges = list(ticket["exchanges"])
+            exchanges[record["index"]] = annotate_exchange({
+                **exchanges[record["index"]],
+                "response_at": record["response_at"],
+                "response_text": record["response_text"],
+            })
+            ticket = annotate_ticket({
+                **ticket,
+                "exchanges": exchanges,
+                "support_response_at": record["response_at"],
+                "version": version,
+            }, exchanges=False)
+        elif op == "delete":
+            del self._tickets[record["id"]]
+            return
+        else:
+            raise ValueError(f"Unknown journal operation: {op}")
+        self._put(ticket)
+
+    def _put(self, ticket):
+        """Count and index a new or replaced ticket given as a dict, store it as a model object"""
+        # The counters read the dict, that is cheaper than the mapping interface of the model
+        self._stats.add(ticket)
+        self._rollups.add(ticket)
+        if self._index is not None:
+            self._index.add(ticket)
+        ticket = Ticket.from_dict(ticket)
+        self._tickets[ticket.id] = ticket
+        self._filters.add(ticket)
+        return ticket
+
+    def _unput(self, ticket):
+        """Stop counting and indexing a ticket that is replaced or deleted"""
+        self._stats.remove(ticket)
+        self._rollups.remove(ticket)
+        if self._index is not None:
+            self._index.remove(ticket)
+        self._filters.remove(ticket)
+
+    def _search_index(self, filters):
+        """The search index if the filters search, built on first use"""
+        if not filters.get("search"):
+            return None
+        if self._index is None:
+            self._index = SearchIndex.from_tickets(self._tickets.values())
+        return self._index
+
+    def _snapshot_data(self):
+        meta = {
+            "format": SNAPSHOT_FORMAT,
+            "seq": self._seq,
+            "next_id": self._next_id,
+            "stats": self._stats.to_dict(),
+            "rollups": self._rollups.to_dict(),
+        }
+        return meta, list(self._view)
+
+    def _read_snapshot(self):
+        """(model tickets, seq, stats, rollups, next_id) of the snapshot file in either format"""
+        if not os.path.exists(self.snapshot_path):
+            return [], 0, None, None, 1
+        with open(self.snapshot_path, "rb") as f:
+            binary = f.read(len(MAGIC)) == MAGIC
+        if binary:
+            data, tickets = read_binary(self.snapshot_path)
+        else:
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if isinstance(data, list):
+                # Legacy format: a plain list written by the old save_tickets()
+                data = {"tickets": data}
+            tickets = [Ticket.from_dict(annotate_ticket(t)) for t in data["tickets"]]
+        return tickets, data.get("seq", 0), data.get("stats"), data.get("rollups"), data.get("next_id", 1)
+
+    def _replay_journal(self):
+        """Apply the journal records after the current offset, return True if any"""
+        if not os.path.exists(self.journal_path):
+            return False
+        applied = False
+        with open(self.journal_path, "rb") as f:
+            f.seek(self._journal_offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # Incomplete last record, still being written or torn by a crash
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                self._journal_offset += len(line)
+                if record["seq"] <= self._seq:
+                    # Already contained in the snapshot (compaction was interrupted)
+                    continue
+                self._apply(record)
+                self._seq = record["seq"]
+                self._journal_records += 1
+                applied = True
+        return applied
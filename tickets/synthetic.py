@@ -0,0 +1,189 @@
+"""Seeded generator of synthetic tickets for benchmarks and demos.
+
+``generate_tickets(count, seed)`` yields tickets of the app's JSON schema
+with German titles, descriptions, conversations, tags and comments. The
+same count and seed always give the same tickets, so benchmark runs of
+different versions work on identical data.
+
+Timestamps follow an office week: tickets are created mostly on weekdays
+between 8 and 18 o'clock, spread over ``days`` days before ``end``.
+Response times are log-normal with a median that depends on the priority,
+and the newest question of a ticket is more often still open the younger
+the ticket is. Status and the number of exchanges are drawn so that solved
+tickets are fully answered.
+
+Usage::
+
+    python -m tickets.synthetic 10000 [--seed 1] > tickets.jsonl
+    python -m tickets.importer tickets.jsonl --store tickets.db
+"""
+import argparse
+import json
+import math
+import random
+import sys
+from datetime import datetime, timedelta
+
+from .timestamps import TIME_FORMAT
+
+PRIORITIES = ["🟢 Niedrig", "🟡 Mittel", "🔴 Hoch"]
+PRIORITY_WEIGHTS = [5, 4, 1]
+CATEGORIES = ["Bug", "Feature Request", "Support", "Dokumentation", "Sonstiges"]
+CATEGORY_WEIGHTS = [3, 2, 6, 1, 1]
+
+# Median response time per priority in hours
+MEDIAN_RESPONSE_HOURS = {"🟢 Niedrig": 30, "🟡 Mittel": 8, "🔴 Hoch": 1.5}
+
+# Share of tickets created per hour of the day and per weekday (Monday first)
+HOUR_WEIGHTS = [1, 0, 0, 0, 0, 1, 2, 6, 14, 16, 15, 12, 8, 12, 14, 13, 10, 6, 3, 2, 2, 1, 1, 1]
+WEEKDAY_WEIGHTS = [22, 20, 19, 18, 15, 4, 2]
+
+DEFAULT_END = datetime(2025, 1, 1)
+
+_SUBJECTS = [
+    "Drucker", "VPN", "Outlook", "Fahrplanauskunft", "Ticketautomat", "Laptop", "Zeiterfassung",
+    "Dienstplan", "WLAN", "Kundenportal", "Passwort", "Monitor", "Telefonanlage", "Rechnungsexport",
+    "Zugangskarte", "Störungsmeldung", "Fahrgastinformation", "Berichtsmodul", "Schnittstelle", "Mailbox",
+]
+_PROBLEMS = [
+    "funktioniert nicht", "startet nicht mehr", "ist sehr langsam", "zeigt eine Fehlermeldung",
+    "stürzt regelmäßig ab", "lässt sich nicht öffnen", "verbindet sich nicht", "meldet Zugriff verweigert",
+    "druckt leere Seiten", "synchronisiert nicht", "zeigt falsche Daten", "hängt beim Anmelden",
+]
+_PLACES = [
+    "im Büro Dresden", "im Stellwerk", "im Homeoffice", "in der Leitstelle", "im Kundenzentrum",
+    "im 2. OG", "am Bahnhof Neustadt", "in der Werkstatt", "im Schulungsraum", "unterwegs",
+]
+_WISHES = [
+    "Export als Excel", "Filter nach Datum", "eine Suchfunktion", "Benachrichtigungen per E-Mail",
+    "einen dunklen Modus", "eine Übersicht pro Woche", "mehr Platz für Kommentare", "eine Druckansicht",
+]
+_SENTENCES = [
+    "{subject} {problem}, seit heute Morgen schon.",
+    "Bei mir {problem_short} {subject} {place}.",
+    "Das Problem tritt seit dem letzten Update auf.",
+    "Ein Neustart hat leider nichts geändert.",
+    "Kollegen {place} haben dasselbe Problem.",
+    "Bitte um dringende Rückmeldung, wir können so nicht weiterarbeiten.",
+    "Die Fehlermeldung lautet: Zeitüberschreitung bei der Anfrage.",
+    "Es betrifft ungefähr {number} Mitarbeitende.",
+    "Screenshot liegt der Mail an den Support bei.",
+    "Könnt ihr euch das bitte einmal ansehen?",
+]
+_QUESTIONS = [
+    "Gibt es schon einen Zwischenstand?",
+    "Der Fehler ist wieder aufgetreten, was kann ich noch tun?",
+    "Muss ich dafür einen neuen Antrag stellen?",
+    "Können Sie mir die Anleitung noch einmal schicken?",
+    "Wann wird das Update ausgerollt?",
+    "Betrifft das auch die anderen Standorte?",
+]
+_RESPONSES = [
+    "Vielen Dank für die Meldung, wir schauen uns das an.",
+    "Bitte leeren Sie den Cache und melden Sie sich neu an.",
+    "Das Problem ist bekannt und wird mit dem nächsten Update behoben.",
+    "Wir haben Ihr Konto zurückgesetzt, bitte erneut versuchen.",
+    "Der Treiber wurde aktualisiert, das Gerät sollte wieder funktionieren.",
+    "Bitte schicken Sie uns die genaue Uhrzeit und die Fehlermeldung.",
+    "Die Anleitung finden Sie im Intranet unter IT-Hilfe.",
+]
+_COMMENTS = [
+    "Rückruf vereinbart.", "An den Dienstleister weitergeleitet.", "Betrifft auch Ticket aus dem Vormonat.",
+    "Kunde telefonisch informiert.", "Warte auf Ersatzteil.", "Workaround dokumentiert.",
+]
+_TAGS = ["urgent", "client", "vpn", "hardware", "software", "netzwerk", "intern", "kunde", "wartung", "rollout"]
+
+
+def _text(rnd, sentences):
+    subject = rnd.choice(_SUBJECTS)
+    values = {
+        "subject": subject,
+        "problem": rnd.choice(_PROBLEMS),
+        "problem_short": rnd.choice(["hängt", "spinnt", "streikt"]),
+        "place": rnd.choice(_PLACES),
+        "number": rnd.randint(2, 40),
+    }
+    return " ".join(s.format(**values) for s in rnd.sample(_SENTENCES, sentences))
+
+
+def _title(rnd, category):
+    if category == "Feature Request":
+        return f"{rnd.choice(_SUBJECTS)}: Wunsch nach {rnd.choice(_WISHES)}"
+    return f"{rnd.choice(_SUBJECTS)} {rnd.choice(_PROBLEMS)} {rnd.choice(_PLACES)}"
+
+
+def _created(rnd, end, days):
+    """Creation time within ``days`` days before ``end``, weighted by weekday and hour"""
+    while True:
+        day = end - timedelta(days=rnd.randrange(days) + 1)
+        if rnd.random() * max(WEEKDAY_WEIGHTS) < WEEKDAY_WEIGHTS[day.weekday()]:
+            break
+    hour = rnd.choices(range(24), HOUR_WEIGHTS)[0]
+    return day.replace(hour=hour, minute=rnd.randrange(60), second=rnd.randrange(60))
+
+
+def generate_tickets(count, seed=0, end=DEFAULT_END, days=365):
+    """Yield ``count`` synthetic tickets with the ids 1 to count"""
+    rnd = random.Random(seed)
+    for ticket_id in range(1, count + 1):
+        category = rnd.choices(CATEGORIES, CATEGORY_WEIGHTS)[0]
+        priority = rnd.choices(PRIORITIES, PRIORITY_WEIGHTS)[0]
+        created = _created(rnd, end, days)
+        median = MEDIAN_RESPONSE_HOURS[priority] * 3600
+        age_days = (end - created).total_seconds() / 86400
+
+        exchanges = []
+        asked = created
+        question = _text(rnd, rnd.randint(2, 4))
+        for _ in range(min(1 + int(rnd.expovariate(1.2)), 6)):
+            answered = rnd.random() < min(0.97, 0.5 + age_days / 30)
+            response = asked + timedelta(seconds=int(rnd.lognormvariate(math.log(median), 1.1))) if answered else None
+            if response is not None and response > end:
+                response = None
+            exchanges.append({
+                "question_at": asked.strftime(TIME_FORMAT),
+                "question_text": question,
+                "response_at": response.strftime(TIME_FORMAT) if response else None,
+                "response_text": rnd.choice(_RESPONSES) if response else "",
+            })
+            if response is None:
+                break
+            asked = response + timedelta(minutes=int(rnd.expovariate(1 / 600)) + 5)
+            if asked > end:
+                break
+            question = rnd.choice(_QUESTIONS)
+
+        if exchanges[-1]["response_at"] is None:
+            status = rnd.choices(["Offen", "In Bearbeitung"], [2, 1])[0]
+        else:
+            status = rnd.choices(["Gelöst", "In Bearbeitung"], [5, 1])[0]
+
+        yield {
+            "id": ticket_id,
+            "title": _title(rnd, category),
+            "description": exchanges[0]["question_text"],
+            "category": category,
+            "priority": priority,
+            "status": status,
+            "created_at": created.strftime(TIME_FORMAT),
+            "support_response_at": exchanges[0]["response_at"],
+            "tags": rnd.sample(_TAGS, min(int(rnd.expovariate(1.0)), 4)),
+            "comments": rnd.sample(_COMMENTS, rnd.randint(1, 2)) if rnd.random() < 0.15 else [],
+            "exchanges": exchanges,
+        }
+
+
+def main(argv=None):
+    """Write synthetic tickets as JSON lines to stdout"""
+    parser = argparse.ArgumentParser(prog="python -m tickets.synthetic", description=main.__doc__)
+    parser.add_argument("count", type=int)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--days", type=int, default=365, help="time span of the creation dates (default: 365)")
+    args = parser.parse_args(argv)
+    for ticket in generate_tickets(args.count, args.seed, days=args.days):
+        sys.stdout.write(json.dumps(ticket, ensure_ascii=False) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
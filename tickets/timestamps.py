@@ -0,0 +1,50 @@
+"""Parsed timestamp fields for tickets and exchanges.
+
+Timestamps are stored as ``"%Y-%m-%d %H:%M:%S"`` strings. The stores add
+epoch-second integers next to them whenever a ticket or exchange is loaded
+or written, so consumers never have to parse the strings again:
+
+- ticket: ``created_ts``, ``support_response_ts``
+- exchange: ``question_ts``, ``response_ts`` and ``response_seconds``
+
+The strings carry no time zone, so they are read as UTC. That keeps
+durations exact and ``ts // 86400`` on the same calendar day as the string.
+"""
+from datetime import datetime, timezone
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+TICKET_FIELDS = ("created_ts", "support_response_ts")
+EXCHANGE_FIELDS = ("question_ts", "response_ts", "response_seconds")
+
+
+def parse_ts(value):
+    """Epoch seconds of a timestamp string, None if it is empty or invalid"""
+    if not value:
+        return None
+    try:
+        return int(datetime.fromisoformat(value).replace(tzinfo=timezone.utc).timestamp())
+    except (TypeError, ValueError):
+        return None
+
+
+def annotate_exchange(exchange):
+    """Add the parsed fields to an exchange in place and return it"""
+    question_ts = parse_ts(exchange.get("question_at"))
+    response_ts = parse_ts(exchange.get("response_at"))
+    exchange["question_ts"] = question_ts
+    exchange["response_ts"] = response_ts
+    exchange["response_seconds"] = (
+        response_ts - question_ts if question_ts is not None and response_ts is not None else None
+    )
+    return exchange
+
+
+def annotate_ticket(ticket, exchanges=True):
+    """Add the parsed fields to a ticket (and its exchanges) in place and return it"""
+    ticket["created_ts"] = parse_ts(ticket.get("created_at"))
+    ticket["support_response_ts"] = parse_ts(ticket.get("support_response_at"))
+    if exchanges:
+        for exchange in ticket.get("exchanges", []):
+            annotate_exchange(exchange)
+    return ticket
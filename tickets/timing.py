@@ -0,0 +1,220 @@
+"""Timing spans for the phases of an app rerun.
+
+The app wraps every rerun in ``RECORDER.rerun(section)`` and the phases it
+runs through in ``span(phase)``:
+
+- ``load``: refreshing the tickets from the store
+- ``filter``: filter and search queries
+- ``aggregate``: statistics, frames and response time tables
+- ``chart``: building the chart specs
+- ``cards``: rendering the ticket cards and the list view
+- ``save``: writes to the store (timed by the stores themselves)
+
+A span nested in another one is only counted for its own phase, so the
+phases of a rerun add up to at most its total; the rest of the total is
+widget rendering and everything else. Each finished rerun is logged as
+one JSON line on the ``tickets.timing`` logger, kept in a short history
+for the timing panel of the app and added to Prometheus histograms. Spans
+outside of a rerun (a write from a fragment) only go to the histograms.
+
+Timing is off unless ``TICKETS_TIMING=1`` is set. Then ``span()`` and
+``rerun()`` return a shared no-op context manager, which costs one call
+per span. With ``TICKETS_METRICS_FILE`` set, the histograms are written
+to that file in the Prometheus text format after every rerun, e.g. for
+the textfile collector of the node exporter.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+PHASES = ("load", "filter", "aggregate", "chart", "cards", "save")
+
+# Upper bounds of the histogram buckets in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+logger = logging.getLogger("tickets.timing")
+
+
+class _NoSpan:
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+class _Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.counts[i] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def lines(self, name, labels=""):
+        sep = "," if labels else ""
+        for bound, count in zip(BUCKETS, self.counts):
+            yield f'{name}_bucket{{{labels}{sep}le="{bound}"}} {count}'
+        yield f'{name}_bucket{{{labels}{sep}le="+Inf"}} {self.count}'
+        braces = f"{{{labels}}}" if labels else ""
+        yield f"{name}_sum{braces} {self.sum:.6f}"
+        yield f"{name}_count{braces} {self.count}"
+
+
+class _Span:
+    __slots__ = ("recorder", "phase", "start", "children")
+
+    def __init__(self, recorder, phase):
+        self.recorder = recorder
+        self.phase = phase
+
+    def __enter__(self):
+        self.children = 0.0
+        self.recorder._local.__dict__.setdefault("stack", []).append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        stack = self.recorder._local.stack
+        stack.pop()
+        if stack:
+            stack[-1].children += elapsed
+        self.recorder._observe(self.phase, elapsed - self.children)
+        return False
+
+
+class _Rerun:
+    __slots__ = ("recorder", "section", "phases", "start")
+
+    def __init__(self, recorder, section):
+        self.recorder = recorder
+        self.section = section
+        self.phases = {}
+
+    def __enter__(self):
+        self.recorder._local.rerun = self
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        # Also reached through st.rerun() and st.stop(), which raise
+        total = time.perf_counter() - self.start
+        self.recorder._local.rerun = None
+        self.recorder._finish(self, total)
+        return False
+
+
+class Recorder:
+    """Collects the timing spans of app reruns, shared by all sessions of a process"""
+
+    def __init__(self, enabled=False, history=20, metrics_path=None):
+        self.enabled = enabled
+        self.metrics_path = metrics_path
+        # Streamlit runs every session's script in a thread of its own
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._history = deque(maxlen=history)
+        self._phases = {phase: _Histogram() for phase in PHASES}
+        self._reruns = _Histogram()
+
+    @classmethod
+    def from_env(cls):
+        """Recorder configured by ``TICKETS_TIMING`` and ``TICKETS_METRICS_FILE``"""
+        enabled = os.environ.get("TICKETS_TIMING", "") not in ("", "0")
+        if enabled and not logger.handlers:
+            handler = logging.StreamHandler()
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+        return cls(enabled, metrics_path=os.environ.get("TICKETS_METRICS_FILE") or None)
+
+    def span(self, phase):
+        """Context manager that times a phase"""
+        if not self.enabled:
+            return _NO_SPAN
+        return _Span(self, phase)
+
+    def rerun(self, section=""):
+        """Context manager around one rerun of the app"""
+        if not self.enabled or getattr(self._local, "rerun", None) is not None:
+            return _NO_SPAN
+        return _Rerun(self, section)
+
+    def history(self):
+        """The recorded reruns, newest first"""
+        with self._lock:
+            return list(reversed(self._history))
+
+    def prometheus_text(self):
+        """The histograms in the Prometheus text exposition format"""
+        with self._lock:
+            lines = [
+                "# HELP tickets_phase_seconds Time spent per phase of the app, nested phases excluded",
+                "# TYPE tickets_phase_seconds histogram",
+            ]
+            for phase, histogram in self._phases.items():
+                lines.extend(histogram.lines("tickets_phase_seconds", f'phase="{phase}"'))
+            lines += [
+                "# HELP tickets_rerun_seconds Total time of an app rerun",
+                "# TYPE tickets_rerun_seconds histogram",
+            ]
+            lines.extend(self._reruns.lines("tickets_rerun_seconds"))
+        return "\n".join(lines) + "\n"
+
+    def _observe(self, phase, seconds):
+        rerun = getattr(self._local, "rerun", None)
+        if rerun is not None:
+            rerun.phases[phase] = rerun.phases.get(phase, 0.0) + seconds
+        else:
+            with self._lock:
+                self._phases.setdefault(phase, _Histogram()).observe(seconds)
+
+    def _finish(self, rerun, total):
+        record = {
+            "at": datetime.now().isoformat(timespec="milliseconds"),
+            "section": rerun.section,
+            "total_ms": round(total * 1000, 3),
+            "phases_ms": {phase: round(s * 1000, 3) for phase, s in rerun.phases.items()},
+        }
+        with self._lock:
+            self._history.append(record)
+            for phase, seconds in rerun.phases.items():
+                self._phases.setdefault(phase, _Histogram()).observe(seconds)
+            self._reruns.observe(total)
+        logger.info(json.dumps(record, ensure_ascii=False))
+        if self.metrics_path:
+            self._write_metrics()
+
+    def _write_metrics(self):
+        # Written next to the target and renamed, so a scraper never sees a partial file
+        tmp = f"{self.metrics_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(self.prometheus_text())
+            os.replace(tmp, self.metrics_path)
+        except OSError as e:
+            logger.warning(json.dumps({"error": f"metrics file not written: {e}"}))
+
+
+RECORDER = Recorder.from_env()
+
+
+def span(phase):
+    """Time a phase with the recorder of the process, see Recorder.span()"""
+    return RECORDER.span(phase)